@@ -0,0 +1,54 @@
+"""
+Micro-benchmark of the icon vertex conversion.
+
+Compares the per-shape `utils.convert_vertex_data` path with the batched
+`utils.convert_icon_vertex_data`.
+
+Usage:
+    python benchmarks/bench_convert.py [--vertices N] [--shapes N] [--repeat N]
+"""
+import argparse
+import timeit
+
+import numpy as np
+from ps2mc.icon import Icon
+
+from ps2mc_browser import utils
+from synthetic import icon_bytes
+
+
+def per_shape(icon: Icon) -> list[np.ndarray]:
+    result = []
+    for i in range(icon.animation_shapes):
+        h = (i + 1) % icon.animation_shapes
+        vertex_data = utils.convert_vertex_data(icon, i, h)
+        vertex_data /= utils.FIXED_POINT_FACTOR
+        result.append(vertex_data.astype("f2"))
+    return result
+
+
+def batched(icon: Icon) -> np.ndarray:
+    return utils.convert_icon_vertex_data(icon)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vertices", type=int, default=3000)
+    parser.add_argument("--shapes", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    icon = Icon(icon_bytes(args.vertices, args.shapes))
+    if not np.array_equal(np.stack(per_shape(icon)), batched(icon)):
+        raise SystemExit("batched conversion does not match the per-shape path")
+
+    print(f"{args.vertices} vertices, {args.shapes} shapes")
+    timings = {}
+    for name, func in (("per-shape", per_shape), ("batched", batched)):
+        timings[name] = min(timeit.repeat(lambda: func(icon), number=1, repeat=args.repeat))
+        print(f"{name:>10}: {timings[name] * 1000:8.2f} ms")
+    print(f"{'speedup':>10}: {timings['per-shape'] / timings['batched']:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Benchmark suite of the card loading, icon parsing, vertex conversion,
+model upload and headless rendering paths, run on a synthetic memory card.
+
+The results are written as JSON. Passing the results of an earlier run with
+--baseline reports every benchmark whose median got slower than the threshold,
+and exits with status 1 if there is any.
+
+Usage:
+    python benchmarks/bench_suite.py [--saves N] [--vertices N] [--shapes N]
+        [--fragmentation F] [--texture raw|compressed|none] [--repeat N]
+        [--output results.json] [--baseline previous.json] [--threshold 1.2]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import moderngl
+import numpy as np
+from ps2mc.browser import Browser
+from ps2mc.icon import Icon
+
+from ps2mc_browser import utils
+from ps2mc_browser.card import MmapBrowser
+from ps2mc_browser.headless import OffscreenRenderer, create_context
+from ps2mc_browser.icon import ArrayIcon
+from ps2mc_browser.models import IconModel
+from ps2mc_browser.shaders import get_programs
+from ps2mc_browser.textures import TextureManager
+from synthetic import write_card
+
+
+def measure(func: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """
+    Time a function, in milliseconds per call.
+
+    Parameters:
+    - func (Callable): The function to time.
+    - repeat (int): The number of timed calls.
+
+    Returns:
+        Dict[str, float]: The min, median and mean of the calls.
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.fmean(samples),
+        "repeat": repeat,
+    }
+
+
+def per_shape(icon: Icon) -> List[np.ndarray]:
+    """
+    The legacy conversion, one shape at a time.
+    """
+    result = []
+    for i in range(icon.animation_shapes):
+        h = (i + 1) % icon.animation_shapes
+        result.append(utils.convert_vertex_data(icon, i, h))
+    return result
+
+
+def bench_card(path: str, games: List[str], repeat: int) -> Dict[str, dict]:
+    results = {}
+    for name, cls in (("browser", Browser), ("mmap", MmapBrowser)):
+        results[f"open.{name}"] = measure(lambda: cls(path).close(), repeat)
+        browser = cls(path)
+        results[f"list_root_dir.{name}"] = measure(browser.list_root_dir, repeat)
+        results[f"get_icon.{name}"] = measure(
+            lambda: [browser.get_icon(game) for game in games], repeat
+        )
+        results[f"get_icon.{name}"]["saves"] = len(games)
+        browser.close()
+    return results
+
+
+def bench_parse(data: bytes, repeat: int) -> Dict[str, dict]:
+    return {
+        "parse.icon": measure(lambda: Icon(data), repeat),
+        "parse.array_icon": measure(lambda: ArrayIcon(data), repeat),
+    }
+
+
+def bench_convert(icon: Icon, repeat: int) -> Dict[str, dict]:
+    return {
+        "convert_vertex_data": measure(lambda: per_shape(icon), repeat),
+        "convert_icon_vertex_data": measure(lambda: utils.convert_icon_vertex_data(icon), repeat),
+    }
+
+
+def bench_upload(icon: Icon, repeat: int) -> Dict[str, dict]:
+    ctx = create_context()
+    programs = get_programs(ctx)
+    textures = TextureManager(ctx)
+
+    def build():
+        IconModel(ctx, programs, icon, textures).release()
+        ctx.finish()
+
+    result = {"icon_model": measure(build, repeat)}
+    ctx.release()
+    return result
+
+
+def bench_render(path: str, game: str, size: List[int], repeat: int) -> Dict[str, dict]:
+    renderer = OffscreenRenderer(tuple(size))
+    browser = MmapBrowser(path)
+    icon_sys, icons = browser.get_icon(game)
+    renderer.renderer.refresh(icon_sys, icons, (path, game))
+    frame = iter(range(10 ** 9))
+
+    def render():
+        renderer.fbo.use()
+        renderer.renderer.render(next(frame) / 60)
+        renderer.fbo.read(components=3)
+
+    render()  # the first frame compiles the pipeline
+    result = {"render_frame": measure(render, repeat)}
+    result["render_frame"]["gl_renderer"] = renderer.ctx.info["GL_RENDERER"]
+    browser.close()
+    renderer.release()
+    return result
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    """
+    The benchmarks whose median got slower than `threshold` times the baseline.
+    """
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous and result["median"] > previous["median"] * threshold:
+            regressions.append(
+                f"{name}: {previous['median']:.3f} ms -> {result['median']:.3f} ms "
+                f"({result['median'] / previous['median']:.2f}x)"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--saves", type=int, default=20)
+    parser.add_argument("--vertices", type=int, default=1500)
+    parser.add_argument("--shapes", type=int, default=4)
+    parser.add_argument("--fragmentation", type=float, default=0.0)
+    parser.add_argument("--texture", choices=("raw", "compressed", "none"), default="compressed")
+    parser.add_argument("--icons", type=int, default=3, help="saves whose icons are parsed per run")
+    parser.add_argument("--size", type=int, nargs=2, default=[utils.CANVAS_WIDTH, utils.CANVAS_HEIGHT])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-gl", action="store_true", help="skip the benchmarks needing OpenGL")
+    parser.add_argument("--output", default="bench-results.json")
+    parser.add_argument("--baseline", help="results of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=1.2)
+    args = parser.parse_args()
+
+    params = {
+        key: getattr(args, key)
+        for key in ("saves", "vertices", "shapes", "fragmentation", "texture", "icons", "size", "seed")
+    }
+    texture = None if args.texture == "none" else args.texture
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "synthetic.ps2")
+        start = time.perf_counter()
+        params["clusters"] = write_card(
+            path, args.saves, args.vertices, args.shapes, args.fragmentation, texture, args.seed
+        )
+        print(f"generated {params['clusters']}-cluster card in {time.perf_counter() - start:.2f}s")
+
+        browser = MmapBrowser(path)
+        games = [entry.name for entry in browser.list_root_dir()][:args.icons]
+        icon = browser.get_icon(games[0])[1][0]
+        browser.close()
+
+        results = {}
+        results.update(bench_card(path, games, args.repeat))
+        results.update(bench_parse(icon.byte_val, args.repeat))
+        results.update(bench_convert(icon, args.repeat))
+        if not args.no_gl:
+            results.update(bench_upload(icon, args.repeat))
+            results.update(bench_render(path, games[0], args.size, args.repeat))
+
+    for name, result in results.items():
+        print(f"{name:>28}: {result['median']:10.3f} ms (min {result['min']:.3f})")
+
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "moderngl": moderngl.__version__,
+        },
+        "params": params,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["params"] != params:
+            print("warning: the baseline was run with different parameters")
+        regressions = compare(results, baseline["results"], args.threshold)
+        for regression in regressions:
+            print(f"regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+Builders for synthetic PS2 save data used by the benchmarks.
+
+`write_card` writes a formatted memory card image, with valid ECC, holding
+any number of saves whose icons have a chosen number of vertices and
+animation shapes. The clusters of the files can be scattered over the card
+to measure the cost of following fragmented FAT chains.
+"""
+import struct
+from typing import List, Optional
+
+import numpy as np
+
+from ps2mc_browser.verify import page_ecc
+
+
+ICON_MAGIC = 0x010000
+ANIMATION_HEADER_MAGIC = 0x01
+TEXTURE_SIZE = 128 * 128
+
+PAGE_SIZE = 512
+SPARE_SIZE = 16
+PAGES_PER_CLUSTER = 2
+PAGES_PER_BLOCK = 16
+CLUSTER_SIZE = PAGE_SIZE * PAGES_PER_CLUSTER
+ENTRY_SIZE = 512
+MIN_CLUSTERS = 8192  # an 8MB card
+MAX_CLUSTERS = CLUSTER_SIZE // 4 * CLUSTER_SIZE // 4  # what a single indirect FAT cluster can map
+IFC_CLUSTER = 8
+BACKUP_CLUSTERS = 16
+
+DF_READ, DF_WRITE, DF_EXECUTE = 0x0001, 0x0002, 0x0004
+DF_FILE, DF_DIRECTORY = 0x0010, 0x0020
+DF_0400, DF_EXISTS = 0x0400, 0x8000
+FILE_MODE = DF_EXISTS | DF_0400 | DF_FILE | DF_EXECUTE | DF_WRITE | DF_READ
+DIRECTORY_MODE = DF_EXISTS | DF_0400 | DF_DIRECTORY | DF_EXECUTE | DF_WRITE | DF_READ
+FAT_FREE = 0x7FFFFFFF
+FAT_ALLOCATED = 0x80000000
+FAT_CHAIN_END = 0xFFFFFFFF
+
+
+def _texture(rng: np.random.Generator) -> np.ndarray:
+    """
+    A 128x128 A1B5G5R5 texture made of flat runs and noisy rows,
+    so that its compressed form has both repeat and literal runs.
+    """
+    texture = np.repeat(rng.integers(0, 0x8000, TEXTURE_SIZE // 8, dtype="<u2"), 8)
+    texture = texture.reshape(128, 128)
+    texture[::4] = rng.integers(0, 0x8000, (32, 128), dtype="<u2")
+    return texture.ravel()
+
+
+def _compress_texture(texture: np.ndarray) -> bytes:
+    """
+    Run-length encode a texture the way the icon format expects.
+    """
+    out = bytearray()
+    literal: List[int] = []
+
+    def flush_literal():
+        if literal:
+            out.extend(struct.pack("<H", 0x10000 - len(literal)))
+            out.extend(np.asarray(literal, dtype="<u2").tobytes())
+            literal.clear()
+
+    starts = np.flatnonzero(np.diff(texture, prepend=-1) != 0)
+    lengths = np.diff(starts, append=len(texture))
+    for start, length in zip(starts.tolist(), lengths.tolist()):
+        value = int(texture[start])
+        if length == 1:
+            literal.append(value)
+            continue
+        flush_literal()
+        out.extend(struct.pack("<HH", length, value))
+    flush_literal()
+    return struct.pack("<I", len(out)) + bytes(out)
+
+
+def icon_bytes(
+    vertex_count: int,
+    animation_shapes: int,
+    seed: int = 0,
+    texture: Optional[str] = None,
+) -> bytes:
+    """
+    Build the bytes of a 3D icon file.
+
+    Parameters:
+    - vertex_count (int): The number of vertices.
+    - animation_shapes (int): The number of animation shapes.
+    - seed (int): Seed of the random vertex and texture data.
+    - texture (str): None for an untextured icon, `raw` or `compressed`.
+
+    Returns:
+        bytes: The icon file.
+    """
+    rng = np.random.default_rng(seed)
+    record = np.dtype([
+        ("positions", "<i2", (animation_shapes, 4)),
+        ("normal", "<i2", 4),
+        ("uv", "<i2", 2),
+        ("color", "u1", 4),
+    ])
+    vertices = np.zeros(vertex_count, dtype=record)
+    vertices["positions"][..., :3] = rng.integers(-8192, 8192, (vertex_count, animation_shapes, 3))
+    vertices["normal"][:, :3] = rng.integers(-4096, 4096, (vertex_count, 3))
+    vertices["uv"] = rng.integers(0, 4096, (vertex_count, 2))
+    vertices["color"] = 0x80
+    tex_type = 0b11
+    texture_bytes = b""
+    if texture is not None:
+        pixels = _texture(rng)
+        if texture == "compressed":
+            tex_type |= 0b1100
+            texture_bytes = _compress_texture(pixels)
+        else:
+            tex_type |= 0b100
+            texture_bytes = pixels.tobytes()
+    header = struct.pack("<5I", ICON_MAGIC, animation_shapes, tex_type, 0x3F800000, vertex_count)
+    animation_header = struct.pack("<IIfII", ANIMATION_HEADER_MAGIC, 60, 1.0, 0, 0)
+    return header + vertices.tobytes() + animation_header + texture_bytes
+
+
+def icon_sys_bytes(title: str, icon_file: str = "icon.ico") -> bytes:
+    """
+    Build the bytes of an icon.sys file using one icon file for all three icons.
+    """
+    subtitle = title.encode("ascii")
+    icon_name = icon_file.encode("ascii")
+    return struct.pack(
+        "<4s2xH4xI16I28f68s64s64s64s512x",
+        b"PS2D",
+        len(subtitle),
+        0x40,
+        *([0x80, 0x40, 0x20, 0] * 4),
+        *([0.0, 0.0, 1.0, 0.0] * 3),
+        *([0.5, 0.5, 0.5, 0.0] * 3),
+        0.3, 0.3, 0.3, 0.0,
+        subtitle,
+        icon_name,
+        icon_name,
+        icon_name,
+    )
+
+
+def _entry(mode: int, length: int, cluster: int, name: str) -> bytes:
+    tod = struct.pack("<xBBBBBH", 0, 0, 12, 1, 1, 2004)
+    return struct.pack(
+        "<H2xL8sL4x8s4x28x32s416x", mode, length, tod, cluster, tod, name.encode("ascii")
+    )
+
+
+class _Allocator:
+    """
+    Hands out the clusters of the allocatable area, in order or scattered.
+    """
+
+    def __init__(self, clusters: int, fragmentation: float, rng: np.random.Generator):
+        order = np.arange(clusters)
+        # shuffle a share of the clusters among themselves
+        scattered = rng.choice(clusters, int(clusters * fragmentation), replace=False)
+        order[scattered] = rng.permutation(order[scattered])
+        self.order = order.tolist()
+        self.next = 0
+        self.fat = np.full(clusters, FAT_FREE, dtype="<u4")
+
+    def alloc(self, size: int) -> List[int]:
+        count = max(1, -(-size // CLUSTER_SIZE))
+        if self.next + count > len(self.order):
+            raise ValueError("the saves don't fit on the card")
+        chain = self.order[self.next:self.next + count]
+        self.next += count
+        for cluster, next_cluster in zip(chain, chain[1:]):
+            self.fat[cluster] = FAT_ALLOCATED | next_cluster
+        self.fat[chain[-1]] = FAT_CHAIN_END
+        return chain
+
+
+def card_clusters(saves: int, vertices: int, shapes: int, texture: Optional[str] = None) -> int:
+    """
+    The smallest card size, in clusters, that holds the given saves.
+    """
+    def clusters_of(size: int) -> int:
+        return max(1, -(-size // CLUSTER_SIZE))
+
+    icon = clusters_of(len(icon_bytes(vertices, shapes, texture=texture)))
+    per_save = clusters_of(len(icon_sys_bytes(""))) + icon + clusters_of(4 * ENTRY_SIZE)
+    needed = saves * per_save + clusters_of((saves + 2) * ENTRY_SIZE)
+    clusters = MIN_CLUSTERS
+    while True:
+        fat_clusters = -(-clusters * 4 // CLUSTER_SIZE)
+        if clusters - (IFC_CLUSTER + 1 + fat_clusters) - BACKUP_CLUSTERS >= needed:
+            return clusters
+        if clusters >= MAX_CLUSTERS:
+            raise ValueError("the saves don't fit on the largest card")
+        clusters *= 2
+
+
+def write_card(
+    path: str,
+    saves: int = 10,
+    vertices: int = 1000,
+    shapes: int = 3,
+    fragmentation: float = 0.0,
+    texture: Optional[str] = "compressed",
+    seed: int = 0,
+) -> int:
+    """
+    Write a memory card image holding synthetic saves named `BASLUS-00000` onwards.
+
+    Parameters:
+    - path (str): The card image to write.
+    - saves (int): The number of saves.
+    - vertices (int): The number of vertices of every icon.
+    - shapes (int): The number of animation shapes of every icon.
+    - fragmentation (float): The share of clusters, from 0 to 1, allocated out of order.
+    - texture (str): The icon texture, None, `raw` or `compressed`.
+    - seed (int): Seed of the icon data and the cluster order.
+
+    Returns:
+        int: The size of the card in clusters, the smallest size that fits the saves.
+    """
+    rng = np.random.default_rng(seed)
+    clusters = card_clusters(saves, vertices, shapes, texture)
+    fat_clusters = -(-clusters * 4 // CLUSTER_SIZE)
+    alloc_offset = IFC_CLUSTER + 1 + fat_clusters
+    alloc_end = clusters - alloc_offset - BACKUP_CLUSTERS
+    image = np.zeros((clusters, CLUSTER_SIZE), dtype=np.uint8)
+    allocator = _Allocator(alloc_end, fragmentation, rng)
+
+    def write(chain: List[int], data: bytes):
+        data = np.frombuffer(data.ljust(len(chain) * CLUSTER_SIZE, b"\0"), dtype=np.uint8)
+        image[np.asarray(chain) + alloc_offset] = data.reshape(-1, CLUSTER_SIZE)
+
+    root_size = (saves + 2) * ENTRY_SIZE
+    root_chain = allocator.alloc(root_size)
+    root_entries = []
+    for index in range(saves):
+        name = f"BASLUS-{index:05d}"
+        icon_sys = icon_sys_bytes(f"Save {index}")
+        icon = icon_bytes(vertices, shapes, seed=seed + index, texture=texture)
+        icon_sys_chain, icon_chain = allocator.alloc(len(icon_sys)), allocator.alloc(len(icon))
+        directory_chain = allocator.alloc(4 * ENTRY_SIZE)
+        write(icon_sys_chain, icon_sys)
+        write(icon_chain, icon)
+        write(directory_chain, b"".join([
+            _entry(DIRECTORY_MODE, 4, root_chain[0], "."),
+            _entry(DIRECTORY_MODE, 0, 0, ".."),
+            _entry(FILE_MODE, len(icon_sys), icon_sys_chain[0], "icon.sys"),
+            _entry(FILE_MODE, len(icon), icon_chain[0], "icon.ico"),
+        ]))
+        root_entries.append(_entry(DIRECTORY_MODE, 4, directory_chain[0], name))
+    write(root_chain, b"".join([
+        _entry(DIRECTORY_MODE, saves + 2, root_chain[0], "."),
+        _entry(DIRECTORY_MODE, 0, 0, ".."),
+        *root_entries,
+    ]))
+
+    # The FAT clusters follow the indirect FAT cluster, which is listed in the superblock.
+    fat = np.full(fat_clusters * CLUSTER_SIZE // 4, FAT_FREE, dtype="<u4")
+    fat[:alloc_end] = allocator.fat
+    image[IFC_CLUSTER + 1:alloc_offset] = fat.view(np.uint8).reshape(fat_clusters, CLUSTER_SIZE)
+    ifc = np.full(CLUSTER_SIZE // 4, FAT_CHAIN_END, dtype="<u4")
+    ifc[:fat_clusters] = np.arange(IFC_CLUSTER + 1, alloc_offset)
+    image[IFC_CLUSTER] = ifc.view(np.uint8)
+    superblock = struct.pack(
+        "<28s12sHHHHLLLLLL8s128s128sBBxx",
+        b"Sony PS2 Memory Card Format ",
+        b"1.2.0.0",
+        PAGE_SIZE,
+        PAGES_PER_CLUSTER,
+        PAGES_PER_BLOCK,
+        0xFF00,
+        clusters,
+        alloc_offset,
+        alloc_end,
+        root_chain[0],
+        clusters // (PAGES_PER_BLOCK // PAGES_PER_CLUSTER) - 1,
+        clusters // (PAGES_PER_BLOCK // PAGES_PER_CLUSTER) - 2,
+        b"",
+        struct.pack("<32I", IFC_CLUSTER, *[0] * 31),
+        b"\xff" * 128,
+        2,
+        0x52,
+    )
+    image[0, :len(superblock)] = np.frombuffer(superblock, dtype=np.uint8)
+
+    pages = image.reshape(-1, PAGE_SIZE)
+    spare = np.zeros((len(pages), SPARE_SIZE), dtype=np.uint8)
+    spare[:, :PAGE_SIZE // 128 * 3] = page_ecc(pages)
+    with open(path, "wb") as f:
+        f.write(np.hstack([pages, spare]).tobytes())
+    return clusters
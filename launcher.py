@@ -1,6 +1,9 @@
+import multiprocessing
 import sys
 from ps2mc_browser.wxwindow import main
 
 
 if __name__ == "__main__":
+    # the library scans cards on spawned processes, which frozen builds must support
+    multiprocessing.freeze_support()
     sys.exit(main())
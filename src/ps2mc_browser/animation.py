@@ -0,0 +1,121 @@
+"""
+The animation timelines of icons.
+
+An icon plays its animation shapes one after another, tweening from each
+shape into the next. Which shapes and how far between them only depend on the
+animation frame, so they are computed once per icon, when its model is
+loaded, into a table indexed by frame rather than with float math every frame.
+"""
+import math
+from typing import List, Tuple
+
+import numpy as np
+from ps2mc.icon import Icon
+
+
+class AnimationTimeline:
+    """
+    The current shape, next shape and tween factor of every frame of an icon animation.
+    """
+
+    FPS = 60  # Frames Per Second of the icon animations
+
+    DTYPE = np.dtype([("shape", "i4"), ("next_shape", "i4"), ("tween", "f4")])
+
+    def __init__(self, icon: Icon):
+        """
+        Parameters:
+        - icon (Icon): The icon, only its animation header is read.
+        """
+        self.anim_speed = icon.anim_speed
+        self.frame_length = max(1, int(icon.frame_length))
+        shapes = max(1, icon.animation_shapes)
+        frames_in_shape = self.frame_length / shapes
+        frame = np.arange(self.frame_length)
+        self.table = np.zeros(self.frame_length, dtype=AnimationTimeline.DTYPE)
+        self.table["shape"] = frame // frames_in_shape
+        self.table["next_shape"] = (self.table["shape"] + 1) % shapes
+        self.table["tween"] = frame % frames_in_shape / frames_in_shape
+        # the rows as tuples, faster than indexing the array from Python
+        self.rows: List[Tuple[int, int, float]] = self.table.tolist()
+
+    def frame(self, animation_time: float) -> int:
+        """
+        The frame played at the given time, looping through the animation.
+
+        Parameters:
+        - animation_time (float): The playback time of the animation in seconds.
+
+        Returns:
+            int: The frame index.
+        """
+        return int(animation_time * AnimationTimeline.FPS * self.anim_speed) % self.frame_length
+
+    @property
+    def duration(self) -> float:
+        """
+        The seconds of one loop of the animation, 0 if it doesn't play.
+        """
+        if self.anim_speed <= 0:
+            return 0.0
+        return self.frame_length / (AnimationTimeline.FPS * self.anim_speed)
+
+    def __getitem__(self, frame: int) -> Tuple[int, int, float]:
+        """
+        The current shape, next shape and tween factor of a frame.
+        """
+        return self.rows[frame]
+
+    def __len__(self) -> int:
+        return self.frame_length
+
+
+class TimelineTable:
+    """
+    The timelines of many icons concatenated into one table,
+    for looking up the frames of all of them at once.
+    """
+
+    def __init__(self, timelines: List[AnimationTimeline]):
+        self.frame_length = np.array([timeline.frame_length for timeline in timelines], dtype="i8")
+        self.anim_speed = np.array([timeline.anim_speed for timeline in timelines], dtype="f8")
+        # the row of the first frame of every timeline
+        self.offsets = np.cumsum(self.frame_length) - self.frame_length
+        self.table = (
+            np.concatenate([timeline.table for timeline in timelines])
+            if timelines else np.zeros(0, dtype=AnimationTimeline.DTYPE)
+        )
+
+    @property
+    def duration(self) -> float:
+        """
+        The seconds of one loop of the longest animation.
+        """
+        playing = self.anim_speed > 0
+        if not playing.any():
+            return 0.0
+        return float((self.frame_length[playing] / (AnimationTimeline.FPS * self.anim_speed[playing])).max())
+
+    def lookup(self, animation_time: float) -> np.ndarray:
+        """
+        The current shape, next shape and tween factor of every icon at the given time.
+
+        Returns:
+            np.ndarray: The rows of the table, in `AnimationTimeline.DTYPE`.
+        """
+        frame = (animation_time * AnimationTimeline.FPS * self.anim_speed).astype("i8") % self.frame_length
+        return self.table[self.offsets + frame]
+
+
+def y_rotation(angle: float) -> Tuple[float, ...]:
+    """
+    The 4x4 matrix of a rotation around the y-axis, in column-major order,
+    the same as `glm.rotate(glm.mat4(), angle, glm.vec3(0, 1, 0))` up to rounding.
+    """
+    c, s = math.cos(angle), math.sin(angle)
+    return (
+        c, 0.0, -s, 0.0,
+        0.0, 1.0, 0.0, 0.0,
+        s, 0.0, c, 0.0,
+        0.0, 0.0, 0.0, 1.0,
+    )
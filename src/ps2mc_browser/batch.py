@@ -0,0 +1,183 @@
+"""
+Render the saves of many memory cards on a pool of processes.
+
+Every worker process holds its own OpenGL context and compiled shader
+programs. Work is scheduled per save rather than per card, so a large card
+is spread over all the workers instead of holding up the end of the run.
+Cards are listed as the queue of the pool drains rather than all up front,
+so the renders of a card follow its listing while the card is still open in
+the workers, and the memory of the run doesn't grow with the archive.
+"""
+import multiprocessing
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
+
+from .card import MmapBrowser
+from .headless import OffscreenRenderer, card_root, output_path, unique_cards
+
+
+# The state of a worker process.
+_renderer: Optional[OffscreenRenderer] = None
+_browsers: "OrderedDict[str, MmapBrowser]" = OrderedDict()
+_BROWSERS = 4  # memory cards kept open by a worker
+QUEUE_PER_JOB = 2  # tasks queued per worker before the next card is listed
+
+
+def _init_worker(size: Tuple[int, int]):
+    global _renderer
+    _renderer = OffscreenRenderer(size)
+
+
+def _browser(mc_path: str) -> MmapBrowser:
+    """
+    The browser of a memory card, kept open for the next saves of the same card.
+    """
+    browser = _browsers.get(mc_path)
+    if browser is None:
+        browser = MmapBrowser(mc_path)
+        _browsers[mc_path] = browser
+        while len(_browsers) > _BROWSERS:
+            _browsers.popitem(last=False)[1].close()
+    else:
+        _browsers.move_to_end(mc_path)
+    return browser
+
+
+def _list_card(mc_path: str) -> List[str]:
+    return [entry.name for entry in _browser(mc_path).list_root_dir()]
+
+
+def _render_save(mc_path: str, game: str, path: str, frames: int, fps: int) -> float:
+    start = time.perf_counter()
+    _renderer.render_save(_browser(mc_path), (mc_path, game), path, frames, fps)
+    return time.perf_counter() - start
+
+
+class CardStats:
+    """
+    Throughput of the rendering of one memory card.
+    """
+
+    def __init__(self, mc_path: str):
+        self.mc_path = mc_path
+        self.saves = 0
+        self.failed = 0
+        self.pending = 0
+        # seconds spent in the workers
+        self.render_time = 0.0
+        # from the listing of the card, not counting the time it was queued behind other cards
+        self.start: Optional[float] = None
+        self.end: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        if self.start is None:
+            return 0.0
+        return (self.end or time.perf_counter()) - self.start
+
+    def __str__(self) -> str:
+        rate = self.saves / self.elapsed if self.elapsed > 0 else 0.0
+        failed = f", {self.failed} failed" if self.failed else ""
+        return (
+            f"{self.mc_path}: {self.saves} saves{failed} in {self.elapsed:.2f}s "
+            f"({rate:.1f} saves/s, {self.render_time:.2f}s in workers)"
+        )
+
+
+def render_cards(
+    cards: List[str],
+    out_dir: str,
+    size: Tuple[int, int],
+    image_format: str = "png",
+    frames: int = 1,
+    fps: int = 20,
+    jobs: Optional[int] = None,
+    verbose: bool = True,
+) -> Dict[str, CardStats]:
+    """
+    Render every save on the given memory cards on a process pool.
+
+    Parameters:
+    - cards (List[str]): The paths to the memory card images.
+    - out_dir (str): The output directory.
+    - size (Tuple[int, int]): The size of the rendered images.
+    - image_format (str): One of `headless.FORMATS`.
+    - frames (int): The number of frames of animated images, 0 for one loop of the animation.
+    - fps (int): The frame rate of animated images.
+    - jobs (int): The number of worker processes, the number of CPUs by default.
+    - verbose (bool): Whether to print the throughput of each card and of the whole run.
+
+    Returns:
+        Dict[str, CardStats]: The throughput of each card.
+    """
+    frames = 1 if image_format == "png" else frames
+    jobs = jobs or os.cpu_count() or 1
+    cards = unique_cards(cards)
+    root = card_root(cards)
+    stats = {mc_path: CardStats(mc_path) for mc_path in cards}
+    start = time.perf_counter()
+    # Workers own OpenGL contexts, which must not be inherited through fork.
+    mp_context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(jobs, mp_context=mp_context, initializer=_init_worker, initargs=(size,)) as pool:
+        listings: Dict[Future, str] = {}
+        renders: Dict[Future, Tuple[str, str]] = {}
+        pending = set()
+        next_card = 0
+        while True:
+            # keep the workers busy, but only list the next card once the queue runs low
+            while next_card < len(cards) and len(pending) < QUEUE_PER_JOB * jobs:
+                listing = pool.submit(_list_card, cards[next_card])
+                listings[listing] = cards[next_card]
+                pending.add(listing)
+                next_card += 1
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in listings:
+                    mc_path = listings.pop(future)
+                    card = stats[mc_path]
+                    card.start = time.perf_counter()
+                    try:
+                        games = future.result()
+                    except Exception as e:
+                        card.failed += 1
+                        card.end = card.start
+                        if verbose:
+                            print(f"{mc_path}: failed to open: {e}")
+                        continue
+                    card.pending = len(games)
+                    for game in games:
+                        path = output_path(out_dir, mc_path, game, image_format, root)
+                        render = pool.submit(_render_save, mc_path, game, path, frames, fps)
+                        renders[render] = (mc_path, game)
+                        pending.add(render)
+                    if not games:
+                        card.end = time.perf_counter()
+                else:
+                    mc_path, game = renders.pop(future)
+                    card = stats[mc_path]
+                    card.pending -= 1
+                    try:
+                        card.render_time += future.result()
+                        card.saves += 1
+                    except Exception as e:
+                        card.failed += 1
+                        if verbose:
+                            print(f"{mc_path}: failed to render {game}: {e}")
+                    if card.pending == 0:
+                        card.end = time.perf_counter()
+                        if verbose:
+                            print(card)
+
+    if verbose:
+        elapsed = time.perf_counter() - start
+        saves = sum(card.saves for card in stats.values())
+        print(
+            f"{len(cards)} cards, {saves} saves in {elapsed:.2f}s "
+            f"({len(cards) / elapsed:.1f} cards/s, {saves / elapsed:.1f} saves/s)"
+        )
+    return stats
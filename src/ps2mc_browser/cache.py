@@ -0,0 +1,130 @@
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterable, Optional
+
+
+class ModelCache:
+    """
+    A bounded LRU cache of GPU resident models.
+
+    A model is any object with an `nbytes` attribute and a `release` method,
+    such as `IconModel` and `BgModel`. Models are keyed by
+    `(card path, directory name, icon index)` and evicted, least recently used
+    first, by releasing them once the GPU memory of their buffers exceeds the
+    budget. Models that are currently drawn can be retained so they are never
+    evicted from under the canvas.
+
+    The texture layers of the icons are not counted, as the texture array
+    doesn't shrink when they are freed. The array is capped by
+    `TextureManager.max_layers` instead, and `evict_one` frees layers once it is full.
+    """
+
+    DEFAULT_BUDGET = 64 * 1024 * 1024  # bytes
+
+    def __init__(self, budget: int = DEFAULT_BUDGET):
+        """
+        Parameters:
+        - budget (int): The GPU memory budget in bytes.
+        """
+        self.budget = budget
+        self.nbytes = 0
+        self.models: OrderedDict[Hashable, Any] = OrderedDict()
+        self.retained: set[Hashable] = set()
+        # invalidated models that were still retained, released on the next retain
+        self.stale: list[Any] = []
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.models
+
+    def __len__(self) -> int:
+        return len(self.models)
+
+    def get(self, key: Hashable, factory: Optional[Callable[[], Any]] = None) -> Any:
+        """
+        Look up a model, building and caching it with `factory` when missing.
+
+        Parameters:
+        - key (Hashable): The `(card path, directory name, icon index)` key.
+        - factory (Callable): Builds the model on a cache miss.
+
+        Returns:
+            Any: The cached model, or None if missing and no factory is given.
+        """
+        model = self.models.get(key)
+        if model is not None:
+            self.models.move_to_end(key)
+            return model
+        if factory is None:
+            return None
+        model = factory()
+        self.models[key] = model
+        self.nbytes += model.nbytes
+        self.evict()
+        return model
+
+    def retain(self, keys: Iterable[Hashable]):
+        """
+        Protect the given keys from eviction, replacing the previously retained ones.
+        """
+        self.retained = set(keys)
+        [model.release() for model in self.stale]
+        self.stale = []
+        self.evict()
+
+    def evict(self):
+        """
+        Release least recently used models until the cache fits in its budget.
+        The most recently used model is always kept, even if it alone exceeds the budget.
+        """
+        for key in list(self.models)[:-1]:
+            if self.nbytes <= self.budget:
+                break
+            if key not in self.retained:
+                self.__release(key)
+
+    def evict_one(self) -> bool:
+        """
+        Release the least recently used model that isn't retained, whatever the budget,
+        to free memory the budget doesn't account for. The most recently used model is kept.
+
+        Returns:
+            bool: Whether a model was released.
+        """
+        for key in list(self.models)[:-1]:
+            if key not in self.retained:
+                self.__release(key)
+                return True
+        return False
+
+    def invalidate(self, card: str, directory: Optional[str] = None):
+        """
+        Release the models of a memory card, or of one of its save directories.
+        Retained models are dropped from the cache at once, but only released
+        when other models are retained in their place.
+
+        Parameters:
+        - card (str): The memory card path.
+        - directory (str): The save directory name, or None for the whole card.
+        """
+        for key in list(self.models):
+            if key[0] == card and (directory is None or key[1] == directory):
+                if key in self.retained:
+                    model = self.models.pop(key)
+                    self.nbytes -= model.nbytes
+                    self.stale.append(model)
+                else:
+                    self.__release(key)
+
+    def clear(self):
+        """
+        Release every cached model.
+        """
+        for key in list(self.models):
+            self.__release(key)
+        [model.release() for model in self.stale]
+        self.stale = []
+        self.retained = set()
+
+    def __release(self, key: Hashable):
+        model = self.models.pop(key)
+        self.nbytes -= model.nbytes
+        model.release()
@@ -0,0 +1,258 @@
+import mmap
+import os
+from io import BufferedReader
+from typing import Iterator, List, Optional, Tuple
+
+from ps2mc.browser import Browser
+from ps2mc.icon import IconSys
+from ps2mc.ps2mc import Entry, Fat, Ps2mc
+
+from .icon import ArrayIcon
+
+
+class MmapPs2mc(Ps2mc):
+    """
+    A Ps2mc reading the memory card image through a read-only memory map.
+
+    Pages, their spare (ECC) areas and the data of files are handed out as
+    zero-copy `memoryview` slices of the map instead of being read with
+    `seek` and `read`, so reads don't share a file position and several
+    views of the same card share the OS page cache.
+
+    The root directory can be left unread when the card is opened, and then
+    read cluster by cluster with `iter_root_entries`.
+    """
+
+    def __init__(self, file: BufferedReader, list_root: bool = True):
+        """
+        Parameters:
+        - file (BufferedReader): The memory card image opened in binary mode.
+        - list_root (bool): Whether to read the root directory at once,
+          otherwise it is read by `iter_root_entries` or when `entries_in_root` is first used.
+        """
+        self.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.mmap)
+        # makes `Ps2mc.__init__` skip the listing of the root directory
+        self.__defer_root = not list_root
+        super().__init__(file)
+        self.__defer_root = False
+        self.page_count = len(self.mmap) // self.raw_page_size
+
+    @property
+    def entries_in_root(self) -> List[Entry]:
+        if self.__entries_in_root is None:
+            for _ in self.iter_root_entries():
+                pass
+        return self.__entries_in_root
+
+    @entries_in_root.setter
+    def entries_in_root(self, entries: Optional[List[Entry]]):
+        self.__entries_in_root = entries
+
+    def read_page(self, n: int) -> memoryview:
+        """
+        Read the byte data of a page from the memory card.
+
+        Parameters:
+        - n (int): Page number.
+
+        Returns:
+            memoryview: Data of the specified page.
+        """
+        offset = self.raw_page_size * n
+        return self.view[offset: offset + self.page_size]
+
+    def read_spare(self, n: int) -> memoryview:
+        """
+        Read the spare area of a page, which holds the ECC of the page data.
+
+        Parameters:
+        - n (int): Page number.
+
+        Returns:
+            memoryview: The spare area of the specified page.
+        """
+        offset = self.raw_page_size * n + self.page_size
+        return self.view[offset: offset + self.spare_size]
+
+    def read_cluster(self, n: int) -> bytes:
+        """
+        Read the byte data of a cluster from the memory card.
+
+        Parameters:
+        - n (int): Cluster number.
+
+        Returns:
+            bytes: Data read from the specified cluster.
+        """
+        page_index = n * self.pages_per_cluster
+        return b"".join(self.read_page(page_index + i) for i in range(self.pages_per_cluster))
+
+    def iter_data_pages(self, entry: Entry) -> Iterator[memoryview]:
+        """
+        Iterate over the data of a file, page by page, following its cluster chain.
+
+        Parameters:
+        - entry (Entry): Entry object representing the file.
+
+        Returns:
+            Iterator[memoryview]: The data of the file, one page at a time.
+        """
+        remaining = entry.length
+        chain_start = entry.cluster
+        while chain_start != Fat.CHAIN_END and remaining > 0:
+            page_index = (chain_start + self.alloc_offset) * self.pages_per_cluster
+            for i in range(self.pages_per_cluster):
+                if remaining <= 0:
+                    break
+                page = self.read_page(page_index + i)[:remaining]
+                remaining -= len(page)
+                yield page
+            chain_start = self.get_fat_value(chain_start)
+
+    def find_sub_entries(self, parent_entry: Entry) -> Optional[List[Entry]]:
+        """
+        Find sub-entries for a given parent entry.
+
+        Parameters:
+        - parent_entry (Entry): Parent entry.
+
+        Returns:
+            List[Entry]: List of sub-entries, None for the root directory while it is deferred.
+        """
+        if self.__defer_root:
+            return None
+        return [entry for entries in self.iter_sub_entries(parent_entry) for entry in entries]
+
+    def iter_sub_entries(self, parent_entry: Entry) -> Iterator[List[Entry]]:
+        """
+        Iterate over the sub-entries of a directory, one entry cluster at a time.
+        Like `find_sub_entries`, the entries whose names start with a dot are skipped.
+
+        Parameters:
+        - parent_entry (Entry): Entry object representing the directory.
+
+        Returns:
+            Iterator[List[Entry]]: The sub-entries read from each cluster.
+        """
+        remaining = parent_entry.length
+        chain_start = parent_entry.cluster
+        while chain_start != Fat.CHAIN_END and remaining > 0:
+            entries = [entry.unpack() for entry in self.read_entry_cluster(chain_start)[:remaining]]
+            remaining -= len(entries)
+            yield [entry for entry in entries if not entry.name.startswith(".")]
+            chain_start = self.get_fat_value(chain_start)
+
+    def iter_root_entries(self) -> Iterator[List[Entry]]:
+        """
+        Read the root directory one entry cluster at a time,
+        setting `entries_in_root` once all of it is read.
+
+        Returns:
+            Iterator[List[Entry]]: The entries read from each cluster.
+        """
+        root_entries = []
+        for entries in self.iter_sub_entries(self.root_entry):
+            root_entries.extend(entries)
+            yield entries
+        self.entries_in_root = root_entries
+
+    def read_data_cluster(self, entry: Entry) -> bytes:
+        """
+        Read data from a chain of "data clusters" associated with a file.
+
+        Parameters:
+        - entry (Entry): Entry object representing the file.
+
+        Returns:
+            bytes: Data bytes of the file.
+        """
+        return b"".join(self.iter_data_pages(entry))
+
+    def close(self):
+        """
+        Unmap the memory card image.
+        """
+        try:
+            self.view.release()
+            self.mmap.close()
+        except BufferError:
+            # Slices handed out are still alive, the map is closed once they are collected.
+            pass
+
+
+class MmapBrowser(Browser):
+    """
+    A browser on top of a memory mapped card image.
+    """
+
+    def __init__(self, file_path: str, list_root: bool = True):
+        """
+        Initialize the Browser with the path to a PS2 memory card file.
+
+        Parameters:
+        - file_path (str): The path to the PS2 memory card file.
+        - list_root (bool): Whether to read the root directory at once, see `MmapPs2mc`.
+        """
+        self.file = open(file_path, "rb")
+        try:
+            self.ps2mc = MmapPs2mc(self.file, list_root)
+        except Exception:
+            self.file.close()
+            raise
+
+    def iter_root_dir(self) -> Iterator[List[Entry]]:
+        """
+        List the root directory one entry cluster at a time, like `list_root_dir`.
+
+        Returns:
+            Iterator[List[Entry]]: The existing entries read from each cluster.
+        """
+        for entries in self.ps2mc.iter_root_entries():
+            yield [entry for entry in entries if entry.is_exists()]
+
+    def export(self, name: str, dest: str):
+        """
+        Export the files of a game, writing each page straight from the map.
+
+        Parameters:
+        - name (str): The name of the game to be exported.
+        - dest (str): The destination directory where the files will be exported.
+
+        Raises:
+        - Error: If the specified game name cannot be found.
+        """
+        dir_path = os.path.join(dest, name)
+        if not os.path.exists(dir_path):
+            os.mkdir(dir_path)
+        entries = self.lookup_entry_by_name(name)
+        for entry in entries:
+            if entry.is_file():
+                with open(os.path.join(dir_path, entry.name), "wb") as f:
+                    for page in self.ps2mc.iter_data_pages(entry):
+                        f.write(page)
+
+    def get_icon(self, name: str) -> Tuple[IconSys, List[ArrayIcon]]:
+        """
+        Get icon information for a specified game, the icons being decoded into arrays.
+
+        Parameters:
+        - name (str): The name of the game.
+
+        Returns:
+        Tuple: A tuple containing IconSys and a list of Icons associated with the game.
+        """
+        entries = {e.name: e for e in self.lookup_entry_by_name(name) if e.is_file()}
+        icon_sys = IconSys(self.ps2mc.read_data_cluster(entries["icon.sys"]))
+        icon_names = dict.fromkeys(
+            (icon_sys.icon_file_normal, icon_sys.icon_file_copy, icon_sys.icon_file_delete)
+        )
+        icons = [ArrayIcon(self.ps2mc.read_data_cluster(entries[icon_name])) for icon_name in icon_names]
+        return icon_sys, icons
+
+    def close(self):
+        """
+        Unmap and close the memory card image.
+        """
+        self.ps2mc.close()
+        self.file.close()
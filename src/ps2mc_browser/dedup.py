@@ -0,0 +1,346 @@
+"""
+Find the duplicated saves of an archive of memory cards.
+
+The files of every save are hashed straight from the card images, page by
+page, on a pool of processes. The hashes are cached per card, so running
+again only hashes the cards that changed. Saves whose files are all identical
+are duplicates; saves of the same directory with different contents are
+versions of a save at different progress points, which often share most of
+their files.
+"""
+import argparse
+import contextlib
+import hashlib
+import json
+import multiprocessing
+import os
+import sqlite3
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from .card import MmapBrowser
+from .diskcache import default_cache_dir
+from .library import entry_time, find_cards
+
+
+def _hash_card(mc_path: str) -> List[tuple]:
+    """
+    Hash the files of every save of a memory card, in a worker process.
+
+    Returns:
+        List[tuple]: The save directory, its modification time, and the name,
+        size and hash of each of its files.
+    """
+    browser = MmapBrowser(mc_path)
+    try:
+        rows = []
+        for entry in browser.list_root_dir():
+            if not entry.is_dir():
+                continue
+            modified = entry_time(entry.modified)
+            for sub_entry in browser.lookup_entry(entry):
+                if not sub_entry.is_file():
+                    continue
+                digest = hashlib.blake2b(digest_size=16)
+                for page in browser.ps2mc.iter_data_pages(sub_entry):
+                    digest.update(page)
+                rows.append((entry.name, modified, sub_entry.name, sub_entry.length, digest.hexdigest()))
+        return rows
+    finally:
+        browser.close()
+
+
+class SaveHash:
+    """
+    The content hashes of a save.
+    """
+
+    def __init__(self, card: str, directory: str, modified: str):
+        self.card = card
+        self.directory = directory
+        self.modified = modified
+        # the size and hash of every file, by name
+        self.files: Dict[str, Tuple[int, str]] = {}
+
+    @property
+    def size(self) -> int:
+        return sum(size for size, _ in self.files.values())
+
+    @property
+    def digest(self) -> str:
+        """
+        The hash of the save, over the names and hashes of its files.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        for name in sorted(self.files):
+            digest.update(name.encode())
+            digest.update(bytes.fromhex(self.files[name][1]))
+        return digest.hexdigest()
+
+    def shared_bytes(self, other: "SaveHash") -> int:
+        """
+        The size of the files whose content is also found in another save.
+        """
+        other_digests = {digest for _, digest in other.files.values()}
+        return sum(size for size, digest in self.files.values() if digest in other_digests)
+
+
+class HashCache:
+    """
+    A persistent cache of the file hashes of memory cards, keyed by
+    the path, size and modification time of every card.
+    """
+
+    SCHEMA_VERSION = 1
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Parameters:
+        - path (str): The database file, in the per-user cache directory by default.
+        """
+        self.path = path or os.path.join(default_cache_dir(), f"hashes-v{HashCache.SCHEMA_VERSION}.sqlite3")
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self.connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS cards (
+                    id INTEGER PRIMARY KEY,
+                    path TEXT UNIQUE NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS files (
+                    card_id INTEGER NOT NULL REFERENCES cards(id) ON DELETE CASCADE,
+                    directory TEXT NOT NULL,
+                    modified TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    digest TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS files_card ON files(card_id);
+            """)
+
+    @contextlib.contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        """
+        A connection to the database, committed and closed on exit.
+        """
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA foreign_keys = ON")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def hash_cards(
+        self,
+        cards: Dict[str, Tuple[int, int]],
+        max_workers: Optional[int] = None,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+    ) -> Tuple[List[SaveHash], List[Tuple[str, Exception]]]:
+        """
+        Hash the saves of memory cards, reusing the cached hashes of the cards that didn't change.
+
+        Parameters:
+        - cards (Dict[str, Tuple[int, int]]): The size and modification time of every card,
+          as returned by `library.find_cards`.
+        - max_workers (int): The number of worker processes, one per CPU by default.
+        - on_progress (Callable): Called with the number of cards hashed and to hash.
+
+        Returns:
+            Tuple[List[SaveHash], List[Tuple[str, Exception]]]: The saves of the cards,
+            and the cards that couldn't be read.
+        """
+        with self.connect() as conn:
+            cached = {
+                path: (size, mtime_ns)
+                for path, size, mtime_ns in conn.execute("SELECT path, size, mtime_ns FROM cards")
+            }
+        changed = [path for path, stat in cards.items() if cached.get(path) != stat]
+
+        failed = []
+        if changed:
+            # forking a multithreaded process isn't safe
+            mp_context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers, mp_context=mp_context) as executor:
+                futures = {executor.submit(_hash_card, path): path for path in changed}
+                for done, future in enumerate(as_completed(futures), 1):
+                    path = futures[future]
+                    try:
+                        self.__store(path, cards[path], future.result())
+                    except Exception as e:
+                        failed.append((path, e))
+                    if on_progress is not None:
+                        on_progress(done, len(changed))
+
+        saves: Dict[Tuple[str, str], SaveHash] = {}
+        failed_paths = {path for path, _ in failed}
+        with self.connect() as conn:
+            rows = conn.execute("""
+                SELECT cards.path, files.directory, files.modified, files.name, files.size, files.digest
+                FROM files JOIN cards ON files.card_id = cards.id
+            """)
+            for path, directory, modified, name, size, digest in rows:
+                if path not in cards or path in failed_paths:
+                    continue
+                save = saves.get((path, directory))
+                if save is None:
+                    save = saves[(path, directory)] = SaveHash(path, directory, modified)
+                save.files[name] = (size, digest)
+        return list(saves.values()), failed
+
+    def __store(self, path: str, stat: Tuple[int, int], rows: List[tuple]):
+        with self.connect() as conn:
+            conn.execute("DELETE FROM cards WHERE path = ?", (path,))
+            card_id = conn.execute(
+                "INSERT INTO cards (path, size, mtime_ns) VALUES (?, ?, ?)", (path, *stat)
+            ).lastrowid
+            conn.executemany(
+                "INSERT INTO files VALUES (?, ?, ?, ?, ?, ?)", [(card_id, *row) for row in rows]
+            )
+
+
+class DedupReport:
+    """
+    The duplicated saves and the versions of saves found among the saves of many cards.
+    """
+
+    def __init__(self, saves: List[SaveHash]):
+        """
+        Parameters:
+        - saves (List[SaveHash]): The saves of all cards.
+        """
+        self.saves = saves
+        by_digest: Dict[str, List[SaveHash]] = defaultdict(list)
+        for save in saves:
+            by_digest[save.digest].append(save)
+        # the copies of every save found more than once, largest first
+        self.duplicates = sorted(
+            (copies for copies in by_digest.values() if len(copies) > 1),
+            key=lambda copies: -copies[0].size * (len(copies) - 1),
+        )
+
+        # the distinct contents of every save directory found with several, oldest first
+        by_directory: Dict[str, Dict[str, SaveHash]] = defaultdict(dict)
+        for save in saves:
+            by_directory[save.directory].setdefault(save.digest, save)
+        self.versions = {
+            directory: sorted(contents.values(), key=lambda save: save.modified)
+            for directory, contents in sorted(by_directory.items())
+            if len(contents) > 1
+        }
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(save.size for save in self.saves)
+
+    @property
+    def duplicate_bytes(self) -> int:
+        """
+        The storage taken by the extra copies of identical saves.
+        """
+        return sum(copies[0].size * (len(copies) - 1) for copies in self.duplicates)
+
+    @property
+    def file_duplicate_bytes(self) -> int:
+        """
+        The storage taken by extra copies of identical files, in any save,
+        which deduplicating at the file level would reclaim.
+        """
+        unique = {}
+        for save in self.saves:
+            for size, digest in save.files.values():
+                unique[digest] = size
+        return self.total_bytes - sum(unique.values())
+
+    def to_dict(self) -> dict:
+        return {
+            "saves": len(self.saves),
+            "total_bytes": self.total_bytes,
+            "duplicate_bytes": self.duplicate_bytes,
+            "file_duplicate_bytes": self.file_duplicate_bytes,
+            "duplicates": [
+                {
+                    "directory": copies[0].directory,
+                    "size": copies[0].size,
+                    "digest": copies[0].digest,
+                    "cards": [save.card for save in copies],
+                }
+                for copies in self.duplicates
+            ],
+            "versions": {
+                directory: [
+                    {
+                        "card": save.card,
+                        "modified": save.modified,
+                        "size": save.size,
+                        "digest": save.digest,
+                        "shared_bytes": save.shared_bytes(versions[-1]),
+                    }
+                    for save in versions
+                ]
+                for directory, versions in self.versions.items()
+            },
+        }
+
+    def __str__(self) -> str:
+        lines = []
+        for copies in self.duplicates:
+            lines.append(f"{copies[0].directory}: {len(copies)} identical copies of {copies[0].size / 1024:,.1f} KiB")
+            lines.extend(f"    {save.card}" for save in copies)
+        for directory, versions in self.versions.items():
+            latest = versions[-1]
+            lines.append(f"{directory}: {len(versions)} versions")
+            for save in versions:
+                shared = save.shared_bytes(latest) / save.size if save.size else 1.0
+                note = "latest" if save is latest else f"{shared:.0%} shared with the latest"
+                lines.append(f"    {save.modified}  {save.size / 1024:8,.1f} KiB  {note}  {save.card}")
+        lines.append(
+            f"{len(self.saves)} saves, {self.total_bytes / 1024 / 1024:,.2f} MiB; "
+            f"{sum(len(copies) - 1 for copies in self.duplicates)} duplicates take "
+            f"{self.duplicate_bytes / 1024 / 1024:,.2f} MiB, "
+            f"duplicated files take {self.file_duplicate_bytes / 1024 / 1024:,.2f} MiB"
+        )
+        return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the duplicated saves of PS2 memory cards.")
+    parser.add_argument("paths", nargs="+", metavar="PATH", help="memory card images (.ps2) or directories of them")
+    parser.add_argument("-j", "--jobs", type=int, default=0, help="worker processes, 0 for one per CPU")
+    parser.add_argument("--cache", help="hash cache database, in the user cache directory by default")
+    parser.add_argument("--json", metavar="FILE", help="also write the report as JSON")
+    args = parser.parse_args()
+
+    cards = {}
+    for path in args.paths:
+        if os.path.isdir(path):
+            cards.update(find_cards(path))
+        elif not os.path.exists(path):
+            parser.error(f"no such file or directory: {path}")
+        else:
+            st = os.stat(path)
+            cards[os.path.abspath(path)] = (st.st_size, st.st_mtime_ns)
+
+    start = time.perf_counter()
+    cache = HashCache(args.cache)
+    saves, failed = cache.hash_cards(
+        cards,
+        args.jobs or None,
+        on_progress=lambda done, total: print(f"hashed {done}/{total} changed cards", end="\r"),
+    )
+    print(f"{len(cards)} cards hashed in {time.perf_counter() - start:.2f}s" + " " * 16)
+    for path, e in failed:
+        print(f"{path}: {e}")
+
+    report = DedupReport(saves)
+    print(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report.to_dict(), f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+from ps2mc.browser import Browser
+from ps2mc.icon import Icon, IconSys
+
+from . import utils
+from .icon import ArrayIcon
+from .profiling import profiler
+
+
+def default_cache_dir() -> str:
+    """
+    The per-user cache directory of the application.
+    """
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "ps2mc-browser")
+
+
+def icon_digest(icon_bytes: List[bytes]) -> str:
+    """
+    A hash of the contents of the icon files of a save.
+
+    Parameters:
+    - icon_bytes (List[bytes]): The data of the distinct icon files of the save.
+
+    Returns:
+        str: The hex digest, the key of the save's entry in the `IconCache`.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    for data in icon_bytes:
+        digest.update(len(data).to_bytes(4, "little"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class CachedIcon:
+    """
+    An icon loaded from the disk cache.
+
+    It exposes the animation attributes of `Icon`, while the vertex data is
+    already converted by `utils.convert_icon_vertex_data` and, like the texture,
+    memory mapped from the cache file.
+    """
+
+    def __init__(self, meta: dict, vertex_array: np.ndarray, texture: Optional[np.ndarray]):
+        self.animation_shapes = meta["animation_shapes"]
+        self.vertex_count = meta["vertex_count"]
+        self.frame_length = meta["frame_length"]
+        self.anim_speed = meta["anim_speed"]
+        self.play_offset = meta["play_offset"]
+        self.frame_count = meta["frame_count"]
+        self.vertex_array = vertex_array
+        self.texture = texture
+
+
+class IconCache:
+    """
+    A persistent cache of converted icon geometry and textures.
+
+    Entries are keyed by a hash of the contents of the icon files of a save,
+    so a save is only parsed again once its icons change. Each entry is a
+    directory holding the half-float vertex array and the RGB texture of every
+    icon as `.npy` files, loaded with `np.load(mmap_mode="r")`, next to the
+    animation parameters in `meta.json`.
+
+    The number of entries is capped: once it is exceeded, the least recently
+    used entries, by the modification time of their directory, are deleted.
+    """
+
+    FORMAT_VERSION = 1
+    MAX_ENTRIES = 4096
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = MAX_ENTRIES):
+        """
+        Parameters:
+        - path (str): The cache directory, the per-user cache directory by default.
+        - max_entries (int): The number of entries kept.
+        """
+        self.path = os.path.join(path or default_cache_dir(), f"icons-v{IconCache.FORMAT_VERSION}")
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        # The number of entries, counted when first storing one and refreshed by `prune`.
+        self.entry_count: Optional[int] = None
+
+    def get_icon(self, browser: Browser, name: str) -> Tuple[IconSys, List[Icon]]:
+        """
+        Get icon information for a specified game, from the cache if possible.
+
+        Parameters:
+        - browser (Browser): The browser of the memory card.
+        - name (str): The name of the game.
+
+        Returns:
+            Tuple: A tuple containing IconSys and a list of Icons associated with the game,
+            which are `CachedIcon` instances unless the cache can't be written.
+        """
+        entries = {e.name: e for e in browser.lookup_entry_by_name(name) if e.is_file()}
+        icon_sys_bytes = browser.ps2mc.read_data_cluster(entries["icon.sys"])
+        # The fixed-size icon.sys is needed anyway to find the icon files.
+        icon_sys = IconSys(icon_sys_bytes)
+        icon_names = []
+        for icon_name in (icon_sys.icon_file_normal, icon_sys.icon_file_copy, icon_sys.icon_file_delete):
+            if icon_name not in icon_names:
+                icon_names.append(icon_name)
+        icon_bytes = [browser.ps2mc.read_data_cluster(entries[icon_name]) for icon_name in icon_names]
+
+        entry_path = os.path.join(self.path, icon_digest(icon_bytes))
+
+        icons = self.load(entry_path)
+        if icons is None:
+            with profiler.stage("parse"):
+                icons = [ArrayIcon(data) for data in icon_bytes]
+            self.store(entry_path, icons)
+            # Hand out the stored entry, so its vertex data isn't converted again.
+            icons = self.load(entry_path) or icons
+        return icon_sys, icons
+
+    def load(self, entry_path: str) -> Optional[List[CachedIcon]]:
+        """
+        Load the icons of a cache entry, marking it as recently used. An entry
+        with missing or corrupt files is deleted, so that it can be stored again.
+
+        Returns:
+            List[CachedIcon]: The icons, or None if the entry doesn't exist or can't be read.
+        """
+        try:
+            with open(os.path.join(entry_path, "meta.json")) as f:
+                metas = json.load(f)["icons"]
+            icons = []
+            for index, meta in enumerate(metas):
+                vertex_array = np.load(os.path.join(entry_path, f"{index}.vertex.npy"), mmap_mode="r")
+                texture = None
+                if meta["texture"]:
+                    texture = np.load(os.path.join(entry_path, f"{index}.texture.npy"), mmap_mode="r")
+                icons.append(CachedIcon(meta, vertex_array, texture))
+        except (FileNotFoundError, ValueError, KeyError):
+            shutil.rmtree(entry_path, ignore_errors=True)
+            return None
+        except OSError:
+            # e.g. denied access, the entry may still be fine
+            return None
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+        return icons
+
+    def store(self, entry_path: str, icons: List[Icon]):
+        """
+        Write the converted icons as a cache entry, then `prune` the cache if it
+        holds too many entries. Failures are ignored, the icons are simply parsed
+        again next time.
+        """
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            tmp_path = tempfile.mkdtemp(dir=self.path, prefix=".tmp-")
+        except OSError:
+            return
+        try:
+            metas = []
+            for index, icon in enumerate(icons):
+                with profiler.stage("convert"):
+                    vertex_data = utils.convert_icon_vertex_data(icon)
+                np.save(os.path.join(tmp_path, f"{index}.vertex.npy"), vertex_data)
+                if icon.texture is not None:
+                    np.save(os.path.join(tmp_path, f"{index}.texture.npy"), np.frombuffer(icon.texture, dtype=np.uint8))
+                metas.append({
+                    "animation_shapes": icon.animation_shapes,
+                    "vertex_count": icon.vertex_count,
+                    "frame_length": icon.frame_length,
+                    "anim_speed": icon.anim_speed,
+                    "play_offset": icon.play_offset,
+                    "frame_count": icon.frame_count,
+                    "texture": icon.texture is not None,
+                })
+            with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+                json.dump({"icons": metas}, f)
+            os.replace(tmp_path, entry_path)
+        except OSError:
+            # Also raised when another process stored the same entry first.
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            return
+        with self.lock:
+            if self.entry_count is None:
+                self.entry_count = len(self.__entry_names())
+            else:
+                self.entry_count += 1
+            if self.entry_count > self.max_entries:
+                self.prune()
+
+    def __entry_names(self) -> List[str]:
+        try:
+            return [name for name in os.listdir(self.path) if not name.startswith(".tmp-")]
+        except OSError:
+            return []
+
+    def prune(self, keep: Optional[int] = None):
+        """
+        Delete the least recently used entries.
+
+        Parameters:
+        - keep (int): The number of entries kept, three quarters of `max_entries` by default,
+          so that the cache isn't pruned again on every store.
+        """
+        if keep is None:
+            keep = self.max_entries * 3 // 4
+        entries = []
+        for name in self.__entry_names():
+            entry_path = os.path.join(self.path, name)
+            try:
+                entries.append((os.stat(entry_path).st_mtime, entry_path))
+            except OSError:
+                pass
+        entries.sort(reverse=True)
+        for _, entry_path in entries[keep:]:
+            shutil.rmtree(entry_path, ignore_errors=True)
+        self.entry_count = min(len(entries), keep)
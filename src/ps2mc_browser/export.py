@@ -0,0 +1,296 @@
+"""
+Export the saves of a memory card in bulk.
+
+Saves are exported on a thread pool, every file being streamed to disk page by
+page from the memory mapped card, so a save is never held in memory as a whole.
+Saves are exported either into folders named after them, or packed into .psu
+files, written straight from the card without going through a folder.
+"""
+import contextlib
+import os
+import shutil
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+from ps2mc.error import Error
+from ps2mc.ps2mc import Entry
+
+from .card import MmapBrowser
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+class ExportProgress:
+    """
+    The progress of a bulk export.
+    """
+
+    def __init__(self, saves_total: int, bytes_total: int):
+        self.saves_total = saves_total
+        self.bytes_total = bytes_total
+        self.saves_done = 0
+        self.bytes_done = 0
+        # (save directory name, error) of the saves that failed
+        self.failed: List[Tuple[str, Exception]] = []
+        self.cancelled = False
+        self.start = time.perf_counter()
+        self.end = None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+    @property
+    def throughput(self) -> float:
+        """
+        Bytes written per second.
+        """
+        return self.bytes_done / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.saves_done}/{self.saves_total} saves, "
+            f"{self.bytes_done / 1024:,.0f} of {self.bytes_total / 1024:,.0f} KiB "
+            f"({self.throughput / 1024 / 1024:.1f} MiB/s)"
+        )
+
+
+class BulkExporter:
+    """
+    Exports saves of a memory card into folders named after them, on a thread pool.
+
+    The callbacks are invoked on the worker threads. The exporter opens a
+    browser of its own, so the card may be closed in the UI meanwhile.
+    """
+
+    PROGRESS_INTERVAL = 0.1  # seconds between progress callbacks
+    FORMATS = ("folder", "psu")
+    PSU_CLUSTER_SIZE = 1024  # the data of every file of a .psu is padded to this size
+    PSU_DIR_MODE = 0x8427  # the mode of the "." and ".." entries, an existing readable directory
+    # mode, length, created, cluster, dir_entry, modified, attr and name of a directory entry
+    __psu_entry = struct.Struct("<H2xL8sLL8sL28x32s416x")
+
+    def __init__(
+        self,
+        mc_path: str,
+        games: List[str],
+        dest: str,
+        on_progress: Optional[Callable[[ExportProgress], None]] = None,
+        on_done: Optional[Callable[[ExportProgress], None]] = None,
+        max_workers: Optional[int] = None,
+        format: str = "folder",
+    ):
+        """
+        Parameters:
+        - mc_path (str): The path to the memory card image.
+        - games (List[str]): The save directory names to export.
+        - dest (str): The destination directory.
+        - on_progress (Callable): Called with the progress, at most every `PROGRESS_INTERVAL`.
+        - on_done (Callable): Called with the final progress once all saves are exported,
+          have failed or were cancelled.
+        - max_workers (int): The number of worker threads, up to 4 by default.
+        - format (str): "folder" to export every save into a folder named after it,
+          or "psu" to pack it into a .psu file.
+        """
+        if format not in BulkExporter.FORMATS:
+            raise ValueError(f"unknown export format {format}")
+        self.mc_path = mc_path
+        self.games = games
+        self.dest = dest
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.format = format
+        self.cancelled = threading.Event()
+        self.lock = threading.Lock()
+        self.browser = None
+        self.executor = None
+        self.progress = None
+        self.pending = 0
+        self.last_progress = 0.0
+
+    def start(self):
+        """
+        Open the card and schedule the saves.
+
+        Raises:
+        - Error: If the card can't be opened or a save can't be found.
+        """
+        self.browser = MmapBrowser(self.mc_path)
+        try:
+            saves = [(game, self.files(game)) for game in self.games]
+        except Exception:
+            self.browser.close()
+            raise
+        self.progress = ExportProgress(
+            len(saves), sum(entry.length for _, entries in saves for entry in entries)
+        )
+        self.pending = len(saves)
+        if not saves:
+            self.__finish()
+            return
+        self.executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="export")
+        for game, entries in saves:
+            self.executor.submit(self.__run, game, entries)
+
+    def cancel(self):
+        """
+        Stop the export. The saves being exported are removed, folder or .psu file,
+        so that only complete saves are left; the saves already exported are kept.
+        """
+        self.cancelled.set()
+
+    def files(self, game: str) -> List[Entry]:
+        return [entry for entry in self.browser.lookup_entry_by_name(game) if entry.is_file()]
+
+    def directory(self, game: str) -> Entry:
+        """
+        The entry of the directory of a save, in the root directory of the card.
+
+        Raises:
+        - Error: If the save can't be found.
+        """
+        for entry in self.browser.list_root_dir():
+            if entry.name == game and entry.is_dir():
+                return entry
+        raise Error(f"can't find game {game}")
+
+    def output_path(self, game: str) -> str:
+        """
+        The folder or .psu file a save is exported to.
+        """
+        if self.format == "psu":
+            return os.path.join(self.dest, f"{game}.psu")
+        return os.path.join(self.dest, game)
+
+    def export_save(self, game: str, entries: List[Entry]):
+        if self.format == "psu":
+            self.export_psu(game, entries)
+        else:
+            self.export_folder(game, entries)
+
+    def export_folder(self, game: str, entries: List[Entry]):
+        """
+        Export the files of a save into a folder named after it.
+        If the export fails or is cancelled, the folder is removed, or only
+        the files written into it if the folder existed before.
+        """
+        dir_path = self.output_path(game)
+        created = not os.path.isdir(dir_path)
+        os.makedirs(dir_path, exist_ok=True)
+        written = []
+        try:
+            for entry in entries:
+                path = os.path.join(dir_path, entry.name)
+                written.append(path)
+                with open(path, "wb") as f:
+                    self.copy(entry, f.write)
+        except BaseException:
+            if created:
+                shutil.rmtree(dir_path, ignore_errors=True)
+            else:
+                for path in written:
+                    with contextlib.suppress(OSError):
+                        os.remove(path)
+            raise
+
+    def export_psu(self, game: str, entries: List[Entry]):
+        """
+        Pack a save into a .psu file, as written by uLaunchELF and read by most save managers.
+
+        A .psu is the 512-byte directory entry of the save, the "." and ".." entries,
+        then the directory entry of every file followed by its data, padded to 1024 bytes.
+        The entries of the card are copied as is, but for the number of entries of the save.
+        """
+        directory = self.directory(game)
+        path = self.output_path(game)
+        cluster_size = BulkExporter.PSU_CLUSTER_SIZE
+        try:
+            with open(path, "wb") as f:
+                f.write(self.psu_directory(directory, len(entries)))
+                for entry in entries:
+                    f.write(entry.byte_val)
+                    self.copy(entry, f.write)
+                    f.write(bytes(-entry.length % cluster_size))
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(path)
+            raise
+
+    @staticmethod
+    def psu_directory(directory: Entry, files: int) -> bytes:
+        """
+        The directory entry of a save, followed by its "." and ".." entries.
+
+        Parameters:
+        - directory (Entry): The entry of the save directory on the card.
+        - files (int): The number of files of the save.
+
+        Returns:
+            bytes: The first 3 entries of a .psu file.
+        """
+        raw = directory.byte_val
+        length = struct.pack("<L", files + 2)
+        created, modified = raw[8:16], raw[24:32]
+        dot, dot_dot = (
+            BulkExporter.__psu_entry.pack(BulkExporter.PSU_DIR_MODE, 0, created, 0, 0, modified, 0, name)
+            for name in (b".", b"..")
+        )
+        return raw[:4] + length + raw[8:] + dot + dot_dot
+
+    def copy(self, entry: Entry, write: Callable[[memoryview], object]):
+        """
+        Stream the data of a file, page by page, checking for cancellation.
+        """
+        for page in self.browser.ps2mc.iter_data_pages(entry):
+            if self.cancelled.is_set():
+                raise ExportCancelled()
+            write(page)
+            self.__advance(len(page))
+
+    def __run(self, game: str, entries: List[Entry]):
+        try:
+            if self.cancelled.is_set():
+                raise ExportCancelled()
+            self.export_save(game, entries)
+        except ExportCancelled:
+            pass
+        except Exception as e:
+            with self.lock:
+                self.progress.failed.append((game, e))
+        else:
+            with self.lock:
+                self.progress.saves_done += 1
+        with self.lock:
+            self.pending -= 1
+            finished = self.pending == 0
+        if finished:
+            self.__finish()
+        else:
+            self.__report()
+
+    def __advance(self, nbytes: int):
+        with self.lock:
+            self.progress.bytes_done += nbytes
+        self.__report()
+
+    def __report(self):
+        now = time.perf_counter()
+        if self.on_progress is None or now - self.last_progress < BulkExporter.PROGRESS_INTERVAL:
+            return
+        self.last_progress = now
+        self.on_progress(self.progress)
+
+    def __finish(self):
+        self.progress.end = time.perf_counter()
+        self.progress.cancelled = self.cancelled.is_set()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+        self.browser.close()
+        if self.on_done is not None:
+            self.on_done(self.progress)
@@ -0,0 +1,190 @@
+"""
+The gallery, drawing the icons of every save on a card in a grid.
+
+The icons have meshes of different sizes, so rather than instancing one mesh,
+the vertex data of all icons is packed into data textures which the vertex
+shader fetches from by instance and vertex index. Every icon is one instance
+of a single draw call, drawn with as many vertices as the largest icon, and
+the number of draw calls doesn't grow with the number of saves.
+"""
+import math
+from typing import List, Optional, Tuple
+
+import moderngl as mgl
+import numpy as np
+from ps2mc.icon import Icon, IconSys
+
+from . import utils
+from .animation import AnimationTimeline, TimelineTable, y_rotation
+from .diskcache import CachedIcon
+from .textures import TextureManager
+from .uniforms import SceneUniforms
+
+
+class GalleryModel:
+    """
+    Vertex data, textures and per-instance attributes of the icons shown in the gallery.
+    """
+
+    TEXELS_PER_ROW = 1024  # width of the data textures, see gallery.vert
+    TEXTURE_UNIT = 2  # the first of four units, after the icon and HUD textures
+    BACKGROUND = (0.6, 0.6, 0.6)  # the color of the skybox behind a single save
+    # per save: the ambient light, then the direction and color of the three lights
+    LIGHT_TEXELS = 7
+
+    def __init__(
+        self,
+        ctx: mgl.Context,
+        program: mgl.Program,
+        items: List[Tuple[IconSys, Icon]],
+        uniforms: SceneUniforms,
+        textures: TextureManager,
+    ):
+        """
+        Parameters:
+        - ctx (mgl.Context): The context to render with.
+        - program (mgl.Program): The shader programs of the context.
+        - items (List[Tuple[IconSys, Icon]]): The icon.sys and the normal icon of every save.
+        - uniforms (SceneUniforms): The uniform buffers of the renderer, holding the camera
+          every icon is viewed with.
+        - textures (TextureManager): The shared texture array the icon textures are stored in.
+        """
+        self.ctx = ctx
+        self.program = program["gallery"]
+        self.textures = textures
+        self.count = len(items)
+        self.columns = max(1, math.ceil(math.sqrt(self.count)))
+        self.rows = max(1, math.ceil(self.count / self.columns))
+        self.uniforms = uniforms
+        icons = [icon for _, icon in items]
+
+        positions, attributes = [], []
+        # per instance: positions offset, attributes offset, vertex count, texture layer
+        mesh = np.zeros((self.count, 4), dtype="i4")
+        self.layers = []
+        position_offset, attribute_offset = 0, 0
+        for index, icon in enumerate(icons):
+            if isinstance(icon, CachedIcon):
+                vertex_data = icon.vertex_array
+            else:
+                vertex_data = utils.convert_icon_vertex_data(icon)
+            vertex_count = vertex_data.shape[1]
+            positions.append(vertex_data[..., 0:3].reshape(-1, 3))
+            attributes.append(vertex_data[0, :, 6:11])
+            layer = -1
+            if icon.texture is not None:
+                layer = textures.acquire(icon.texture)
+                self.layers.append(layer)
+            mesh[index] = (position_offset, attribute_offset, vertex_count, layer)
+            position_offset += icon.animation_shapes * vertex_count
+            attribute_offset += vertex_count
+        self.vertices = int(mesh[:, 2].max()) if self.count else 0
+
+        attributes = np.concatenate(attributes) if attributes else np.zeros((0, 5), dtype="f2")
+        self.positions = self.__data_texture(np.concatenate(positions) if positions else attributes[:, :3])
+        self.tex_coords = self.__data_texture(attributes[:, 0:2])
+        self.normals = self.__data_texture(attributes[:, 2:5])
+
+        lights = np.zeros((self.count, GalleryModel.LIGHT_TEXELS, 4), dtype="f4")
+        for index, (icon_sys, _) in enumerate(items):
+            lights[index] = [icon_sys.ambient, *icon_sys.light_dir, *icon_sys.light_colors]
+        self.lights = self.ctx.texture((GalleryModel.LIGHT_TEXELS, max(1, self.count)), 4, dtype="f4")
+        if self.count:
+            self.lights.write(lights)
+        for texture in (self.positions, self.tex_coords, self.normals, self.lights):
+            texture.filter = (mgl.NEAREST, mgl.NEAREST)
+
+        # the timelines of every icon, to look up their shapes and tween factors each frame
+        self.timelines = TimelineTable([AnimationTimeline(icon) for icon in icons])
+
+        instances = np.zeros(self.count, dtype=[("cell", "f4", 4), ("mesh", "i4", 4)])
+        instances["cell"] = self.cells()
+        instances["mesh"] = mesh
+        self.instance_vbo = self.ctx.buffer(instances.tobytes() or bytes(32))
+        self.animation_vbo = self.ctx.buffer(reserve=max(1, self.count) * 12, dynamic=True)
+        self._vao = self.ctx.vertex_array(
+            self.program,
+            [
+                (self.instance_vbo, "4f 4i/i", "cell", "mesh"),
+                (self.animation_vbo, "2i 1f/i", "shapes", "tweenFactor"),
+            ],
+        )
+        # the GPU memory of the data textures and buffers, the icon textures being in the shared array
+        self.nbytes = sum(
+            texture.width * texture.height * texture.components * np.dtype(texture.dtype).itemsize
+            for texture in (self.positions, self.tex_coords, self.normals, self.lights)
+        ) + self.instance_vbo.size + self.animation_vbo.size
+
+    def __data_texture(self, data: np.ndarray) -> mgl.Texture:
+        """
+        Pack per-vertex data into a half float texture, `TEXELS_PER_ROW` vertices per row.
+        """
+        width = GalleryModel.TEXELS_PER_ROW
+        components = data.shape[1]
+        height = max(1, math.ceil(len(data) / width))
+        texels = np.zeros((height * width, components), dtype="f2")
+        texels[:len(data)] = data
+        return self.ctx.texture((width, height), components, texels, dtype="f2")
+
+    def cells(self) -> np.ndarray:
+        """
+        The center and half size of the grid cell of every icon, in NDC,
+        filled row by row from the top left.
+        """
+        index = np.arange(self.count)
+        half_width, half_height = 1 / self.columns, 1 / self.columns
+        x = -1 + (2 * (index % self.columns) + 1) * half_width
+        y = 1 - (2 * (index // self.columns) + 1) * half_height
+        return np.stack(
+            [x, y, np.full(self.count, half_width), np.full(self.count, half_height)], axis=1
+        ).astype("f4")
+
+    def cell_at(self, ndc_x: float, ndc_y: float) -> Optional[int]:
+        """
+        The index of the icon whose cell contains a point.
+
+        Parameters:
+        - ndc_x (float): The x-coordinate of the point in NDC.
+        - ndc_y (float): The y-coordinate of the point in NDC.
+
+        Returns:
+            int: The index of the icon, or None if there is no icon there.
+        """
+        column = int((ndc_x + 1) / 2 * self.columns)
+        row = int((1 - ndc_y) / 2 * self.columns)
+        if not (0 <= column < self.columns and 0 <= row < self.rows):
+            return None
+        index = row * self.columns + column
+        return index if index < self.count else None
+
+    def update(self, animation_time: float):
+        """
+        Look up the current shape, next shape and tween factor of every icon in their timelines,
+        whose rows are laid out as the per-instance attributes.
+        """
+        self.animation_vbo.write(self.timelines.lookup(animation_time))
+        self.uniforms.write_frame(y_rotation(animation_time / 2))
+
+    def render(self, animation_time: float):
+        if not self.count:
+            return
+        self.update(animation_time)
+        self.textures.use(self.program)
+        for index, (name, texture) in enumerate((
+            ("positions", self.positions),
+            ("texCoords", self.tex_coords),
+            ("normals", self.normals),
+            ("lights", self.lights),
+        )):
+            texture.use(location=GalleryModel.TEXTURE_UNIT + index)
+            self.program[name] = GalleryModel.TEXTURE_UNIT + index
+        self._vao.render(vertices=self.vertices, instances=self.count)
+
+    def release(self):
+        for layer in self.layers:
+            self.textures.discard(layer)
+        for resource in (
+            self.positions, self.tex_coords, self.normals, self.lights,
+            self.instance_vbo, self.animation_vbo, self._vao,
+        ):
+            resource.release()
@@ -0,0 +1,301 @@
+"""
+Render the saves of PS2 memory cards to image files, without a window.
+
+Still thumbnails are written as PNG, animated previews as GIF or APNG, or as
+MP4 videos if ffmpeg is installed, see `record`. The outputs of every card
+are laid out like the cards, relative to the deepest directory holding all of
+them, so that cards of the same name in different directories (such as the
+`Mcd001.ps2` of many emulators) don't overwrite each other.
+On a Linux machine without a display, the OpenGL context is created through
+EGL, where Mesa's llvmpipe can stand in for a GPU.
+"""
+import argparse
+import hashlib
+import os
+import sys
+from typing import List, Optional, Tuple
+
+import moderngl as mgl
+
+from .card import MmapBrowser
+from .record import FrameEncoder, record
+from .renderer import Renderer
+from . import utils
+
+
+FORMATS = ("png", "gif", "apng", "mp4")
+# the file extension of every format
+EXTENSIONS = {"png": "png", "gif": "gif", "apng": "png", "mp4": "mp4"}
+
+
+def create_context() -> mgl.Context:
+    """
+    Create a standalone OpenGL 3.3 context, falling back to EGL when
+    the platform default needs a display.
+    """
+    try:
+        return mgl.create_standalone_context(require=330)
+    except Exception:
+        return mgl.create_standalone_context(require=330, backend="egl")
+
+
+def unique_cards(cards: List[str]) -> List[str]:
+    """
+    The memory cards without the ones given twice, by the same or another relative path.
+    """
+    unique = {}
+    for mc_path in cards:
+        unique.setdefault(os.path.abspath(mc_path), mc_path)
+    return list(unique.values())
+
+
+def card_root(cards: List[str]) -> Optional[str]:
+    """
+    The deepest directory holding all the given memory cards, see `card_name`.
+    """
+    try:
+        return os.path.commonpath([os.path.dirname(os.path.abspath(mc_path)) for mc_path in cards])
+    except ValueError:
+        # no cards, or cards on several drives
+        return None
+
+
+def card_name(mc_path: str, root: Optional[str] = None) -> str:
+    """
+    The name of the outputs of a memory card: its path relative to the root, without extension.
+
+    Parameters:
+    - mc_path (str): The path to the memory card image.
+    - root (str): The directory the cards are laid out from, see `card_root`,
+      the directory of the card by default.
+
+    Returns:
+        str: The relative path, the file name of the card if it is in the root.
+    """
+    path = os.path.abspath(mc_path)
+    try:
+        name = os.path.relpath(path, root or os.path.dirname(path))
+    except ValueError:
+        name = os.pardir
+    if name.startswith(os.pardir):
+        # outside the root, e.g. on another drive: tell the cards apart by a hash of their path
+        digest = hashlib.blake2b(path.encode(), digest_size=4).hexdigest()
+        return f"{os.path.splitext(os.path.basename(path))[0]}-{digest}"
+    return os.path.splitext(name)[0]
+
+
+def output_path(out_dir: str, mc_path: str, game: str, image_format: str, root: Optional[str] = None) -> str:
+    """
+    The image file of a save, in a directory named after its memory card by `card_name`,
+    which is created if needed.
+    """
+    card_dir = os.path.join(out_dir, card_name(mc_path, root))
+    os.makedirs(card_dir, exist_ok=True)
+    return os.path.join(card_dir, f"{game}.{EXTENSIONS[image_format]}")
+
+
+class OffscreenRenderer:
+    """
+    Renders saves into an offscreen framebuffer and reads them back as images.
+    """
+
+    def __init__(self, size: Tuple[int, int] = (utils.CANVAS_WIDTH, utils.CANVAS_HEIGHT)):
+        """
+        Parameters:
+        - size (Tuple[int, int]): The size of the rendered images.
+        """
+        self.size = size
+        self.ctx = create_context()
+        self.fbo = self.ctx.framebuffer(
+            color_attachments=[self.ctx.renderbuffer(size)],
+            depth_attachment=self.ctx.depth_renderbuffer(size),
+        )
+        self.fbo.use()
+        self.renderer = Renderer(self.ctx, size, buttons=False)
+
+    def frame(self, animation_time: float) -> "PIL.Image.Image":
+        """
+        Render one frame of the current save.
+
+        Parameters:
+        - animation_time (float): The playback time of the animation in seconds.
+
+        Returns:
+            Image.Image: The rendered frame.
+        """
+        from PIL import Image
+
+        self.fbo.use()
+        self.renderer.render(animation_time)
+        data = self.fbo.read(components=3)
+        return Image.frombytes("RGB", self.size, data).transpose(Image.Transpose.FLIP_TOP_BOTTOM)
+
+    def render_save(
+        self, browser: MmapBrowser, save: Tuple[str, str], path: str, frames: int = 1, fps: int = 20
+    ):
+        """
+        Render a save to an image file.
+
+        Parameters:
+        - browser (MmapBrowser): The browser of the memory card.
+        - save (Tuple[str, str]): The memory card path and the save directory name.
+        - path (str): The image file, a `.gif`, `.png` or `.mp4` file.
+        - frames (int): The number of frames, a still image is written if 1,
+          and one loop of the animation if 0.
+        - fps (int): The frame rate of animated images.
+        """
+        icon_sys, icons = browser.get_icon(save[1])
+        self.renderer.refresh(icon_sys, icons, save)
+        self.save_frames(path, frames, fps)
+
+    def render_gallery(
+        self,
+        mc_path: str,
+        out_dir: str,
+        image_format: str = "png",
+        frames: int = 1,
+        fps: int = 20,
+        root: Optional[str] = None,
+    ) -> str:
+        """
+        Render the icons of every save on a memory card into one image, in a grid.
+
+        Parameters:
+        - mc_path (str): The path to the memory card image.
+        - out_dir (str): The output directory.
+        - image_format (str): One of `FORMATS`.
+        - frames (int): The number of frames of animated images, 0 for one loop of the longest animation.
+        - fps (int): The frame rate of animated images.
+        - root (str): The directory the cards are laid out from, see `card_name`.
+
+        Returns:
+            str: The written image file, named after the card.
+        """
+        frames = 1 if image_format == "png" else frames
+        browser = MmapBrowser(mc_path)
+        try:
+            items = []
+            for entry in browser.list_root_dir():
+                try:
+                    icon_sys, icons = browser.get_icon(entry.name)
+                    items.append((icon_sys, icons[0]))
+                except Exception as e:
+                    print(f"{mc_path}: failed to read {entry.name}: {e}", file=sys.stderr)
+        finally:
+            browser.close()
+        path = os.path.join(out_dir, f"{card_name(mc_path, root)}.{EXTENSIONS[image_format]}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.renderer.show_gallery(items)
+        try:
+            self.save_frames(path, frames, fps)
+        finally:
+            self.renderer.hide_gallery()
+        return path
+
+    def save_frames(self, path: str, frames: int, fps: int):
+        """
+        Render frames of what is shown into an image file, animated unless there is a single frame.
+        With 0 frames, one loop of the animation is recorded.
+        """
+        if frames == 1:
+            self.frame(0).save(path)
+            return
+        encoder = FrameEncoder(path, self.size, fps)
+        try:
+            record(self.renderer, self.fbo, encoder, frames)
+        finally:
+            encoder.close()
+
+    def render_card(
+        self,
+        mc_path: str,
+        out_dir: str,
+        image_format: str = "png",
+        frames: int = 1,
+        fps: int = 20,
+        root: Optional[str] = None,
+    ) -> List[str]:
+        """
+        Render every save on a memory card into a directory named after the card.
+
+        Parameters:
+        - mc_path (str): The path to the memory card image.
+        - out_dir (str): The output directory.
+        - image_format (str): One of `FORMATS`.
+        - frames (int): The number of frames of animated images, 0 for one loop of the animation.
+        - fps (int): The frame rate of animated images.
+        - root (str): The directory the cards are laid out from, see `card_name`.
+
+        Returns:
+            List[str]: The written image files.
+        """
+        frames = 1 if image_format == "png" else frames
+        paths = []
+        browser = MmapBrowser(mc_path)
+        try:
+            for entry in browser.list_root_dir():
+                path = output_path(out_dir, mc_path, entry.name, image_format, root)
+                try:
+                    self.render_save(browser, (mc_path, entry.name), path, frames, fps)
+                    paths.append(path)
+                except Exception as e:
+                    print(f"{mc_path}: failed to render {entry.name}: {e}", file=sys.stderr)
+        finally:
+            browser.close()
+        return paths
+
+    def release(self):
+        self.renderer.release()
+        self.fbo.release()
+        self.ctx.release()
+
+
+def parse_size(value: str) -> Tuple[int, int]:
+    width, _, height = value.lower().partition("x")
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render the saves of PS2 memory cards to images.")
+    parser.add_argument("cards", nargs="+", metavar="CARD", help="memory card images (.ps2)")
+    parser.add_argument("-o", "--output", default=".", help="output directory")
+    parser.add_argument("-s", "--size", type=parse_size, default=(utils.CANVAS_WIDTH, utils.CANVAS_HEIGHT),
+                        help="image size, WIDTHxHEIGHT")
+    parser.add_argument("-f", "--format", choices=FORMATS, default="png")
+    parser.add_argument("--frames", type=int, default=60,
+                        help="frames of animated images, 0 for one loop of the animation")
+    parser.add_argument("--fps", type=int, default=20, help="frame rate of animated images")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="worker processes, 0 for one per CPU")
+    parser.add_argument("-g", "--gallery", action="store_true",
+                        help="render one image per card, with the icons of all its saves in a grid")
+    args = parser.parse_args()
+
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        parser.exit(1, "Pillow is required, install ps2mc-browser[headless].\n")
+
+    if args.jobs != 1 and not args.gallery:
+        from .batch import render_cards
+
+        render_cards(args.cards, args.output, args.size, args.format, args.frames, args.fps, args.jobs or None)
+        return
+
+    cards = unique_cards(args.cards)
+    root = card_root(cards)
+    renderer = OffscreenRenderer(args.size)
+    try:
+        for mc_path in cards:
+            if args.gallery:
+                path = renderer.render_gallery(mc_path, args.output, args.format, args.frames, args.fps, root)
+                print(f"{mc_path}: gallery rendered to {path}")
+                continue
+            paths = renderer.render_card(mc_path, args.output, args.format, args.frames, args.fps, root)
+            print(f"{mc_path}: {len(paths)} saves rendered")
+    finally:
+        renderer.release()
+
+
+if __name__ == "__main__":
+    main()
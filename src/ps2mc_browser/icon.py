@@ -0,0 +1,148 @@
+"""
+A decoder of the 3D icons of saves into NumPy arrays.
+
+Unlike `ps2mc.icon.Icon`, which copies every vertex into nested lists, the
+vertex records are read with a structured dtype, and the positions, normals,
+texture coordinates and colors are views over the bytes of the icon file.
+"""
+import struct
+
+import numpy as np
+from ps2mc.error import Error
+
+
+class ArrayIcon:
+    """
+    An icon whose vertex data are NumPy views over the icon file.
+
+    It has the attributes of `ps2mc.icon.Icon`, with arrays in place of the lists:
+    - vertex_data: `(vertex_count, animation_shapes, 4)` int16, the fixed-point
+      position of every vertex in every shape.
+    - normal_data: `(vertex_count, 4)` int16.
+    - uv_data: `(vertex_count, 2)` int16.
+    - color_data: `(vertex_count, 4)` uint8.
+    - texture: the 128x128 RGB texels as a flat uint8 array, or None if untextured.
+    """
+
+    MAGIC = 0x010000
+    ANIMATION_MAGIC = 0x01
+    TEXTURE_SIZE = (128, 128)
+    TEXELS = TEXTURE_SIZE[0] * TEXTURE_SIZE[1]
+    TEXTURED = 0b100
+    COMPRESSED = 0b1000
+
+    __header_struct = struct.Struct("<5I")
+    __animation_header_struct = struct.Struct("<IIfII")
+    __frame_data_struct = struct.Struct("<4I")
+    __frame_key_struct = struct.Struct("<2f")
+
+    def __init__(self, byte_val: bytes):
+        """
+        Parameters:
+        - byte_val (bytes): The content of the icon file, which the arrays are views of.
+
+        Raises:
+        - Error: If the file isn't a valid icon.
+        """
+        self.byte_val = byte_val
+        magic, self.animation_shapes, self.tex_type, _, self.vertex_count = (
+            ArrayIcon.__header_struct.unpack_from(byte_val, 0)
+        )
+        if magic != ArrayIcon.MAGIC:
+            raise Error("Not a valid Icon.")
+        offset = ArrayIcon.__header_struct.size
+
+        vertex_dtype = np.dtype([
+            ("position", "<i2", (self.animation_shapes, 4)),
+            ("normal", "<i2", 4),
+            ("uv", "<i2", 2),
+            ("color", "u1", 4),
+        ])
+        vertices = np.frombuffer(byte_val, vertex_dtype, self.vertex_count, offset)
+        offset += vertex_dtype.itemsize * self.vertex_count
+        self.vertex_data = vertices["position"]
+        self.normal_data = vertices["normal"]
+        self.uv_data = vertices["uv"]
+        self.color_data = vertices["color"]
+
+        magic, self.frame_length, self.anim_speed, self.play_offset, self.frame_count = (
+            ArrayIcon.__animation_header_struct.unpack_from(byte_val, offset)
+        )
+        if magic != ArrayIcon.ANIMATION_MAGIC:
+            raise Error("Not a valid animation header.")
+        offset += ArrayIcon.__animation_header_struct.size
+        # the frames aren't used, only skipped, the same way as `ps2mc.icon.Icon` does
+        for _ in range(self.frame_count):
+            key_count = ArrayIcon.__frame_data_struct.unpack_from(byte_val, offset)[1]
+            offset += ArrayIcon.__frame_data_struct.size + ArrayIcon.__frame_key_struct.size * (key_count - 1)
+
+        self.texture = None
+        if self.tex_type & ArrayIcon.TEXTURED:
+            if self.tex_type & ArrayIcon.COMPRESSED:
+                texels = self.decompress_texture(offset)
+            else:
+                texels = np.frombuffer(byte_val, "<u2", min(ArrayIcon.TEXELS, self.__words(offset)), offset)
+            self.texture = self.decode_texture(texels)
+
+    def decompress_texture(self, offset: int) -> np.ndarray:
+        """
+        Expand the run-length encoded texture.
+
+        The codes are walked in Python to find where each run starts, every run
+        being a number of literal texels or a texel repeated a number of times,
+        then all runs are expanded at once with a gather.
+
+        Returns:
+            np.ndarray: The A1B5G5R5 texels, as uint16.
+        """
+        compressed_size = struct.unpack_from("<I", self.byte_val, offset)[0]
+        offset += 4
+        words = np.frombuffer(self.byte_val, "<u2", min(compressed_size // 2, self.__words(offset)), offset)
+        codes = words.tolist()
+        # the first source word, the length, and 1 for literals or 0 for repeats, of every run
+        starts, lengths, steps = [], [], []
+        index = 0
+        while index < len(codes):
+            code = codes[index]
+            index += 1
+            if code & 0x8000:
+                count = 0x8000 - (code ^ 0x8000)
+                starts.append(index)
+                lengths.append(count)
+                steps.append(1)
+                index += count
+            elif code > 0:
+                starts.append(index)
+                lengths.append(code)
+                steps.append(0)
+                index += 1
+        lengths = np.array(lengths, dtype=np.int64)
+        run_starts = np.repeat(np.array(starts, dtype=np.int64), lengths)
+        # the position of every texel within its run
+        run_offsets = np.arange(len(run_starts)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        source = (run_starts + run_offsets * np.repeat(np.array(steps, dtype=np.int64), lengths))[:ArrayIcon.TEXELS]
+        # a run of a truncated texture may claim more words than the data holds
+        beyond = np.flatnonzero(source >= len(words))
+        if len(beyond):
+            source = source[:beyond[0]]
+        return words[source]
+
+    def decode_texture(self, texels: np.ndarray) -> np.ndarray:
+        """
+        Convert the A1B5G5R5 texels to RGB, the missing ones of a truncated texture being black.
+
+        Returns:
+            np.ndarray: The `128 * 128 * 3` RGB bytes as uint8.
+        """
+        texels = texels[:ArrayIcon.TEXELS]
+        rgb = np.zeros((ArrayIcon.TEXELS, 3), dtype=np.uint8)
+        rgb[:len(texels), 0] = (texels & 0x1F) << 3
+        rgb[:len(texels), 1] = ((texels >> 5) & 0x1F) << 3
+        rgb[:len(texels), 2] = ((texels >> 10) & 0x1F) << 3
+        return rgb.reshape(-1)
+
+    def __words(self, offset: int) -> int:
+        """
+        The number of whole 16-bit words left in the file after an offset.
+        """
+        return max(0, (len(self.byte_val) - offset) // 2)
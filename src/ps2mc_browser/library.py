@@ -0,0 +1,263 @@
+"""
+An index of the saves of many memory cards, for searching them without opening the cards.
+
+Directory trees of card images are scanned on a pool of processes, and the
+saves found are stored in a SQLite database. A card is only scanned again
+once its size or modification time changes.
+"""
+import contextlib
+import multiprocessing
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from ps2mc.icon import IconSys
+
+from .card import MmapBrowser
+from .diskcache import default_cache_dir, icon_digest
+
+
+class SaveRecord:
+    """
+    A save of the library.
+    """
+
+    def __init__(self, card: str, directory: str, title: str, size: int, created: str, modified: str,
+                 icon_hash: Optional[str]):
+        self.card = card
+        self.directory = directory
+        self.title = title
+        self.size = size
+        self.created = created
+        self.modified = modified
+        self.icon_hash = icon_hash
+
+
+def entry_time(tod: Tuple[int, ...]) -> str:
+    """
+    Format the (secs, mins, hours, mday, month, year) time of a directory entry.
+    """
+    secs, mins, hours, mday, month, year = tod
+    return f"{year:04}-{month:02}-{mday:02} {hours:02}:{mins:02}:{secs:02}"
+
+
+def find_cards(root: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Find the memory card images in a directory tree.
+
+    Parameters:
+    - root (str): The directory to search for .ps2 files.
+
+    Returns:
+        Dict[str, Tuple[int, int]]: The size and modification time in nanoseconds of every card.
+    """
+    cards = {}
+    for dir_path, _, file_names in os.walk(os.path.abspath(root)):
+        for file_name in file_names:
+            if file_name.lower().endswith(".ps2"):
+                path = os.path.join(dir_path, file_name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                cards[path] = (st.st_size, st.st_mtime_ns)
+    return cards
+
+
+def _scan_card(mc_path: str) -> List[tuple]:
+    """
+    Read the saves of a memory card, in a worker process.
+
+    Returns:
+        List[tuple]: The directory, title, size, creation time, modification time
+        and icon hash of every save.
+    """
+    browser = MmapBrowser(mc_path)
+    try:
+        saves = []
+        for entry in browser.list_root_dir():
+            if not entry.is_dir():
+                continue
+            files = {e.name: e for e in browser.lookup_entry(entry) if e.is_file()}
+            title, icon_hash = "", None
+            if "icon.sys" in files:
+                icon_sys = IconSys(browser.ps2mc.read_data_cluster(files["icon.sys"]))
+                title = " ".join(line.strip() for line in icon_sys.subtitle).strip()
+                icon_names = dict.fromkeys(
+                    (icon_sys.icon_file_normal, icon_sys.icon_file_copy, icon_sys.icon_file_delete)
+                )
+                if all(name in files for name in icon_names):
+                    icon_hash = icon_digest([browser.ps2mc.read_data_cluster(files[name]) for name in icon_names])
+            saves.append((
+                entry.name,
+                title,
+                sum(e.length for e in files.values()),
+                entry_time(entry.created),
+                entry_time(entry.modified),
+                icon_hash,
+            ))
+        return saves
+    finally:
+        browser.close()
+
+
+class Library:
+    """
+    The persistent index of the saves of the scanned memory cards.
+
+    Every method opens its own connection, so the library can be scanned
+    on a background thread while it is searched on the UI thread.
+    """
+
+    SCHEMA_VERSION = 1
+    SEARCH_LIMIT = 500  # results returned by a search
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Parameters:
+        - path (str): The database file, in the per-user cache directory by default.
+        """
+        self.path = path or os.path.join(default_cache_dir(), f"library-v{Library.SCHEMA_VERSION}.sqlite3")
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self.connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS cards (
+                    id INTEGER PRIMARY KEY,
+                    path TEXT UNIQUE NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    scanned REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS saves (
+                    card_id INTEGER NOT NULL REFERENCES cards(id) ON DELETE CASCADE,
+                    directory TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created TEXT NOT NULL,
+                    modified TEXT NOT NULL,
+                    icon_hash TEXT
+                );
+                CREATE INDEX IF NOT EXISTS saves_card ON saves(card_id);
+            """)
+
+    @contextlib.contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        """
+        A connection to the database, committed and closed on exit.
+        """
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA foreign_keys = ON")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def scan(
+        self,
+        root: str,
+        max_workers: Optional[int] = None,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+    ) -> Tuple[int, List[Tuple[str, Exception]]]:
+        """
+        Index the memory cards found in a directory tree. Cards that didn't change
+        since they were indexed are skipped, and cards that no longer exist are removed.
+
+        Parameters:
+        - root (str): The directory to scan for .ps2 files.
+        - max_workers (int): The number of worker processes, one per CPU by default.
+        - on_progress (Callable): Called with the number of cards scanned and to scan.
+
+        Returns:
+            Tuple[int, List[Tuple[str, Exception]]]: The number of cards indexed,
+            and the cards that couldn't be read.
+        """
+        root = os.path.abspath(root)
+        found = find_cards(root)
+
+        with self.connect() as conn:
+            indexed = {
+                path: (card_id, (size, mtime_ns))
+                for card_id, path, size, mtime_ns in conn.execute(
+                    "SELECT id, path, size, mtime_ns FROM cards WHERE path LIKE ? ESCAPE '\\'",
+                    (Library.__like_prefix(root + os.sep),),
+                )
+            }
+            for path, (card_id, _) in indexed.items():
+                if path not in found:
+                    conn.execute("DELETE FROM cards WHERE id = ?", (card_id,))
+        changed = [path for path, stat in found.items() if path not in indexed or indexed[path][1] != stat]
+
+        failed = []
+        if changed:
+            # forking the multithreaded browser isn't safe
+            mp_context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers, mp_context=mp_context) as executor:
+                futures = {executor.submit(_scan_card, path): path for path in changed}
+                for done, future in enumerate(as_completed(futures), 1):
+                    path = futures[future]
+                    try:
+                        self.__store(path, found[path], future.result())
+                    except Exception as e:
+                        failed.append((path, e))
+                    if on_progress is not None:
+                        on_progress(done, len(changed))
+        return len(found) - len(failed), failed
+
+    def search(self, text: str, limit: int = SEARCH_LIMIT) -> List[SaveRecord]:
+        """
+        Find the saves whose title, directory name or card path contain every word of a text.
+
+        Parameters:
+        - text (str): The words to search for, case insensitive.
+        - limit (int): The maximum number of results.
+
+        Returns:
+            List[SaveRecord]: The matching saves, ordered by title.
+        """
+        conditions, params = [], []
+        for word in text.split():
+            conditions.append(
+                "(saves.title LIKE ? ESCAPE '\\' OR saves.directory LIKE ? ESCAPE '\\' "
+                "OR cards.path LIKE ? ESCAPE '\\')"
+            )
+            params.extend([f"%{Library.__like_prefix(word)}"] * 3)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self.connect() as conn:
+            rows = conn.execute(
+                f"""
+                SELECT cards.path, saves.directory, saves.title, saves.size,
+                       saves.created, saves.modified, saves.icon_hash
+                FROM saves JOIN cards ON saves.card_id = cards.id
+                {where}
+                ORDER BY saves.title, saves.directory, cards.path
+                LIMIT ?
+                """,
+                (*params, limit),
+            ).fetchall()
+        return [SaveRecord(*row) for row in rows]
+
+    def __len__(self) -> int:
+        with self.connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM saves").fetchone()[0]
+
+    def __store(self, path: str, stat: Tuple[int, int], saves: List[tuple]):
+        with self.connect() as conn:
+            conn.execute("DELETE FROM cards WHERE path = ?", (path,))
+            card_id = conn.execute(
+                "INSERT INTO cards (path, size, mtime_ns, scanned) VALUES (?, ?, ?, ?)",
+                (path, *stat, time.time()),
+            ).lastrowid
+            conn.executemany(
+                "INSERT INTO saves VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(card_id, *save) for save in saves],
+            )
+
+    @staticmethod
+    def __like_prefix(text: str) -> str:
+        """
+        Escape a text for a LIKE pattern, followed by any characters.
+        """
+        return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
@@ -1,9 +1,13 @@
-from typing import List, Tuple
+from typing import Tuple
 import glm
 import moderngl as mgl
 import numpy as np
 from ps2mc.icon import Icon, IconSys
 from . import utils
+from .animation import AnimationTimeline
+from .diskcache import CachedIcon
+from .profiling import profiler
+from .textures import TextureManager
 
 
 class Camera:
@@ -16,10 +20,16 @@ class Camera:
     FAR = 100
 
     def __init__(self, win_size: Tuple[int, int]):
-        self.aspect_ratio = win_size[0] / win_size[1]
         self.position = glm.vec3(0, -4.0, -10)
         self.up = glm.vec3(0, -1, 0)
         self.view = glm.lookAt(self.position, glm.vec3(0, -2, 0), self.up)
+        self.resize(win_size)
+
+    def resize(self, win_size: Tuple[int, int]):
+        """
+        Fit the projection to the aspect ratio of a new viewport.
+        """
+        self.aspect_ratio = win_size[0] / win_size[1]
         self.proj = glm.perspective(
             glm.radians(Camera.FOV), self.aspect_ratio, Camera.NEAR, Camera.FAR
         )
@@ -28,25 +38,57 @@ class Camera:
 class IconModel:
     """
     Vertex data for the 3D icon.
-    """
 
-    # See https://babyno.top/en/posts/2023/10/parsing-ps2-3d-icon/ for details.
-    __FIXED_POINT_FACTOR = 4096.0
+    By default the positions of all animation shapes are uploaded once into a
+    single buffer, next to a second buffer shared by the texture coordinates and
+    normals. A single vertex array then selects the current and the next shape by
+    rebinding the position attributes at the shape's offset.
+    With `shared=False`, one self-contained buffer and vertex array is created
+    per shape instead.
+    Icons loaded from the disk cache are uploaded without any conversion.
+    The texture is stored in a layer of the shared texture array, and the
+    animation is baked into a timeline of the shapes and tween factor of every frame.
+    """
 
-    def __init__(self, ctx: mgl.Context, program: mgl.Program, icon: Icon):
+    def __init__(
+        self,
+        ctx: mgl.Context,
+        program: mgl.Program,
+        icon: Icon,
+        textures: TextureManager,
+        shared: bool = True,
+    ):
+        self.program = program
+        self.textures = textures
         self.vbos = []
         self._vaos = []
-        for i in range(icon.animation_shapes):
-            h = i + 1
-            if h >= icon.animation_shapes:
-                h = 0
-            vertex_data = utils.convert_vertex_data(icon, i, h)
-            vertex_data /= IconModel.__FIXED_POINT_FACTOR
-            vertex_data = vertex_data.astype("f2")
-            self.vbos.append(ctx.buffer(vertex_data))
+        self.shared = shared
+        self.animation_shapes = icon.animation_shapes
+        self.timeline = AnimationTimeline(icon)
+        if isinstance(icon, CachedIcon):
+            vertex_data = icon.vertex_array
+        else:
+            with profiler.stage("convert"):
+                vertex_data = utils.convert_icon_vertex_data(icon)
+        with profiler.stage("upload"):
+            if shared:
+                self.__init_shared(ctx, program["icon"], vertex_data)
+            else:
+                self.__init_per_shape(ctx, program["icon"], vertex_data)
+
+            # the layer of the texture, -1 for an untextured icon
+            self.layer = -1
+            if icon.texture is not None:
+                self.layer = textures.acquire(icon.texture)
+        # the texture layer is accounted for by the texture array
+        self.nbytes = sum(vbo.size for vbo in self.vbos)
+
+    def __init_per_shape(self, ctx: mgl.Context, program: mgl.Program, vertex_data: np.ndarray):
+        for i in range(self.animation_shapes):
+            self.vbos.append(ctx.buffer(vertex_data[i]))
             self._vaos.append(
                 ctx.vertex_array(
-                    program["icon"],
+                    program,
                     [
                         (
                             self.vbos[i],
@@ -60,20 +102,58 @@ class IconModel:
                 )
             )
 
-        texture_data = icon.texture
-        self.texture = None
-        if texture_data is not None:
-            self.texture = ctx.texture(size=(128, 128), data=texture_data, components=3)
-            self.texture.use()
+    def __init_shared(self, ctx: mgl.Context, program: mgl.Program, vertex_data: np.ndarray):
+        positions = np.ascontiguousarray(vertex_data[..., 0:3])
+        attributes = np.ascontiguousarray(vertex_data[0, :, 6:11])
+        # Byte size of the positions of one shape.
+        self.shape_stride = positions[0].nbytes
+        self.vbos.append(ctx.buffer(positions))
+        self.vbos.append(ctx.buffer(attributes))
+        self._vaos.append(
+            ctx.vertex_array(
+                program,
+                [
+                    (self.vbos[0], "3f2", "vertexPos"),
+                    (self.vbos[0], "3f2", "nextVertexPos"),
+                    (self.vbos[1], "2f2 3f2", "texCoord", "normal"),
+                ],
+            )
+        )
+        self.vertex_pos = program["vertexPos"].location
+        self.next_vertex_pos = program["nextVertexPos"].location
+        self.shape = None
+        self.bind_shape(0)
+
+    def bind_shape(self, n: int):
+        """
+        Point the position attributes of the shared vertex array at shape `n`
+        and the shape following it.
+        """
+        if n == self.shape:
+            return
+        h = (n + 1) % self.animation_shapes
+        vao = self._vaos[0]
+        vao.bind(self.vertex_pos, "f", self.vbos[0], "3f2", offset=n * self.shape_stride)
+        vao.bind(self.next_vertex_pos, "f", self.vbos[0], "3f2", offset=h * self.shape_stride)
+        self.shape = n
+
+    def use(self):
+        """
+        Bind the texture array, the layer of the icon is a per-frame uniform.
+        """
+        self.textures.use(self.program["icon"])
 
-    def vao(self, n: int) -> List[mgl.VertexArray]:
+    def vao(self, n: int) -> mgl.VertexArray:
+        if self.shared:
+            self.bind_shape(n)
+            return self._vaos[0]
         return self._vaos[n]
 
     def release(self):
         [vbo.release() for vbo in self.vbos]
         [vao.release() for vao in self._vaos]
-        if self.texture is not None:
-            self.texture.release()
+        if self.layer >= 0:
+            self.textures.discard(self.layer)
 
 
 class BgModel:
@@ -114,6 +194,7 @@ class BgModel:
         self._vao = self.ctx.vertex_array(
             self.program["bg"], [(self.vbo, "3f2 4f2", "vertexPos", "vertexColor")]
         )
+        self.nbytes = self.vbo.size
 
     def vao(self) -> mgl.VertexArray:
         return self._vao
@@ -150,3 +231,72 @@ class CircleModel:
     def release(self):
         [vbo.release() for vbo in self.vbos]
         [vao.release() for vao in self._vaos]
+
+
+class HudModel:
+    """
+    A text overlay in the top-left corner of the viewport,
+    drawn from an RGB image of the text.
+    """
+
+    TEXTURE_UNIT = 1  # the icon texture array stays bound to unit 0
+    OPACITY = 0.75
+
+    def __init__(self, ctx: mgl.Context, program: mgl.Program, viewport: Tuple[int, int]):
+        self.ctx = ctx
+        self.program = program
+        self.viewport = viewport
+        self.size = None
+        self.texture = None
+        self.vbo = self.ctx.buffer(reserve=4 * 4 * 4)
+        self._vao = self.ctx.vertex_array(
+            self.program["hud"], [(self.vbo, "2f 2f", "vertexPos", "texCoord")]
+        )
+
+    def update(self, image: bytes, size: Tuple[int, int]):
+        """
+        Replace the overlay.
+
+        Parameters:
+        - image (bytes): The RGB pixels of the text, top row first.
+        - size (Tuple[int, int]): The size of the image in pixels.
+        """
+        if size != self.size:
+            if self.texture is not None:
+                self.texture.release()
+            self.texture = self.ctx.texture(size=size, components=3)
+            self.size = size
+            self.__write_quad()
+        self.texture.write(image)
+
+    def resize(self, viewport: Tuple[int, int]):
+        """
+        Keep the overlay at its size in pixels in a resized viewport.
+        """
+        self.viewport = viewport
+        if self.size is not None:
+            self.__write_quad()
+
+    def __write_quad(self):
+        x = -1 + 2 * self.size[0] / self.viewport[0]
+        y = 1 - 2 * self.size[1] / self.viewport[1]
+        # a triangle strip, the first row of the image at the top
+        self.vbo.write(np.array(
+            [(-1, y, 0, 1), (x, y, 1, 1), (-1, 1, 0, 0), (x, 1, 1, 0)], dtype="f4"
+        ))
+
+    def render(self):
+        if self.texture is None:
+            return
+        self.texture.use(location=HudModel.TEXTURE_UNIT)
+        self.program["hud"]["texture0"] = HudModel.TEXTURE_UNIT
+        self.program["hud"]["opacity"] = HudModel.OPACITY
+        self.ctx.disable(mgl.DEPTH_TEST)
+        self._vao.render(mgl.TRIANGLE_STRIP)
+        self.ctx.enable(mgl.DEPTH_TEST)
+
+    def release(self):
+        self.vbo.release()
+        self._vao.release()
+        if self.texture is not None:
+            self.texture.release()
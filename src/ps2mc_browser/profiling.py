@@ -0,0 +1,166 @@
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, List, Optional
+
+import moderngl as mgl
+import numpy as np
+
+
+class GpuTimer:
+    """
+    Measures the GPU time of a block of draw calls with timer queries.
+
+    A small ring of queries is used, and a query is only read back when it
+    comes round again a few frames later, so reading it doesn't stall the
+    pipeline waiting for the GPU.
+    """
+
+    RING_SIZE = 3
+
+    def __init__(self, ctx: mgl.Context):
+        self.queries = [ctx.query(time=True) for _ in range(GpuTimer.RING_SIZE)]
+        self.used = [False] * GpuTimer.RING_SIZE
+        self.index = 0
+
+    @contextmanager
+    def measure(self) -> Iterator[Optional[float]]:
+        """
+        Time the draw calls issued in the block.
+
+        Returns:
+            Iterator: Yields the GPU seconds of the block measured `RING_SIZE` frames ago,
+            or None during the first frames.
+        """
+        query = self.queries[self.index]
+        elapsed = query.elapsed / 1e9 if self.used[self.index] else None
+        self.used[self.index] = True
+        self.index = (self.index + 1) % GpuTimer.RING_SIZE
+        with query:
+            yield elapsed
+
+    def release(self):
+        # moderngl releases queries with their context
+        self.queries = []
+
+
+class Profiler:
+    """
+    Collects the timings of the parse, convert, upload, draw and swap stages,
+    the GPU time of the draw calls and the frame times, over a rolling window.
+    """
+
+    HISTORY = 600  # samples kept per stage, 10 seconds of frames at 60 FPS
+    HISTOGRAM_BINS = (0, 4, 8, 12, 16, 20, 25, 33, 50, 100, float("inf"))  # milliseconds
+
+    def __init__(self):
+        self.stages: Dict[str, Deque[float]] = {}
+        self.gpu: Dict[str, Deque[float]] = {}
+        self.frame_times: Deque[float] = deque(maxlen=Profiler.HISTORY)
+        self.last_frame: Optional[float] = None
+        # bytes of vertex buffers and textures resident on the GPU, see `Renderer.resident_bytes`
+        self.resident_bytes = 0
+
+    def record(self, stage: str, seconds: float):
+        """
+        Record the duration of a stage. May be called from any thread.
+        """
+        samples = self.stages.get(stage)
+        if samples is None:
+            samples = self.stages.setdefault(stage, deque(maxlen=Profiler.HISTORY))
+        samples.append(seconds)
+
+    def record_gpu(self, stage: str, seconds: Optional[float]):
+        if seconds is not None:
+            self.gpu.setdefault(stage, deque(maxlen=Profiler.HISTORY)).append(seconds)
+
+    @contextmanager
+    def stage(self, stage: str) -> Iterator[None]:
+        """
+        Time the block as one sample of a stage.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def frame(self, now: Optional[float] = None):
+        """
+        Mark the presentation of a frame, recording the time since the previous one.
+        """
+        now = time.perf_counter() if now is None else now
+        if self.last_frame is not None:
+            self.frame_times.append(now - self.last_frame)
+        self.last_frame = now
+
+    def reset_frames(self):
+        """
+        Forget the previous frame, after a pause in rendering.
+        """
+        self.last_frame = None
+
+    @property
+    def fps(self) -> float:
+        if not self.frame_times:
+            return 0.0
+        return len(self.frame_times) / sum(self.frame_times)
+
+    def percentile(self, q: float) -> float:
+        """
+        A percentile of the recent frame times, in milliseconds.
+        """
+        if not self.frame_times:
+            return 0.0
+        return float(np.percentile(np.fromiter(self.frame_times, dtype=float), q)) * 1000
+
+    def histogram(self) -> List[int]:
+        """
+        The number of recent frames in each of the `HISTOGRAM_BINS` millisecond ranges.
+        """
+        frame_times = np.fromiter(self.frame_times, dtype=float) * 1000
+        return np.histogram(frame_times, bins=Profiler.HISTOGRAM_BINS)[0].tolist()
+
+    def summary(self) -> dict:
+        """
+        The collected statistics, with durations in milliseconds.
+        """
+        return {
+            "fps": self.fps,
+            "frame_time": {
+                "p50": self.percentile(50),
+                "p99": self.percentile(99),
+                "histogram": {
+                    "bins": [b for b in Profiler.HISTOGRAM_BINS if b != float("inf")],
+                    "counts": self.histogram(),
+                },
+            },
+            "stages": {name: Profiler.__describe(samples) for name, samples in self.stages.items()},
+            "gpu": {name: Profiler.__describe(samples) for name, samples in self.gpu.items()},
+            "resident_bytes": self.resident_bytes,
+        }
+
+    def dump(self, path: str):
+        """
+        Write the statistics to a JSON file.
+        """
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+    @staticmethod
+    def __describe(samples: Deque[float]) -> dict:
+        values = np.fromiter(samples, dtype=float) * 1000
+        if not len(values):
+            return {"count": 0}
+        return {
+            "count": len(values),
+            "mean": float(values.mean()),
+            "p50": float(np.percentile(values, 50)),
+            "p99": float(np.percentile(values, 99)),
+            "max": float(values.max()),
+        }
+
+
+# The profiler of the application, shared by the UI and worker threads.
+profiler = Profiler()
@@ -0,0 +1,267 @@
+"""
+Record the animation of icons to animated images or videos.
+
+Frames are rendered at a fixed timestep, as fast as the GPU allows rather
+than in real time, and read back through a ring of pixel buffer objects: the
+read of a frame is only queued when it is rendered, and its pixels are fetched
+a few frames later, once the GPU is done with it, so reading never waits for
+the draw calls just issued. The frames are then encoded on a background
+thread, piped to ffmpeg if it is installed, or else written with Pillow. The
+queue of frames waiting to be encoded is bounded, so a slow encoder holds up
+the rendering instead of the frames piling up in memory.
+"""
+import os
+import queue
+import shutil
+import subprocess
+import threading
+from fractions import Fraction
+from typing import Iterator, List, Optional, Tuple
+
+import moderngl as mgl
+
+from .renderer import Renderer
+
+
+FORMATS = ("gif", "apng", "mp4")
+# the format of every file extension
+EXTENSIONS = {".gif": "gif", ".png": "apng", ".apng": "apng", ".mp4": "mp4"}
+
+
+class PboReader:
+    """
+    Reads the frames of a framebuffer back through a ring of pixel buffer objects.
+    """
+
+    RING_SIZE = 3
+
+    def __init__(self, ctx: mgl.Context, size: Tuple[int, int], ring_size: int = RING_SIZE):
+        """
+        Parameters:
+        - ctx (mgl.Context): The context of the framebuffer.
+        - size (Tuple[int, int]): The size of the frames.
+        - ring_size (int): The number of buffers, 2 for double and 3 for triple buffering.
+        """
+        self.size = size
+        self.pbos = [ctx.buffer(reserve=size[0] * size[1] * 3, dynamic=True) for _ in range(ring_size)]
+        # the buffers holding frames not fetched yet, oldest first
+        self.pending: List[mgl.Buffer] = []
+
+    def read(self, fbo: mgl.Framebuffer) -> Optional[bytes]:
+        """
+        Queue the read of the frame drawn into a framebuffer.
+
+        Returns:
+            bytes: The RGB pixels, bottom row first, of the frame read `ring size - 1` reads
+            ago, or None until the ring is full.
+        """
+        frame = self.pending.pop(0).read() if len(self.pending) == len(self.pbos) - 1 else None
+        pbo = next(pbo for pbo in self.pbos if pbo not in self.pending)
+        fbo.read_into(pbo, viewport=(0, 0, *self.size), components=3)
+        self.pending.append(pbo)
+        return frame
+
+    def flush(self) -> List[bytes]:
+        """
+        Fetch the frames still in the ring.
+        """
+        frames = [pbo.read() for pbo in self.pending]
+        self.pending = []
+        return frames
+
+    def release(self):
+        for pbo in self.pbos:
+            pbo.release()
+
+
+class FrameEncoder:
+    """
+    Encodes frames into an animated image or a video on a background thread.
+
+    With ffmpeg, the frames are streamed to it. Without it, they are written
+    with Pillow, which keeps every frame until the end, so recordings larger
+    than `PILLOW_MAX_BYTES` are refused; Pillow doesn't write videos either.
+
+    GIF stores the delay of a frame in whole centiseconds, and viewers slow
+    down delays under `GIF_MIN_DELAY`, so the frame rate of a GIF is rounded
+    to one whose frame time is a whole number of centiseconds, at most 50 fps.
+    """
+
+    QUEUE_FRAMES = 8  # frames waiting to be encoded before `write` blocks
+    PILLOW_MAX_BYTES = 512 * 1024 * 1024  # raw RGB bytes of the frames Pillow may hold
+    GIF_MIN_DELAY = 2  # centiseconds
+
+    def __init__(self, path: str, size: Tuple[int, int], fps: int, image_format: Optional[str] = None,
+                 ffmpeg: Optional[str] = None):
+        """
+        Parameters:
+        - path (str): The output file.
+        - size (Tuple[int, int]): The size of the frames.
+        - fps (int): The frame rate, rounded for a GIF, see `fps`.
+        - image_format (str): One of `FORMATS`, from the file extension by default.
+        - ffmpeg (str): The ffmpeg executable, found on the PATH by default.
+
+        Raises:
+        - ValueError: If the format is unknown, or needs ffmpeg and it isn't installed.
+        """
+        self.path = path
+        self.size = size
+        self.format = image_format or EXTENSIONS.get(os.path.splitext(path)[1].lower())
+        if self.format not in FORMATS:
+            raise ValueError(f"Unknown recording format of {path}, expected one of {', '.join(FORMATS)}.")
+        # the delay of every frame of a GIF in centiseconds
+        self.gif_delay = max(FrameEncoder.GIF_MIN_DELAY, round(100 / fps))
+        # the frame rate the frames are rendered at, which may not be a whole number for a GIF
+        self.fps: float = 100 / self.gif_delay if self.format == "gif" else fps
+        self.ffmpeg = ffmpeg or shutil.which("ffmpeg")
+        if self.format == "mp4" and self.ffmpeg is None:
+            raise ValueError("Recording videos requires ffmpeg.")
+        # the frames Pillow may hold, None if streamed to ffmpeg
+        self.max_frames = (
+            None if self.ffmpeg is not None
+            else max(1, FrameEncoder.PILLOW_MAX_BYTES // (size[0] * size[1] * 3))
+        )
+        self.frames = 0
+        self.error: Optional[BaseException] = None
+        # whether the end of the frames was taken from the queue
+        self.drained = False
+        self.queue: "queue.Queue[Optional[bytes]]" = queue.Queue(FrameEncoder.QUEUE_FRAMES)
+        self.thread = threading.Thread(target=self.__run, name="frame-encoder", daemon=True)
+        self.thread.start()
+
+    def write(self, frame: bytes):
+        """
+        Queue a frame, waiting while the queue is full.
+
+        Parameters:
+        - frame (bytes): The RGB pixels of the frame, bottom row first.
+        """
+        if self.error is not None:
+            raise self.error
+        self.check_frames(self.frames + 1)
+        self.queue.put(frame)
+        self.frames += 1
+
+    def check_frames(self, frames: int):
+        """
+        Check that a number of frames can be recorded.
+
+        Raises:
+        - ValueError: If Pillow would have to hold more than `PILLOW_MAX_BYTES`.
+        """
+        if self.max_frames is not None and frames > self.max_frames:
+            raise ValueError(
+                f"Recording {frames} frames of {self.size[0]}x{self.size[1]} without ffmpeg would take "
+                f"more than {FrameEncoder.PILLOW_MAX_BYTES // 1024 // 1024} MiB, at most {self.max_frames} "
+                "frames can be recorded. Install ffmpeg, or record fewer or smaller frames."
+            )
+
+    def close(self):
+        """
+        Wait until every frame is encoded and the file written.
+
+        Raises:
+        - Exception: The error of the encoder, if it failed.
+        """
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def ffmpeg_args(self) -> List[str]:
+        width, height = self.size
+        args = [
+            self.ffmpeg, "-loglevel", "error", "-y",
+            "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}",
+            "-framerate", str(Fraction(self.fps).limit_denominator(1000)),
+            "-i", "-",
+        ]
+        if self.format == "gif":
+            args += ["-filter_complex", "vflip,split[a][b];[a]palettegen[p];[b][p]paletteuse", "-loop", "0"]
+        elif self.format == "apng":
+            args += ["-vf", "vflip", "-plays", "0", "-f", "apng"]
+        else:
+            # the chroma of yuv420p is subsampled, so the frame size must be even
+            args += ["-vf", "vflip,pad=ceil(iw/2)*2:ceil(ih/2)*2", "-c:v", "libx264", "-pix_fmt", "yuv420p"]
+        return args + [self.path]
+
+    def __frames(self) -> Iterator[bytes]:
+        while (frame := self.queue.get()) is not None:
+            yield frame
+        self.drained = True
+
+    def __run(self):
+        try:
+            if self.ffmpeg is not None:
+                self.__run_ffmpeg()
+            else:
+                self.__run_pillow()
+        except BaseException as e:
+            self.error = e
+            # unblock the renderer, which may be waiting for room in the queue
+            if not self.drained:
+                for _ in self.__frames():
+                    pass
+
+    def __run_ffmpeg(self):
+        process = subprocess.Popen(self.ffmpeg_args(), stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            for frame in self.__frames():
+                process.stdin.write(frame)
+        finally:
+            process.stdin.close()
+            stderr = process.stderr.read()
+            process.wait()
+        if process.returncode:
+            raise RuntimeError(f"ffmpeg failed: {stderr.decode(errors='replace').strip()}")
+
+    def __run_pillow(self):
+        from PIL import Image
+
+        images = []
+        for frame in self.__frames():
+            image = Image.frombytes("RGB", self.size, frame).transpose(Image.Transpose.FLIP_TOP_BOTTOM)
+            if self.format == "gif":
+                image = image.quantize()
+            images.append(image)
+        if not images:
+            return
+        images[0].save(
+            self.path,
+            format="GIF" if self.format == "gif" else "PNG",
+            save_all=True,
+            append_images=images[1:],
+            # in milliseconds, an APNG keeps the fraction
+            duration=self.gif_delay * 10 if self.format == "gif" else 1000 / self.fps,
+            loop=0,
+        )
+
+
+def record(renderer: Renderer, fbo: mgl.Framebuffer, encoder: FrameEncoder, frames: int = 0):
+    """
+    Render what a renderer shows at the frame rate of an encoder, and queue the frames.
+
+    Parameters:
+    - renderer (Renderer): The renderer, drawing into the framebuffer at its size.
+    - fbo (mgl.Framebuffer): The framebuffer to draw into.
+    - encoder (FrameEncoder): Receives the frames, and is left open.
+    - frames (int): The number of frames, 0 for one loop of the animation.
+
+    Raises:
+    - ValueError: If the encoder can't record that many frames.
+    """
+    if frames <= 0:
+        frames = max(1, round(renderer.loop_duration() * encoder.fps))
+    encoder.check_frames(frames)
+    reader = PboReader(renderer.ctx, encoder.size)
+    try:
+        fbo.use()
+        for index in range(frames):
+            renderer.render(index / encoder.fps)
+            frame = reader.read(fbo)
+            if frame is not None:
+                encoder.write(frame)
+        for frame in reader.flush():
+            encoder.write(frame)
+    finally:
+        reader.release()
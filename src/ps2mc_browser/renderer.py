@@ -0,0 +1,332 @@
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+import moderngl as mgl
+from ps2mc.icon import Icon, IconSys
+
+from .animation import AnimationTimeline, y_rotation
+from .cache import ModelCache
+from .gallery import GalleryModel
+from .models import BgModel, Camera, IconModel, CircleModel, HudModel
+from .profiling import GpuTimer, Profiler
+from .shaders import get_programs
+from .textures import TextureManager
+from .uniforms import SceneUniforms
+
+
+class Renderer:
+    """
+    Renders a save, its background, 3D icon and action buttons,
+    into the framebuffer bound in a moderngl context.
+    It is shared by the wxPython canvas and the headless renderer.
+    """
+
+    FPS = AnimationTimeline.FPS  # Frames Per Second of the icon animations
+
+    def __init__(
+        self,
+        ctx: mgl.Context,
+        size: Tuple[int, int],
+        buttons: bool = True,
+        cache_budget: int = ModelCache.DEFAULT_BUDGET,
+        profiler: Optional[Profiler] = None,
+        packed_textures: bool = False,
+        texture_layers: int = TextureManager.MAX_LAYERS,
+    ):
+        """
+        Parameters:
+        - ctx (mgl.Context): The context to render with.
+        - size (Tuple[int, int]): The size of the viewport.
+        - buttons (bool): Whether to draw the action buttons.
+        - cache_budget (int): The GPU memory budget of the buffers of the model cache in bytes.
+        - profiler (Profiler): Receives the draw timings, if given.
+        - packed_textures (bool): Whether to store the icon textures as RGB555.
+        - texture_layers (int): The icon textures stored before cached models are evicted.
+        """
+        self.ctx = ctx
+        self.ctx.enable(flags=mgl.DEPTH_TEST | mgl.CULL_FACE | mgl.BLEND)
+        self.size = size
+        self.buttons = buttons
+        self.profiler = profiler
+        # GPU timers of the background, icon and button draws, while GPU timing is enabled
+        self.gpu_timers = None
+        # the GPU seconds of the draws of the last frame, as measured by the timers a few frames ago
+        self.gpu_time = None
+
+        # ps2 3d icon objects
+        self.icon_sys, self.icons = None, None
+        self.icon = None
+        # (memory card path, save directory name) of the displayed save
+        self.save = None
+
+        # Pointer to the shape.
+        self.vao_index = 0
+
+        # the icons of every save on the card, drawn instead of the selected save while shown
+        self.gallery = None
+
+        # action button's position list
+        self.circle_centers = []
+
+        # shader programs for the background, icon and action button,
+        # shared by all renderers of the context
+        self.shader_program = get_programs(self.ctx)
+
+        # the textures of all icons, in the layers of one texture array
+        self.textures = TextureManager(self.ctx, packed_textures, texture_layers)
+
+        # Objects used for spatial, perspective, rotation, and other calculations
+        self.model = dict()
+        # icon and background models of recently displayed saves
+        self.model_cache = ModelCache(cache_budget)
+        self.camera = Camera(size)
+        # the camera, lights and per-frame uniforms, in uniform buffers
+        self.uniforms = SceneUniforms(self.ctx)
+        self.uniforms.write_camera(self.camera)
+
+    def refresh(self, icon_sys: IconSys, icons: List[Icon], save: Tuple[str, str]):
+        """
+        Switch to another save.
+
+        Parameters:
+        - icon_sys (IconSys): The icon.sys of the save.
+        - icons (List[Icon]): The normal, copy and delete icons of the save.
+        - save (Tuple[str, str]): The memory card path and the save directory name,
+          used as the key of the cached models.
+        """
+
+        # clear the previous action button
+        self.circle_centers = []
+        # reset resources, the icon and background models stay cached
+        if "circles" in self.model:
+            self.model["circles"].release()
+        self.icon_sys, self.icons, self.save = icon_sys, icons, save
+
+        # initialize new models
+        bg_key = (*save, None)
+        self.model_cache.retain([bg_key, (*save, 0)])
+        self.model["bg"] = self.model_cache.get(
+            bg_key, lambda: BgModel(self.ctx, self.shader_program, self.icon_sys)
+        )
+        self.use_icon(0)
+        self.model["circles"] = CircleModel(
+            self.ctx, self.shader_program, len(self.icons) if self.buttons else 1
+        )
+        self.circle_centers = self.model["circles"].circle_centers
+
+        # the lights of the save, in a single buffer write
+        self.uniforms.write_lights(self.icon_sys)
+
+    def resize(self, size: Tuple[int, int]):
+        """
+        Draw into a viewport of another size.
+
+        Parameters:
+        - size (Tuple[int, int]): The new size of the viewport.
+        """
+        self.size = size
+        self.camera.resize(size)
+        self.uniforms.write_camera(self.camera)
+        if "hud" in self.model:
+            self.model["hud"].resize(size)
+
+    def preload(self, icon_sys: IconSys, icons: List[Icon], save: Tuple[str, str]):
+        """
+        Upload the models of a save that is likely to be displayed soon into the cache.
+
+        Parameters:
+        - icon_sys (IconSys): The icon.sys of the save.
+        - icons (List[Icon]): The icons of the save.
+        - save (Tuple[str, str]): The memory card path and the save directory name.
+        """
+        self.model_cache.get(
+            (*save, None), lambda: BgModel(self.ctx, self.shader_program, icon_sys)
+        )
+        for index, icon in enumerate(icons):
+            self.model_cache.get((*save, index), lambda: self.__icon_model(icon))
+
+    def use_icon(self, index: int):
+        """
+        Switch to one of the icons of the displayed save,
+        building its model unless it is cached already.
+
+        Parameters:
+        - index (int): The index of the icon in the icons of the save.
+        """
+        self.icon = self.icons[index]
+        icon_key = (*self.save, index)
+        self.model_cache.retain([(*self.save, None), icon_key])
+        self.model["icon"] = self.model_cache.get(icon_key, lambda: self.__icon_model(self.icon))
+
+    def __icon_model(self, icon: Icon) -> IconModel:
+        """
+        Build the model of an icon, evicting cached models, least recently used first,
+        while its texture would grow the texture array past its capacity.
+        """
+        if icon.texture is not None:
+            while self.textures.full and self.model_cache.evict_one():
+                pass
+        return IconModel(self.ctx, self.shader_program, icon, self.textures)
+
+    def render(self, animation_time: float):
+        """
+        Render one frame.
+
+        Parameters:
+        - animation_time (float): The playback time of the animation in seconds.
+        """
+        if self.profiler is None:
+            self.draw(animation_time)
+            return
+        with self.profiler.stage("draw"):
+            self.draw(animation_time)
+        self.profiler.resident_bytes = self.resident_bytes()
+
+    def resident_bytes(self) -> int:
+        """
+        The GPU memory of the cached models, the texture array and the gallery.
+        """
+        gallery_nbytes = self.gallery.nbytes if self.gallery is not None else 0
+        return self.model_cache.nbytes + self.textures.nbytes + gallery_nbytes
+
+    def draw(self, animation_time: float):
+        """
+        Issue the draw calls of one frame, timing them on the GPU if enabled.
+
+        Parameters:
+        - animation_time (float): The playback time of the animation in seconds.
+        """
+        self.uniforms.bind()
+        self.gpu_time = None
+        if self.gallery is not None:
+            self.ctx.clear(*GalleryModel.BACKGROUND)
+            with self.gpu_timer("gallery"):
+                self.gallery.render(animation_time)
+        else:
+            self.draw_save(animation_time)
+        if "hud" in self.model:
+            self.model["hud"].render()
+
+    def draw_save(self, animation_time: float):
+        """
+        Draw the background, icon and action buttons of the selected save.
+        """
+        self.ctx.clear()
+        self.update(animation_time)
+        self.model["icon"].use()
+        with self.gpu_timer("bg"):
+            self.model["bg"].vao().render()
+        with self.gpu_timer("icon"):
+            self.model["icon"].vao(self.vao_index).render()
+        with self.gpu_timer("circles"):
+            for vao in self.model["circles"].vaos():
+                vao.render(mgl.TRIANGLE_FAN)
+
+    @contextmanager
+    def gpu_timer(self, name: str) -> Iterator[None]:
+        if self.gpu_timers is None:
+            yield
+            return
+        with self.gpu_timers[name].measure() as elapsed:
+            yield
+        self.profiler.record_gpu(name, elapsed)
+        if elapsed is not None:
+            self.gpu_time = (self.gpu_time or 0.0) + elapsed
+
+    def enable_gpu_timing(self, enabled: bool):
+        """
+        Switch the timer queries around the draw calls, which are recorded by the profiler.
+        """
+        if enabled and self.profiler is not None:
+            if self.gpu_timers is None:
+                self.gpu_timers = {name: GpuTimer(self.ctx) for name in ("bg", "icon", "circles", "gallery")}
+        elif self.gpu_timers is not None:
+            for timer in self.gpu_timers.values():
+                timer.release()
+            self.gpu_timers = None
+
+    def set_hud(self, image: Optional[bytes], size: Tuple[int, int] = None):
+        """
+        Show a text overlay in the top-left corner, or hide it.
+
+        Parameters:
+        - image (bytes): The RGB pixels of the overlay, top row first, or None to hide it.
+        - size (Tuple[int, int]): The size of the overlay in pixels.
+        """
+        if image is None:
+            if "hud" in self.model:
+                self.model.pop("hud").release()
+            return
+        if "hud" not in self.model:
+            self.model["hud"] = HudModel(self.ctx, self.shader_program, self.size)
+        self.model["hud"].update(image, size)
+
+    def show_gallery(self, items: List[Tuple[IconSys, Icon]]):
+        """
+        Draw the icons of many saves in a grid, instead of the selected save.
+
+        Parameters:
+        - items (List[Tuple[IconSys, Icon]]): The icon.sys and the normal icon of every save.
+        """
+        self.hide_gallery()
+        self.gallery = GalleryModel(self.ctx, self.shader_program, items, self.uniforms, self.textures)
+
+    def hide_gallery(self):
+        """
+        Go back to drawing the selected save.
+        """
+        if self.gallery is not None:
+            self.gallery.release()
+            self.gallery = None
+
+    def frame_index(self, animation_time: float) -> int:
+        """
+        The frame of the icon animation played at the given time.
+        In the gallery, where the icons play at different speeds, a frame of `FPS`.
+
+        Parameters:
+        - animation_time (float): The playback time of the animation in seconds.
+
+        Returns:
+            int: The frame index.
+        """
+        if self.gallery is not None:
+            return int(animation_time * Renderer.FPS)
+        return self.model["icon"].timeline.frame(animation_time)
+
+    def loop_duration(self) -> float:
+        """
+        The seconds of one loop of the animation of the displayed icon,
+        or of the longest animation in the gallery.
+        """
+        if self.gallery is not None:
+            return self.gallery.timelines.duration
+        return self.model["icon"].timeline.duration
+
+    def update(self, animation_time: float):
+        """
+        Look up the shape and tween factor of the current frame in the timeline of the icon,
+        and write them with the rotation of the model in one buffer write.
+
+        Parameters:
+        - animation_time (float): The playback time of the animation in seconds.
+        """
+        icon_model = self.model["icon"]
+        timeline = icon_model.timeline
+        # update shape pointer
+        self.vao_index, _, tween_factor = timeline[timeline.frame(animation_time)]
+        # Rotate the model around the y-axis.
+        self.uniforms.write_frame(y_rotation(animation_time / 2), tween_factor, icon_model.layer)
+
+    def release(self):
+        """
+        Clean up resources and release memory.
+        """
+        if "circles" in self.model:
+            self.model["circles"].release()
+        self.hide_gallery()
+        self.set_hud(None)
+        self.enable_gpu_timing(False)
+        self.model_cache.clear()
+        self.textures.release()
+        self.uniforms.release()
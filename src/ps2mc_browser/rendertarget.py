@@ -0,0 +1,185 @@
+"""
+Rendering at a resolution other than the window's.
+
+Frames are drawn into an offscreen framebuffer, optionally multisampled,
+which is then upscaled to the window. Its resolution follows the GPU time of
+the frames, so that a large window keeps its frame rate on a slow GPU, at the
+cost of a softer image.
+"""
+from typing import Optional, Tuple
+
+import moderngl as mgl
+
+
+class ResolutionScaler:
+    """
+    Picks the scale of the render resolution that keeps the GPU time of a frame within a budget.
+
+    The time of a fill-bound frame grows with its number of pixels, the square of the scale.
+    Once the smoothed time exceeds the budget, the scale is lowered at once to the step expected
+    to bring it back within; it is raised a step at a time while the time of the next step up
+    fits the budget with some headroom. After every change the measurements of a few frames
+    are ignored, so that the framebuffer isn't reallocated every frame.
+    """
+
+    MIN_SCALE = 0.5
+    MAX_SCALE = 1.0
+    STEP = 0.125
+    SMOOTHING = 0.1  # weight of the last frame in the average
+    HEADROOM = 0.8  # fraction of the budget the next step up must fit in
+    SETTLE_FRAMES = 30  # frames ignored after the scale changed
+
+    def __init__(self, budget: float, min_scale: float = MIN_SCALE, max_scale: float = MAX_SCALE):
+        """
+        Parameters:
+        - budget (float): The GPU seconds a frame may take.
+        - min_scale (float): The lowest scale.
+        - max_scale (float): The highest scale, 1 for the resolution of the window.
+        """
+        self.budget = budget
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.scale = max_scale
+        self.average: Optional[float] = None
+        # the first measurements are skipped as well, they include the warm-up of the driver
+        self.settling = ResolutionScaler.SETTLE_FRAMES
+
+    def set_budget(self, budget: float):
+        self.budget = budget
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the measurements, after a pause or a change of the drawn content.
+        """
+        self.average = None
+        self.settling = ResolutionScaler.SETTLE_FRAMES
+
+    def update(self, gpu_time: Optional[float]) -> bool:
+        """
+        Account for the GPU time of a frame.
+
+        Parameters:
+        - gpu_time (float): The GPU seconds of a frame, None if not measured yet.
+
+        Returns:
+            bool: Whether the scale changed.
+        """
+        if gpu_time is None:
+            return False
+        if self.settling:
+            self.settling -= 1
+            return False
+        if self.average is None:
+            self.average = gpu_time
+        else:
+            self.average += (gpu_time - self.average) * ResolutionScaler.SMOOTHING
+
+        scale = self.scale
+        if self.average > self.budget:
+            wanted = scale * (self.budget / self.average) ** 0.5
+            scale = max(self.min_scale, ResolutionScaler.STEP * int(wanted / ResolutionScaler.STEP))
+        elif scale < self.max_scale:
+            up = min(self.max_scale, scale + ResolutionScaler.STEP)
+            if self.average * (up / scale) ** 2 < self.budget * ResolutionScaler.HEADROOM:
+                scale = up
+        if scale == self.scale:
+            return False
+        self.scale = scale
+        self.reset()
+        return True
+
+
+class RenderTarget:
+    """
+    An offscreen framebuffer, multisampled or not, drawn into at any resolution
+    and upscaled to the window with linear filtering.
+    """
+
+    TEXTURE_UNIT = 6  # after the units of the icon, HUD and gallery textures
+
+    def __init__(self, ctx: mgl.Context, program: mgl.Program, samples: int = 0):
+        """
+        Parameters:
+        - ctx (mgl.Context): The context to render with.
+        - program (mgl.Program): The upscaling program.
+        - samples (int): The number of samples per pixel, 0 to disable multisampling.
+        """
+        self.ctx = ctx
+        self.program = program
+        self.samples = min(samples, ctx.max_samples)
+        self.size: Optional[Tuple[int, int]] = None
+        # the framebuffer drawn into, and the one the texture is resolved into when multisampled
+        self.fbo = None
+        self.resolve_fbo = None
+        self.texture = None
+        self._vao = ctx.vertex_array(program, [])
+
+    def set_samples(self, samples: int):
+        samples = min(samples, self.ctx.max_samples)
+        if samples != self.samples:
+            self.samples = samples
+            self.__release_framebuffers()
+
+    def resize(self, size: Tuple[int, int]) -> bool:
+        """
+        Reallocate the framebuffer at a new resolution, unless it has it already.
+
+        Returns:
+            bool: Whether the framebuffer was reallocated.
+        """
+        if size == self.size and self.fbo is not None:
+            return False
+        self.__release_framebuffers()
+        self.size = size
+        self.texture = self.ctx.texture(size, 3)
+        self.texture.filter = (mgl.LINEAR, mgl.LINEAR)
+        if self.samples:
+            self.fbo = self.ctx.framebuffer(
+                color_attachments=[self.ctx.renderbuffer(size, samples=self.samples)],
+                depth_attachment=self.ctx.depth_renderbuffer(size, samples=self.samples),
+            )
+            self.resolve_fbo = self.ctx.framebuffer(color_attachments=[self.texture])
+        else:
+            self.fbo = self.ctx.framebuffer(
+                color_attachments=[self.texture],
+                depth_attachment=self.ctx.depth_renderbuffer(size),
+            )
+        return True
+
+    def use(self):
+        self.fbo.use()
+
+    def present(self, screen: mgl.Framebuffer, size: Tuple[int, int]):
+        """
+        Resolve the samples if multisampled, and draw the frame over a framebuffer.
+
+        Parameters:
+        - screen (mgl.Framebuffer): The framebuffer of the window.
+        - size (Tuple[int, int]): The size of the window in pixels.
+        """
+        if self.resolve_fbo is not None:
+            self.ctx.copy_framebuffer(self.resolve_fbo, self.fbo)
+        screen.use()
+        screen.viewport = (0, 0, *size)
+        self.texture.use(location=RenderTarget.TEXTURE_UNIT)
+        self.program["frame"] = RenderTarget.TEXTURE_UNIT
+        self.ctx.disable(mgl.DEPTH_TEST)
+        self._vao.render(mgl.TRIANGLES, vertices=3)
+        self.ctx.enable(mgl.DEPTH_TEST)
+
+    def release(self):
+        self.__release_framebuffers()
+        self._vao.release()
+
+    def __release_framebuffers(self):
+        if self.fbo is None:
+            return
+        for attachment in (*self.fbo.color_attachments, self.fbo.depth_attachment):
+            if attachment is not self.texture:
+                attachment.release()
+        self.fbo.release()
+        if self.resolve_fbo is not None:
+            self.resolve_fbo.release()
+        self.texture.release()
+        self.fbo, self.resolve_fbo, self.texture = None, None, None
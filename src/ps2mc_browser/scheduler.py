@@ -0,0 +1,63 @@
+import math
+import time
+from typing import Callable, Optional
+
+
+class FrameScheduler:
+    """
+    Paces frames to a target rate on a monotonic clock.
+
+    Frames are due on a fixed grid of `1 / fps` seconds. When rendering
+    falls behind by whole frames, those frames are dropped rather than
+    rendered late one after another.
+    """
+
+    def __init__(self, fps: float, clock: Callable[[], float] = time.perf_counter):
+        """
+        Parameters:
+        - fps (float): The target frame rate.
+        - clock (Callable): A monotonic clock returning seconds.
+        """
+        self.clock = clock
+        self.period = 1.0 / fps
+        self.next_time: Optional[float] = None
+        self.dropped = 0
+
+    def set_fps(self, fps: float):
+        self.period = 1.0 / fps
+        self.reset()
+
+    def reset(self):
+        """
+        Make the next frame due at once.
+        """
+        self.next_time = None
+
+    def due(self, now: Optional[float] = None) -> bool:
+        """
+        Check whether a frame is due, and if so, schedule the one after it.
+
+        Parameters:
+        - now (float): The current time, read from the clock by default.
+
+        Returns:
+            bool: Whether a frame should be rendered now.
+        """
+        now = self.clock() if now is None else now
+        if self.next_time is None:
+            self.next_time = now
+        if now < self.next_time:
+            return False
+        late = int((now - self.next_time) // self.period)
+        self.dropped += late
+        self.next_time += (late + 1) * self.period
+        return True
+
+    def wait_ms(self, now: Optional[float] = None) -> int:
+        """
+        The whole number of milliseconds until the next frame is due, at least 1.
+        """
+        now = self.clock() if now is None else now
+        if self.next_time is None:
+            return 1
+        return max(1, math.ceil((self.next_time - now) * 1000))
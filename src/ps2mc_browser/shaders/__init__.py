@@ -0,0 +1,72 @@
+"""
+The GLSL shaders of the renderer.
+
+The sources are read from the package once per process, and the programs
+are compiled once per OpenGL context, however many renderers share it.
+The uniform blocks of the programs are bound to fixed binding points, which
+every renderer binds its own uniform buffers to before drawing.
+Code shared by several shaders lives in `.glsl` files, pasted into them by
+`#include "file.glsl"` lines.
+"""
+import importlib.resources
+import re
+import weakref
+from typing import Dict
+
+import moderngl as mgl
+
+
+PROGRAMS = ("bg", "icon", "circle", "hud", "gallery", "upscale")
+# the binding point of every uniform block, see `uniforms.SceneUniforms`
+UNIFORM_BLOCKS = {"Camera": 0, "Lights": 1, "Frame": 2}
+INCLUDE = re.compile(r'^#include "([^"]+)"$', re.MULTILINE)
+
+_sources: Dict[str, str] = {}
+_programs: "weakref.WeakKeyDictionary[mgl.Context, Dict[str, mgl.Program]]" = weakref.WeakKeyDictionary()
+
+
+def get_source(file_name: str) -> str:
+    """
+    Get the source of a shader, reading it from the package on first use.
+
+    Parameters:
+    - file_name (str): The file name of the shader, such as `icon.vert`.
+
+    Returns:
+        str: The GLSL source, with the included files pasted in.
+    """
+    source = _sources.get(file_name)
+    if source is None:
+        source = importlib.resources.files(__name__).joinpath(file_name).read_text()
+        source = INCLUDE.sub(lambda match: get_source(match.group(1)), source)
+        _sources[file_name] = source
+    return source
+
+
+def get_programs(ctx: mgl.Context) -> Dict[str, mgl.Program]:
+    """
+    Get the shader programs of a context, compiling them on first use.
+    They live as long as the context and must not be released by their users.
+
+    Parameters:
+    - ctx (mgl.Context): The context the programs are created in.
+
+    Returns:
+        Dict[str, mgl.Program]: The programs, keyed by the names in `PROGRAMS`.
+    """
+    programs = _programs.get(ctx)
+    if programs is None:
+        programs = {
+            name: ctx.program(
+                vertex_shader=get_source(f"{name}.vert"),
+                fragment_shader=get_source(f"{name}.frag"),
+            )
+            for name in PROGRAMS
+        }
+        for program in programs.values():
+            for block, binding in UNIFORM_BLOCKS.items():
+                uniform_block = program.get(block, None)
+                if uniform_block is not None:
+                    uniform_block.binding = binding
+        _programs[ctx] = programs
+    return programs
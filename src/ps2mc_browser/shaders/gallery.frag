@@ -0,0 +1,32 @@
+#version 330 core
+
+#define MAX_NUM_TOTAL_LIGHTS 3
+
+in vec2 uv0;
+in vec4 normal0;
+flat in int instance;
+flat in int layer;
+
+out vec4 fragColor;
+
+#include "textures.glsl"
+uniform sampler2D lights;                // Per instance: ambient, then the direction and color of each light
+layout(std140) uniform Frame {
+    mat4 model;
+};
+
+void main() {
+    vec3 normal = normalize(normal0).xyz;
+    vec3 color = sampleTexture(uv0, layer);
+    vec3 diffuse = vec3(0);
+    for (int i = 0; i < MAX_NUM_TOTAL_LIGHTS; i++) {
+        vec4 dir = texelFetch(lights, ivec2(1 + i, instance), 0);
+        vec4 lightColor = texelFetch(lights, ivec2(1 + MAX_NUM_TOTAL_LIGHTS + i, instance), 0);
+        vec3 lightDir = normalize(model * -dir).xyz;
+        float diff = max(dot(lightDir, normal), 0.0);
+        diffuse += diff * lightColor.rgb;
+    }
+    vec4 ambient = texelFetch(lights, ivec2(0, instance), 0);
+    color = (ambient.rgb + diffuse) * color;
+    fragColor = vec4(color, 1);
+}
\ No newline at end of file
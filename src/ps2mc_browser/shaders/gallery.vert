@@ -0,0 +1,56 @@
+#version 330 core
+
+// Vertex data of all icons, fetched by vertex and instance index
+uniform sampler2D positions;  // The positions of every shape of every icon
+uniform sampler2D texCoords;  // The texture coordinates of every icon
+uniform sampler2D normals;    // The normals of every icon
+
+// Per-instance attributes
+in vec4 cell;           // Center and half size of the grid cell in NDC
+in ivec4 mesh;          // Offset of the positions, offset of the attributes, vertex count, texture layer
+in ivec2 shapes;        // Current and next shape
+in float tweenFactor;   // Tweening factor between the shapes
+
+// Output variables for fragment shader
+out vec2 uv0;
+out vec4 normal0;
+flat out int instance;
+flat out int layer;
+
+// Uniform blocks, see uniforms.py, the tween factor and layer of the frame are per instance here
+layout(std140) uniform Camera {
+    mat4 proj;
+    mat4 view;
+};
+layout(std140) uniform Frame {
+    mat4 model;
+};
+
+const int TEXELS_PER_ROW = 1024;
+
+vec4 fetch(sampler2D data, int index) {
+    return texelFetch(data, ivec2(index % TEXELS_PER_ROW, index / TEXELS_PER_ROW), 0);
+}
+
+void main() {
+    instance = gl_InstanceID;
+    layer = mesh.w;
+    // Every instance draws as many vertices as the largest icon,
+    // the vertices past the end of a smaller icon are moved out of the view.
+    if (gl_VertexID >= mesh.z) {
+        uv0 = vec2(0);
+        normal0 = vec4(0);
+        gl_Position = vec4(2.0, 2.0, 2.0, 1.0);
+        return;
+    }
+    vec3 vertexPos = fetch(positions, mesh.x + shapes.x * mesh.z + gl_VertexID).xyz;
+    vec3 nextVertexPos = fetch(positions, mesh.x + shapes.y * mesh.z + gl_VertexID).xyz;
+    uv0 = fetch(texCoords, mesh.y + gl_VertexID).xy;
+    normal0 = model * vec4(fetch(normals, mesh.y + gl_VertexID).xyz, 1);
+
+    vec4 basePos = vec4(mix(vertexPos, nextVertexPos, tweenFactor), 1.0);
+    vec4 position = proj * view * model * basePos;
+    // Shrink the whole view into the grid cell.
+    position.xy = position.xy * cell.zw + cell.xy * position.w;
+    gl_Position = position;
+}
\ No newline at end of file
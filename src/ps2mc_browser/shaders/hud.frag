@@ -0,0 +1,12 @@
+#version 330 core
+
+in vec2 uv;
+
+out vec4 fragColor;
+
+uniform sampler2D texture0;
+uniform float opacity;
+
+void main() {
+    fragColor = vec4(texture(texture0, uv).rgb, opacity);
+}
\ No newline at end of file
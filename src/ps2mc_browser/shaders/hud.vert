@@ -0,0 +1,11 @@
+#version 330 core
+
+in vec2 vertexPos;
+in vec2 texCoord;
+
+out vec2 uv;
+
+void main() {
+    uv = texCoord;
+    gl_Position = vec4(vertexPos, 0, 1.0);
+}
\ No newline at end of file
@@ -17,17 +17,24 @@ struct Light {
 };
 
 // Uniform variables
-uniform sampler2D texture0;  // Texture
-uniform vec4 ambient;        // Ambient light
-uniform mat4 model;          // Model matrix
+#include "textures.glsl"
 
-uniform Light lights[MAX_NUM_TOTAL_LIGHTS];  // Array of lights
+// Uniform blocks, see uniforms.py
+layout(std140) uniform Lights {
+    vec4 ambient;                            // Ambient light
+    Light lights[MAX_NUM_TOTAL_LIGHTS];      // Array of lights
+};
+layout(std140) uniform Frame {
+    mat4 model;          // Model matrix
+    float tweenFactor;   // Tweening factor for vertex animation
+    int layer;           // The layer of the icon texture, -1 if untextured
+};
 
 void main() {
     // Calculate normalized normal vector
     vec3 normal = normalize(normal0).xyz;
     // Get color from the texture
-    vec3 color = texture(texture0, uv0).rgb;
+    vec3 color = sampleTexture(uv0, layer);
     // Calculate diffuse lighting
     vec3 diffuse = vec3(0);
     for (int i = 0; i < MAX_NUM_TOTAL_LIGHTS; i++) {
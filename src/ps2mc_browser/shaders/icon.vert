@@ -10,11 +10,16 @@ in vec3 normal;          // Vertex normal
 out vec2 uv0;            // Texture coordinates for fragment shader
 out vec4 normal0;        // Transformed normal for fragment shader
 
-// Uniform matrices
-uniform mat4 proj;       // Projection matrix
-uniform mat4 view;       // View matrix
-uniform mat4 model;      // Model matrix
-uniform float tweenFactor; // Tweening factor for vertex animation
+// Uniform blocks, see uniforms.py
+layout(std140) uniform Camera {
+    mat4 proj;           // Projection matrix
+    mat4 view;           // View matrix
+};
+layout(std140) uniform Frame {
+    mat4 model;          // Model matrix
+    float tweenFactor;   // Tweening factor for vertex animation
+    int layer;           // The layer of the icon texture, -1 if untextured
+};
 
 void main() {
     // Pass texture coordinates to fragment shader
@@ -0,0 +1,32 @@
+// The sampling of the icon textures, included by the icon and gallery shaders.
+// The textures are stored in the layers of a texture array, see textures.py.
+
+uniform sampler2DArray textures;         // The icon textures, one per layer
+uniform usampler2DArray packedTextures;  // The same, packed as RGB555
+uniform bool texturesPacked;             // Whether the textures are packed
+
+// Unpack a RGB555 texel.
+vec3 unpack(ivec2 st, int layer) {
+    ivec2 size = textureSize(packedTextures, 0).xy;
+    // wrap around like the default repeat mode
+    uint texel = texelFetch(packedTextures, ivec3((st % size + size) % size, layer), 0).r;
+    return vec3(texel & 31u, (texel >> 5) & 31u, (texel >> 10) & 31u) * (8.0 / 255.0);
+}
+
+// Sample a texture layer, filtering packed texels bilinearly.
+vec3 sampleTexture(vec2 uv, int layer) {
+    if (layer < 0) {
+        return vec3(1);
+    }
+    if (!texturesPacked) {
+        return texture(textures, vec3(uv, layer)).rgb;
+    }
+    vec2 st = uv * vec2(textureSize(packedTextures, 0).xy) - 0.5;
+    ivec2 st0 = ivec2(floor(st));
+    vec2 f = fract(st);
+    return mix(
+        mix(unpack(st0, layer), unpack(st0 + ivec2(1, 0), layer), f.x),
+        mix(unpack(st0 + ivec2(0, 1), layer), unpack(st0 + ivec2(1, 1), layer), f.x),
+        f.y
+    );
+}
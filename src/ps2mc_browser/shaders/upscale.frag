@@ -0,0 +1,11 @@
+#version 330 core
+
+in vec2 uv;
+
+out vec4 fragColor;
+
+uniform sampler2D frame;  // The frame rendered at a lower resolution
+
+void main() {
+    fragColor = vec4(texture(frame, uv).rgb, 1.0);
+}
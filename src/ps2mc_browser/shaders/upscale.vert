@@ -0,0 +1,10 @@
+#version 330 core
+
+// A triangle covering the whole viewport, generated from the vertex index
+out vec2 uv;
+
+void main() {
+    vec2 position = vec2(gl_VertexID == 1 ? 3.0 : -1.0, gl_VertexID == 2 ? 3.0 : -1.0);
+    uv = position * 0.5 + 0.5;
+    gl_Position = vec4(position, 0.0, 1.0);
+}
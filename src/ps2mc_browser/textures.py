@@ -0,0 +1,129 @@
+import hashlib
+from typing import Dict, List
+
+import moderngl as mgl
+import numpy as np
+
+
+class TextureManager:
+    """
+    Packs the 128x128 icon textures into the layers of one shared texture array.
+
+    Identical textures, such as the normal, copy and delete icons of a save
+    sharing their art, are stored once: layers are keyed by a hash of their
+    content and reference counted. The array grows by doubling when full,
+    up to `max_layers`; past it, `full` tells the owner to free layers first.
+    The array never shrinks, so freed layers are only reused.
+
+    With `packed=True`, texels are stored as 16-bit RGB555 rather than RGB8,
+    which halves the memory of most drivers' RGBA8 storage. The icons are
+    A1B5G5R5 on the memory card, so no color is lost. The shaders then fetch
+    and filter the packed texels themselves.
+    """
+
+    SIZE = (128, 128)
+    INITIAL_LAYERS = 16
+    MAX_LAYERS = 256  # layers the array grows to before layers must be freed
+    UNIT = 0  # the texture unit the array is bound to
+    UNUSED_UNIT = 7  # the unit of the sampler of the other storage, which is never sampled
+
+    def __init__(self, ctx: mgl.Context, packed: bool = False, max_layers: int = MAX_LAYERS):
+        """
+        Parameters:
+        - ctx (mgl.Context): The context the textures are created in.
+        - packed (bool): Whether to store the texels as RGB555.
+        - max_layers (int): The layers the array grows to while none are freed. It only grows
+          past them when no layer can be freed, e.g. for a gallery of more icons.
+        """
+        self.ctx = ctx
+        self.packed = packed
+        self.max_layers = max_layers
+        self.layers = 0
+        self.array = None
+        # content hash of every used layer, its layer and its number of users
+        self.layer_of: Dict[bytes, int] = {}
+        self.digest_of: Dict[int, bytes] = {}
+        self.refs: Dict[int, int] = {}
+        self.free: List[int] = []
+        self.layer_nbytes = TextureManager.SIZE[0] * TextureManager.SIZE[1] * (2 if packed else 3)
+        self.__grow(TextureManager.INITIAL_LAYERS)
+
+    @property
+    def nbytes(self) -> int:
+        return self.layers * self.layer_nbytes
+
+    @property
+    def full(self) -> bool:
+        """
+        Whether storing a new texture would grow the array past `max_layers`.
+        """
+        return not self.free and self.layers >= self.max_layers
+
+    def acquire(self, texture) -> int:
+        """
+        Store a texture, unless an identical one is stored already.
+
+        Parameters:
+        - texture (bytes-like): The RGB texels of a 128x128 texture.
+
+        Returns:
+            int: The layer of the texture, to be passed to `discard` when no longer used.
+        """
+        data = memoryview(texture).cast("B")
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        layer = self.layer_of.get(digest)
+        if layer is not None:
+            self.refs[layer] += 1
+            return layer
+        if not self.free:
+            layers = self.layers * 2
+            self.__grow(min(layers, self.max_layers) if self.layers < self.max_layers else layers)
+        layer = self.free.pop()
+        self.array.write(self.__texels(data), viewport=(0, 0, layer, *TextureManager.SIZE, 1))
+        self.layer_of[digest] = layer
+        self.digest_of[layer] = digest
+        self.refs[layer] = 1
+        return layer
+
+    def discard(self, layer: int):
+        """
+        Give up a layer returned by `acquire`, freeing it once it has no users.
+        """
+        self.refs[layer] -= 1
+        if self.refs[layer] == 0:
+            del self.refs[layer]
+            del self.layer_of[self.digest_of.pop(layer)]
+            self.free.append(layer)
+
+    def use(self, program: mgl.Program):
+        """
+        Bind the array, and point the sampler of the program matching the storage at it.
+        The program declares both a `textures` and a `packedTextures` sampler.
+        """
+        self.array.use(location=TextureManager.UNIT)
+        program["textures"] = TextureManager.UNUSED_UNIT if self.packed else TextureManager.UNIT
+        program["packedTextures"] = TextureManager.UNIT if self.packed else TextureManager.UNUSED_UNIT
+        program["texturesPacked"] = self.packed
+
+    def __texels(self, data: memoryview) -> bytes:
+        if not self.packed:
+            return data
+        rgb = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3).astype(np.uint16) >> 3
+        return (rgb[:, 0] | rgb[:, 1] << 5 | rgb[:, 2] << 10).tobytes()
+
+    def __grow(self, layers: int):
+        if self.packed:
+            array = self.ctx.texture_array((*TextureManager.SIZE, layers), 1, dtype="u2")
+            # integer textures can't be filtered by the GPU
+            array.filter = (mgl.NEAREST, mgl.NEAREST)
+        else:
+            array = self.ctx.texture_array((*TextureManager.SIZE, layers), 3)
+        if self.array is not None:
+            array.write(self.array.read(), viewport=(0, 0, 0, *TextureManager.SIZE, self.layers))
+            self.array.release()
+        self.free.extend(range(layers - 1, self.layers - 1, -1))
+        self.array = array
+        self.layers = layers
+
+    def release(self):
+        self.array.release()
@@ -0,0 +1,69 @@
+"""
+The uniform buffers of the icon and gallery programs.
+
+The uniforms are grouped into std140 blocks by how often they change, so
+drawing a frame takes one buffer write however many uniforms the shaders read.
+"""
+import struct
+from typing import Sequence
+
+import moderngl as mgl
+from ps2mc.icon import IconSys
+
+from .models import Camera
+from .shaders import UNIFORM_BLOCKS
+
+
+class SceneUniforms:
+    """
+    The uniform buffers of a renderer, bound to the blocks of `shaders.UNIFORM_BLOCKS`:
+    - Camera: the projection and view matrices, written when the camera changes.
+    - Lights: the ambient light and the three lights of the displayed save, written when the save changes.
+    - Frame: the model matrix, the tween factor and the texture layer of the icon, written every frame.
+    """
+
+    # the mat4 proj and view
+    __camera_struct = struct.Struct("<32f")
+    # the vec4 ambient, then the vec4 dir and color of each light
+    __lights_struct = struct.Struct("<28f")
+    # the mat4 model, float tweenFactor and int layer, padded to a multiple of a vec4
+    __frame_struct = struct.Struct("<17fi8x")
+
+    def __init__(self, ctx: mgl.Context):
+        self.buffers = {
+            "Camera": ctx.buffer(reserve=SceneUniforms.__camera_struct.size),
+            "Lights": ctx.buffer(reserve=SceneUniforms.__lights_struct.size),
+            "Frame": ctx.buffer(reserve=SceneUniforms.__frame_struct.size, dynamic=True),
+        }
+
+    def write_camera(self, camera: Camera):
+        self.buffers["Camera"].write(camera.proj.to_bytes() + camera.view.to_bytes())
+
+    def write_lights(self, icon_sys: IconSys):
+        values = list(icon_sys.ambient)
+        for direction, color in zip(icon_sys.light_dir, icon_sys.light_colors):
+            values.extend(direction)
+            values.extend(color)
+        self.buffers["Lights"].write(SceneUniforms.__lights_struct.pack(*values))
+
+    def write_frame(self, model: Sequence[float], tween_factor: float = 0.0, layer: int = -1):
+        """
+        Write the per-frame uniforms.
+
+        Parameters:
+        - model (Sequence[float]): The 16 floats of the model matrix, in column-major order.
+        - tween_factor (float): The tweening factor between the current and next shape.
+        - layer (int): The texture layer of the icon, -1 if untextured.
+        """
+        self.buffers["Frame"].write(SceneUniforms.__frame_struct.pack(*model, tween_factor, layer))
+
+    def bind(self):
+        """
+        Bind the buffers to their blocks, which other renderers of the context may have rebound.
+        """
+        for name, buffer in self.buffers.items():
+            buffer.bind_to_uniform_block(UNIFORM_BLOCKS[name])
+
+    def release(self):
+        for buffer in self.buffers.values():
+            buffer.release()
@@ -6,6 +6,8 @@ CANVAS_WIDTH = 640
 CANVAS_HEIGHT = 480
 CIRCLE_SEGMENTS_NUM = 10
 CIRCLE_RADIUS = 0.02
+# See https://babyno.top/en/posts/2023/10/parsing-ps2-3d-icon/ for details.
+FIXED_POINT_FACTOR = 4096.0
 
 
 def distance(x1: float, y1: float, x2: float, y2: float) -> float:
@@ -59,23 +61,31 @@ def circle_data(circle_center: tuple[float, float]) -> np.ndarray:
     return np.array(vertices, dtype='f4')
 
 
-def coord_convert(screen_x: float, screen_y: float) -> tuple[float, float]:
+def coord_convert(
+    screen_x: float, screen_y: float, size: tuple[int, int] = (CANVAS_WIDTH, CANVAS_HEIGHT)
+) -> tuple[float, float]:
     """
     Convert screen coordinates to normalized device coordinates.
 
     Parameters:
     - screen_x (float): The x-coordinate of the screen coordinates.
     - screen_y (float): The y-coordinate of the screen coordinates.
+    - size (Tuple[int, int]): The size of the canvas, in the unit of the screen coordinates.
 
     Returns:
         Tuple[float, float]: The normalized device coordinates.
     """
-    ndc_x = (2.0 * screen_x / CANVAS_WIDTH) - 1.0
-    ndc_y = 1.0 - (2.0 * screen_y / CANVAS_HEIGHT)
+    ndc_x = (2.0 * screen_x / size[0]) - 1.0
+    ndc_y = 1.0 - (2.0 * screen_y / size[1])
     return (ndc_x, ndc_y)
 
 
-def determine_circle_index(screen_x: float, screen_y: float, circle_centers: tuple[float, float]) -> int:
+def determine_circle_index(
+    screen_x: float,
+    screen_y: float,
+    circle_centers: tuple[float, float],
+    size: tuple[int, int] = (CANVAS_WIDTH, CANVAS_HEIGHT),
+) -> int:
     """
     Determine whether the given coordinates are within the action button.
     If so, return the index of the action button.
@@ -84,21 +94,53 @@ def determine_circle_index(screen_x: float, screen_y: float, circle_centers: tup
     - screen_x (float): The x-coordinate of the screen coordinates.
     - screen_y (float): The y-coordinate of the screen coordinates.
     - circle_centers (Tuple[float, float]): The coordinates of the circle centers of the action buttons.
+    - size (Tuple[int, int]): The size of the canvas, in the unit of the screen coordinates.
 
     Returns:
         int: The index of the action button.
     """
     if not circle_centers:
         return None
-    ndc_x, ndc_y = coord_convert(screen_x, screen_y)
+    ndc_x, ndc_y = coord_convert(screen_x, screen_y, size)
     for index, circle_center in enumerate(circle_centers):
         if distance(ndc_x, ndc_y, circle_center[0], circle_center[1]) <= CIRCLE_RADIUS:
             return index
     return None
 
+
 def convert_vertex_data(icon: Icon, i, h):
     v_i = np.array([v[i][:3] for v in icon.vertex_data], dtype=np.float32)
     v_h = np.array([v[h][:3] for v in icon.vertex_data], dtype=np.float32)
     uv = np.array(icon.uv_data, dtype=np.float32)
     normal = np.array([n[:3] for n in icon.normal_data], dtype=np.float32)
     return np.hstack((v_i, v_h, uv, normal))
+
+
+def convert_icon_vertex_data(icon: Icon) -> np.ndarray:
+    """
+    Convert the vertex data of every animation shape of an icon in a single pass.
+
+    Each row holds the current position, the position in the next shape
+    (wrapping around to the first one), the texture coordinate and the normal,
+    already scaled down from fixed point and stored as half floats.
+
+    Parameters:
+    - icon (Icon): The icon to convert.
+
+    Returns:
+        np.ndarray: A `(shapes, vertices, 11)` array of type `f2`.
+    """
+    shapes, count = icon.animation_shapes, icon.vertex_count
+    # One extra slot holding the first shape again, so that the "next" positions
+    # of every shape are simply a view shifted by one.
+    positions = np.empty((shapes + 1, count, 3), dtype=np.float32)
+    positions[:shapes] = np.asarray(icon.vertex_data, dtype=np.float32).reshape(count, shapes, 4)[..., :3].swapaxes(0, 1)
+    positions[shapes] = positions[0]
+    positions /= FIXED_POINT_FACTOR
+
+    vertex_data = np.empty((shapes, count, 11), dtype="f2")
+    vertex_data[..., 0:3] = positions[:-1]
+    vertex_data[..., 3:6] = positions[1:]
+    vertex_data[..., 6:8] = np.asarray(icon.uv_data, dtype=np.float32).reshape(count, 2) / FIXED_POINT_FACTOR
+    vertex_data[..., 8:11] = np.asarray(icon.normal_data, dtype=np.float32).reshape(count, 4)[:, :3] / FIXED_POINT_FACTOR
+    return vertex_data
@@ -0,0 +1,435 @@
+"""
+Check the integrity of memory card images.
+
+Every page of a card is followed by a spare area holding a Hamming code of
+each 128 bytes of the page. The codes of all pages are computed with NumPy
+table lookups and XOR reductions, a block of pages at a time, and compared
+with the stored ones; big images are split among worker processes. The FAT,
+the cluster chains and the directory entries are checked as well, and every
+problem found is attributed to the save it affects.
+"""
+import argparse
+import json
+import math
+import mmap
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from ps2mc.ps2mc import Entry, Fat, SuperBlock
+
+from .card import MmapPs2mc
+from .library import find_cards
+
+ECC_OK, ECC_CORRECTABLE, ECC_FAILED = 0, 1, 2
+ECC_CHUNK = 128  # bytes of page data protected by each 3-byte code
+BLOCK_PAGES = 4096  # pages checked at once, bounding the memory of the temporary arrays
+PARALLEL_PAGES = 1 << 16  # images with more pages are split among the worker processes
+DEFAULT_GEOMETRY = (512, 16)  # page and spare area size of a standard 8MB card
+
+# Tables of the Hamming code, indexed by byte value.
+_POPCOUNT = np.array([bin(b).count("1") for b in range(256)], dtype=np.uint8)
+_PARITY = _POPCOUNT & 1
+_COLUMN_PARITY = np.array(
+    [
+        sum(int(_PARITY[b & mask]) << i for i, mask in enumerate((0x55, 0x33, 0x0F, 0x00, 0xAA, 0xCC, 0xF0)))
+        for b in range(256)
+    ],
+    dtype=np.uint8,
+)
+
+
+def page_ecc(pages: np.ndarray) -> np.ndarray:
+    """
+    The ECC bytes of pages.
+
+    Parameters:
+    - pages (np.ndarray): The page data, a `(n, page size)` uint8 array.
+
+    Returns:
+        np.ndarray: A `(n, page size // 128 * 3)` uint8 array, the column parity
+        and the two line parities of every 128 bytes.
+    """
+    chunks = pages.reshape(-1, ECC_CHUNK)
+    index = np.arange(ECC_CHUNK, dtype=np.uint8)
+    odd = _PARITY[chunks].astype(bool)
+    column = np.bitwise_xor.reduce(_COLUMN_PARITY[chunks], axis=1) ^ 0x77
+    line0 = np.bitwise_xor.reduce(np.where(odd, ~index & 0x7F, 0).astype(np.uint8), axis=1) ^ 0x7F
+    line1 = np.bitwise_xor.reduce(np.where(odd, index, 0).astype(np.uint8), axis=1) ^ 0x7F
+    return np.stack([column, line0, line1], axis=1).reshape(len(pages), -1)
+
+
+def check_ecc(raw_pages: np.ndarray, page_size: int) -> np.ndarray:
+    """
+    Compare the ECC stored in the spare area of pages with their data.
+
+    A mismatch caused by a single flipped bit, in the data or in the code,
+    can be corrected by the console; any other mismatch can't. Erased pages,
+    data and spare area all 0xFF, are fine.
+
+    Parameters:
+    - raw_pages (np.ndarray): The pages followed by their spare areas, a `(n, raw page size)` uint8 array.
+    - page_size (int): The size of the page data.
+
+    Returns:
+        np.ndarray: The `ECC_*` status of every page, the worst of its chunks.
+    """
+    chunks_per_page = page_size // ECC_CHUNK
+    data = np.ascontiguousarray(raw_pages[:, :page_size])
+    stored = raw_pages[:, page_size:page_size + chunks_per_page * 3].reshape(-1, 3)
+    computed = page_ecc(data).reshape(-1, 3)
+    column_diff = (computed[:, 0] ^ stored[:, 0]) & 0x77
+    line0_diff = (computed[:, 1] ^ stored[:, 1]) & 0x7F
+    line1_diff = (computed[:, 2] ^ stored[:, 2]) & 0x7F
+    line_syndrome = line0_diff ^ line1_diff
+    column_syndrome = (column_diff >> 4) ^ (column_diff & 0x07)
+    data_bit = (line_syndrome == 0x7F) & (column_syndrome == 0x07)
+    code_bit = ((column_diff | line0_diff | line1_diff) == 0) | (
+        _POPCOUNT[line_syndrome] + _POPCOUNT[column_syndrome] == 1
+    )
+    mismatch = (computed != stored).any(axis=1)
+    status = np.where(mismatch, np.where(data_bit | code_bit, ECC_CORRECTABLE, ECC_FAILED), ECC_OK)
+    status = status.reshape(-1, chunks_per_page).max(axis=1)
+    erased = (raw_pages == 0xFF).all(axis=1)
+    status[erased] = ECC_OK
+    return status.astype(np.uint8)
+
+
+def _check_ecc_range(mc_path: str, page_size: int, spare_size: int, start: int, end: int) -> np.ndarray:
+    """
+    Check the ECC of a range of pages of a card, in a worker process.
+
+    Returns:
+        np.ndarray: A `(n, 2)` array of the index and status of the pages that aren't fine.
+    """
+    raw_page_size = page_size + spare_size
+    with open(mc_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        image = np.frombuffer(mm, dtype=np.uint8, count=(len(mm) // raw_page_size) * raw_page_size)
+        image = image.reshape(-1, raw_page_size)
+        found = []
+        for block in range(start, end, BLOCK_PAGES):
+            status = check_ecc(image[block:min(block + BLOCK_PAGES, end)], page_size)
+            bad = np.flatnonzero(status)
+            found.append(np.stack([bad + block, status[bad]], axis=1))
+        del image
+    return np.concatenate(found) if found else np.zeros((0, 2), dtype=np.int64)
+
+
+def scan_ecc(mc_path: str, page_size: int, spare_size: int, jobs: int = 1) -> Tuple[int, np.ndarray]:
+    """
+    Check the ECC of every page of a card, on `jobs` worker processes for big images.
+
+    Returns:
+        Tuple[int, np.ndarray]: The number of pages, and the index and status
+        of the pages that aren't fine.
+    """
+    pages = os.path.getsize(mc_path) // (page_size + spare_size)
+    if jobs <= 1 or pages <= PARALLEL_PAGES:
+        return pages, _check_ecc_range(mc_path, page_size, spare_size, 0, pages)
+    step = math.ceil(pages / jobs / BLOCK_PAGES) * BLOCK_PAGES
+    mp_context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(jobs, mp_context=mp_context) as executor:
+        results = executor.map(
+            _check_ecc_range,
+            *zip(*[(mc_path, page_size, spare_size, start, min(start + step, pages)) for start in range(0, pages, step)]),
+        )
+        return pages, np.concatenate(list(results))
+
+
+class SaveHealth:
+    """
+    The problems found in a save.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.errors: List[str] = []
+        self.warnings: List[str] = []
+
+    @property
+    def status(self) -> str:
+        return "error" if self.errors else "warning" if self.warnings else "ok"
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "status": self.status, "errors": self.errors, "warnings": self.warnings}
+
+
+class CardReport:
+    """
+    The problems found in a memory card, in its file system and in each of its saves.
+    """
+
+    def __init__(self, mc_path: str):
+        self.mc_path = mc_path
+        self.pages = 0
+        self.errors: List[str] = []
+        self.warnings: List[str] = []
+        self.saves: List[SaveHealth] = []
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors and not any(save.errors for save in self.saves)
+
+    def to_dict(self) -> dict:
+        return {
+            "card": self.mc_path,
+            "ok": self.ok,
+            "pages": self.pages,
+            "errors": self.errors,
+            "warnings": self.warnings,
+            "saves": [save.to_dict() for save in self.saves],
+        }
+
+    def __str__(self) -> str:
+        lines = [f"{self.mc_path}: {'ok' if self.ok else 'damaged'}, {self.pages} pages, {len(self.saves)} saves"]
+        lines.extend(f"  error: {message}" for message in self.errors)
+        lines.extend(f"  warning: {message}" for message in self.warnings)
+        for save in self.saves:
+            if save.status != "ok":
+                lines.append(f"  {save.name}: {save.status}")
+                lines.extend(f"    error: {message}" for message in save.errors)
+                lines.extend(f"    warning: {message}" for message in save.warnings)
+        return "\n".join(lines)
+
+
+def _pages(pages: np.ndarray, limit: int = 5) -> str:
+    listed = ", ".join(str(page) for page in pages[:limit])
+    return listed + (", ..." if len(pages) > limit else "")
+
+
+class _FileSystemCheck:
+    """
+    Walks the directories and cluster chains of a card, checking them against the FAT.
+    """
+
+    ROOT = -2  # the owner of the clusters of the root directory
+
+    def __init__(self, ps2mc: MmapPs2mc, report: CardReport):
+        self.ps2mc = ps2mc
+        self.report = report
+        ps2mc.file.seek(0)
+        superblock = SuperBlock(ps2mc.file)
+        self.alloc_end = superblock.alloc_end
+        fat = np.array(ps2mc.fat_matrix, dtype=np.uint32).ravel()
+        if len(fat) < self.alloc_end:
+            report.errors.append(f"the FAT covers {len(fat)} of {self.alloc_end} clusters")
+            self.alloc_end = len(fat)
+        fat = fat[:self.alloc_end]
+        self.allocated = fat & Fat.ALLOCATED_BIT != 0
+        self.next = fat & ~np.uint32(Fat.ALLOCATED_BIT)
+        # the save index, or ROOT, each cluster belongs to
+        self.owner = np.full(self.alloc_end, -1, dtype=np.int32)
+
+    def run(self) -> np.ndarray:
+        """
+        Check the file system, adding the problems found to the report.
+
+        Returns:
+            np.ndarray: The owner of every page, a save index, ROOT, or -1.
+        """
+        links = self.next[self.allocated & (self.next != Fat.CHAIN_END)]
+        outside = links >= self.alloc_end
+        if outside.any():
+            self.report.errors.append(f"{outside.sum()} FAT entries link outside the card")
+        counts = np.bincount(links[~outside], minlength=self.alloc_end)
+        if (counts > 1).any():
+            self.report.errors.append(f"{(counts > 1).sum()} clusters are linked from several clusters in the FAT")
+
+        root_entry = self.ps2mc.root_entry
+        root_chain, problem = self.chain(root_entry.cluster)
+        if problem:
+            self.report.errors.append(f"the chain of the root directory {problem}")
+        self.claim(root_chain, _FileSystemCheck.ROOT)
+        entries = self.entries(root_chain, root_entry.length, self.report.errors)
+        self.check_dots(entries, self.report.warnings)
+        for entry in entries[2:]:
+            if not entry.is_exists():
+                continue
+            if not entry.is_dir():
+                self.report.warnings.append(f"{entry.name} is a file in the root directory")
+                continue
+            self.check_save(entry)
+
+        lost = self.allocated & (self.owner == -1)
+        if lost.any():
+            self.report.warnings.append(f"{lost.sum()} allocated clusters don't belong to any file")
+
+        ppc = self.ps2mc.pages_per_cluster
+        owners = np.full(self.report.pages, -1, dtype=np.int32)
+        clusters = np.flatnonzero(self.owner != -1)
+        pages = ((clusters + self.ps2mc.alloc_offset)[:, None] * ppc + np.arange(ppc)).ravel()
+        in_card = pages < len(owners)
+        owners[pages[in_card]] = np.repeat(self.owner[clusters], ppc)[in_card]
+        owners[:self.ps2mc.alloc_offset * ppc] = _FileSystemCheck.ROOT
+        return owners
+
+    def check_save(self, directory: Entry):
+        save = SaveHealth(directory.name)
+        index = len(self.report.saves)
+        self.report.saves.append(save)
+        chain, problem = self.chain(directory.cluster)
+        if problem:
+            save.errors.append(f"the chain of the directory {problem}")
+        self.claim(chain, index, save)
+        entries = self.entries(chain, directory.length, save.errors)
+        self.check_dots(entries, save.warnings)
+        for entry in entries[2:]:
+            if not entry.is_exists():
+                continue
+            if entry.is_dir():
+                save.warnings.append(f"the subdirectory {entry.name} isn't checked")
+                continue
+            if entry.length == 0 and entry.cluster == Fat.CHAIN_END:
+                continue
+            chain, problem = self.chain(entry.cluster)
+            if problem:
+                save.errors.append(f"the chain of {entry.name} {problem}")
+            expected = math.ceil(entry.length / self.ps2mc.cluster_size)
+            if len(chain) < expected:
+                save.errors.append(f"{entry.name} is truncated, {len(chain)} of {expected} clusters")
+            elif len(chain) > max(expected, 1):
+                save.warnings.append(f"{entry.name} has {len(chain) - expected} clusters past its end")
+            self.claim(chain, index, save)
+
+    def chain(self, cluster: int) -> Tuple[List[int], Optional[str]]:
+        """
+        Follow a cluster chain through the FAT.
+
+        Returns:
+            Tuple[List[int], str]: The clusters, and what is wrong with the chain, if anything.
+        """
+        chain, seen = [], set()
+        while cluster != Fat.CHAIN_END:
+            if cluster >= self.alloc_end:
+                return chain, f"links to cluster {cluster}, outside the card"
+            if not self.allocated[cluster]:
+                return chain, f"runs into the free cluster {cluster}"
+            if cluster in seen:
+                return chain, f"loops back to cluster {cluster}"
+            seen.add(cluster)
+            chain.append(cluster)
+            cluster = int(self.next[cluster])
+        return chain, None
+
+    def claim(self, chain: List[int], owner: int, save: Optional[SaveHealth] = None):
+        """
+        Record the owner of the clusters of a chain, reporting the clusters owned twice.
+        """
+        clusters = np.array(chain, dtype=np.int64)
+        taken = clusters[self.owner[clusters] != -1]
+        if len(taken):
+            others = {int(other) for other in self.owner[taken]} - {owner}
+            names = sorted(
+                "the root directory" if other == _FileSystemCheck.ROOT else self.report.saves[other].name
+                for other in others
+            )
+            message = f"{len(taken)} clusters are also used by " + (", ".join(names) or "another file of the save")
+            (save.errors if save is not None else self.report.errors).append(message)
+        self.owner[clusters[self.owner[clusters] == -1]] = owner
+
+    def entries(self, chain: List[int], length: int, errors: List[str]) -> List[Entry]:
+        """
+        Read the entries of a directory.
+        """
+        entries = []
+        for cluster in chain:
+            for entry in Entry.build(self.ps2mc.read_cluster(cluster + self.ps2mc.alloc_offset)):
+                if len(entries) == length:
+                    return entries
+                try:
+                    entries.append(entry.unpack())
+                except Exception as e:
+                    errors.append(f"entry {len(entries)} can't be read: {e}")
+                    return entries
+        if len(entries) < length:
+            errors.append(f"the directory holds {len(entries)} of its {length} entries")
+        return entries
+
+    @staticmethod
+    def check_dots(entries: List[Entry], warnings: List[str]):
+        if [entry.name for entry in entries[:2]] != [".", ".."]:
+            warnings.append("the directory doesn't start with its '.' and '..' entries")
+
+
+def verify_card(mc_path: str, jobs: int = 1) -> CardReport:
+    """
+    Check the ECC of every page, the FAT, the cluster chains and the directory entries of a card.
+
+    Parameters:
+    - mc_path (str): The path to the memory card image.
+    - jobs (int): The number of worker processes the ECC check of big images is split among.
+
+    Returns:
+        CardReport: The problems found.
+    """
+    report = CardReport(mc_path)
+    with open(mc_path, "rb") as file:
+        ps2mc = None
+        try:
+            ps2mc = MmapPs2mc(file)
+            page_size, spare_size = ps2mc.page_size, ps2mc.spare_size
+        except Exception as e:
+            report.errors.append(f"the file system can't be read: {e}")
+            page_size, spare_size = DEFAULT_GEOMETRY
+        report.pages, bad_pages = scan_ecc(mc_path, page_size, spare_size, jobs)
+        # without a readable file system, every page counts as one of its pages
+        owners = np.full(report.pages, _FileSystemCheck.ROOT, dtype=np.int32)
+        if ps2mc is not None:
+            try:
+                owners = _FileSystemCheck(ps2mc, report).run()
+            except Exception as e:
+                report.errors.append(f"the file system can't be checked: {e}")
+            finally:
+                ps2mc.close()
+
+    for status, label in ((ECC_FAILED, "uncorrectable"), (ECC_CORRECTABLE, "correctable")):
+        pages = bad_pages[bad_pages[:, 1] == status, 0]
+        by_owner: Dict[int, np.ndarray] = {
+            int(owner): pages[owners[pages] == owner] for owner in np.unique(owners[pages])
+        }
+        for owner, owned in by_owner.items():
+            message = f"{len(owned)} pages with {label} ECC errors ({_pages(owned)})"
+            if owner >= 0:
+                save = report.saves[owner]
+                (save.errors if status == ECC_FAILED else save.warnings).append(message)
+            elif owner == _FileSystemCheck.ROOT:
+                (report.errors if status == ECC_FAILED else report.warnings).append(f"file system: {message}")
+            else:
+                report.warnings.append(f"free space: {message}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the integrity of PS2 memory card images.")
+    parser.add_argument("paths", nargs="+", metavar="PATH", help="memory card images (.ps2) or directories of them")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="worker processes checking the pages of big images, 0 for one per CPU")
+    parser.add_argument("--json", metavar="FILE", help="also write the reports as JSON")
+    args = parser.parse_args()
+
+    cards = []
+    for path in args.paths:
+        cards.extend(sorted(find_cards(path)) if os.path.isdir(path) else [path])
+    jobs = args.jobs or os.cpu_count() or 1
+    reports = []
+    for mc_path in cards:
+        try:
+            report = verify_card(mc_path, jobs)
+        except OSError as e:
+            report = CardReport(mc_path)
+            report.errors.append(str(e))
+        reports.append(report)
+        print(report)
+    damaged = sum(not report.ok for report in reports)
+    print(f"{len(reports)} cards checked, {damaged} damaged")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump([report.to_dict() for report in reports], f, indent=2)
+    sys.exit(1 if damaged else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Watch an opened memory card image for changes, such as an emulator writing a save.
+
+The card file is polled for changes of its size and modification time. Once a
+change has settled, the card is scanned again and compared with the previous
+scan, save by save, so that only the saves that changed need to be reloaded.
+The first scan is compared with the signatures taken when the card was listed,
+so the writes made meanwhile are reported as well.
+"""
+import os
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from ps2mc.browser import Browser
+from ps2mc.ps2mc import Entry, Fat
+
+from .card import MmapBrowser
+
+# the raw directory entry of a save, and the raw entry and cluster chain of each of its files
+Signature = Tuple[bytes, Tuple[Tuple[bytes, Tuple[int, ...]], ...]]
+
+
+def cluster_chain(browser: Browser, entry: Entry) -> Tuple[int, ...]:
+    """
+    The clusters of a file or directory, following the FAT.
+    """
+    chain = {}
+    cluster = entry.cluster
+    # a corrupted FAT may loop
+    while cluster != Fat.CHAIN_END and cluster not in chain:
+        chain[cluster] = None
+        cluster = browser.ps2mc.get_fat_value(cluster)
+    return tuple(chain)
+
+
+def signature(browser: Browser, entry: Entry) -> Signature:
+    """
+    The signature of a save, from its entry in the root directory.
+
+    A save changes when its directory entry, the entry of one of its files
+    (holding the length and modification time) or a cluster chain does.
+    """
+    files = ()
+    if entry.is_dir():
+        files = tuple(
+            (sub_entry.byte_val, cluster_chain(browser, sub_entry))
+            for sub_entry in browser.lookup_entry(entry)
+        )
+    return bytes(entry.byte_val), files
+
+
+def scan(browser: Browser) -> Tuple[List[str], Dict[str, Signature]]:
+    """
+    Read the root directory of a card and the signature of every save.
+
+    Returns:
+        Tuple[List[str], Dict[str, Signature]]: The saves in list order, and their signatures.
+    """
+    games, signatures = [], {}
+    for entry in browser.list_root_dir():
+        games.append(entry.name)
+        signatures[entry.name] = signature(browser, entry)
+    return games, signatures
+
+
+class CardChanges:
+    """
+    The saves that differ between two scans of a card.
+    """
+
+    def __init__(self, games: List[str], previous: Dict[str, Signature], current: Dict[str, Signature]):
+        """
+        Parameters:
+        - games (List[str]): The saves of the current scan, in list order.
+        - previous (Dict[str, Signature]): The signatures of the previous scan.
+        - current (Dict[str, Signature]): The signatures of the current scan.
+        """
+        self.games = games
+        self.signatures = current
+        self.added = [game for game in games if game not in previous]
+        self.removed = [game for game in previous if game not in current]
+        self.changed = [game for game in games if game in previous and previous[game] != current[game]]
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+    def __str__(self) -> str:
+        counts = ((len(self.added), "added"), (len(self.changed), "updated"), (len(self.removed), "removed"))
+        return ", ".join(f"{count} {label}" for count, label in counts if count)
+
+
+class CardWatcher:
+    """
+    Polls a memory card image on a background thread and reports the saves that changed.
+
+    The callback is invoked on the watcher thread with a browser of the card as
+    it is now, which the callback takes ownership of. Once the watcher is
+    cancelled no further callback is made.
+    """
+
+    INTERVAL = 1.0  # seconds between polls
+
+    def __init__(
+        self,
+        mc_path: str,
+        on_change: Callable[[Browser, CardChanges], None],
+        signatures: Optional[Dict[str, Signature]] = None,
+    ):
+        """
+        Parameters:
+        - mc_path (str): The path to the memory card image.
+        - on_change (Callable): Called with a new browser and the changes, when saves changed.
+        - signatures (Dict[str, Signature]): The signatures of the saves as they are listed,
+          taken from the browser they were listed with. Without them, the changes made
+          before the watcher starts are missed.
+        """
+        self.mc_path = mc_path
+        self.on_change = on_change
+        self.cancelled = threading.Event()
+        self.baseline = signatures
+        self.signatures: Dict[str, Signature] = signatures or {}
+        self.thread = threading.Thread(target=self.__run, name="card-watcher", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.mc_path)
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def __run(self):
+        last = self.stat()
+        pending = False
+        if self.baseline is not None:
+            # report what changed since the saves were listed
+            pending = not self.__rescan()
+        else:
+            try:
+                browser = MmapBrowser(self.mc_path)
+            except Exception:
+                browser = None
+            if browser is not None:
+                try:
+                    _, self.signatures = scan(browser)
+                except Exception:
+                    pass
+                browser.close()
+        while not self.cancelled.wait(CardWatcher.INTERVAL):
+            current = self.stat()
+            if current != last:
+                # still being written, wait for the writes to settle
+                last, pending = current, True
+            elif pending and current is not None:
+                # a card caught in the middle of a write is scanned again on the next poll
+                pending = not self.__rescan()
+
+    def __rescan(self) -> bool:
+        """
+        Scan the card, and report the saves that changed since the previous scan.
+
+        Returns:
+            bool: Whether the card could be read.
+        """
+        try:
+            browser = MmapBrowser(self.mc_path)
+        except Exception:
+            return False
+        try:
+            games, signatures = scan(browser)
+        except Exception:
+            browser.close()
+            return False
+        changes = CardChanges(games, self.signatures, signatures)
+        self.signatures = signatures
+        if not changes or self.cancelled.is_set():
+            browser.close()
+        else:
+            self.on_change(browser, changes)
+        return True
@@ -0,0 +1,245 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from ps2mc.browser import Browser
+from ps2mc.icon import Icon, IconSys
+
+from .card import MmapBrowser
+from .diskcache import IconCache
+from .profiling import profiler
+from .watch import Signature, signature
+
+
+class IconPrefetcher:
+    """
+    Reads and parses the icons of saves on a thread pool, ahead of their selection.
+
+    The parsed `IconSys` and `Icon` objects of recently requested saves are kept,
+    so selecting a save that was prefetched doesn't touch the memory card at all.
+    The saves are parsed in parallel, reading the memory map of the card; only
+    the browser in use and the count of reads through each browser are locked.
+    """
+
+    NEIGHBOURS = 2  # saves prefetched on each side of the selection
+    CAPACITY = 32  # saves whose parsed icons are kept
+
+    def __init__(self, browser: Browser, icon_cache: Optional[IconCache] = None, max_workers: int = 2):
+        """
+        Parameters:
+        - browser (Browser): The browser of the opened memory card.
+        - icon_cache (IconCache): The disk cache of converted icons, if any.
+        - max_workers (int): The number of worker threads.
+        """
+        self.browser = browser
+        self.icon_cache = icon_cache
+        # Guards the browser, and signals the end of the reads, so that a browser is only
+        # closed once the reads through it are done.
+        self.lock = threading.Condition()
+        # the running reads through each browser
+        self.readers: Dict[Browser, int] = {}
+        self.closed = False
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="icon-prefetch")
+        self.futures: OrderedDict[str, Future] = OrderedDict()
+
+    def submit(self, game: str) -> Future:
+        """
+        Schedule the icons of a save to be parsed, unless they already are.
+
+        Parameters:
+        - game (str): The save directory name.
+
+        Returns:
+            Future: Resolves to the `(IconSys, List[Icon])` of the save.
+        """
+        future = self.futures.get(game)
+        if future is None:
+            future = self.executor.submit(self.__load, game)
+            self.futures[game] = future
+            while len(self.futures) > IconPrefetcher.CAPACITY:
+                self.futures.popitem(last=False)[1].cancel()
+        else:
+            self.futures.move_to_end(game)
+        return future
+
+    def load(self, game: str) -> Future:
+        """
+        Schedule the icons of a save to be parsed, without keeping them,
+        for a bulk load which would otherwise evict the recent saves.
+
+        Parameters:
+        - game (str): The save directory name.
+
+        Returns:
+            Future: Resolves to the `(IconSys, List[Icon])` of the save.
+        """
+        future = self.futures.get(game)
+        if future is not None:
+            return future
+        return self.executor.submit(self.__load, game)
+
+    def neighbours(self, games: List[str], index: int) -> List[Tuple[str, Future]]:
+        """
+        Schedule the saves next to the selected one in the game list.
+
+        Parameters:
+        - games (List[str]): The save directory names, in list order.
+        - index (int): The index of the selected save.
+
+        Returns:
+            List[Tuple[str, Future]]: The neighbouring saves and their futures.
+        """
+        start = max(index - IconPrefetcher.NEIGHBOURS, 0)
+        end = min(index + IconPrefetcher.NEIGHBOURS + 1, len(games))
+        # nearest first, so that the next scroll step is parsed before the others
+        indices = sorted(range(start, end), key=lambda i: abs(i - index))
+        return [(games[i], self.submit(games[i])) for i in indices if i != index]
+
+    def replace_browser(self, browser: Browser, games: List[str]) -> Browser:
+        """
+        Read from a new browser of the same card, once the running reads are done,
+        forgetting the saves that changed. The other parsed saves are kept.
+
+        Parameters:
+        - browser (Browser): The new browser.
+        - games (List[str]): The saves that changed or were removed.
+
+        Returns:
+            Browser: The previous browser, which can be closed.
+        """
+        with self.lock:
+            previous, self.browser = self.browser, browser
+            self.lock.wait_for(lambda: previous not in self.readers)
+        for game in games:
+            future = self.futures.pop(game, None)
+            if future is not None:
+                future.cancel()
+        return previous
+
+    def shutdown(self):
+        """
+        Cancel the pending work and wait for the running reads to finish,
+        after which the browser can be closed safely.
+        """
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        with self.lock:
+            self.closed = True
+            self.lock.wait_for(lambda: not self.readers)
+        self.futures.clear()
+
+    @contextmanager
+    def __reading(self) -> Iterator[Browser]:
+        """
+        The browser to read from, which isn't closed until the read is done.
+
+        Raises:
+        - CancelledError: If the prefetcher was shut down, and the browser may be closed.
+        """
+        with self.lock:
+            if self.closed:
+                raise CancelledError()
+            browser = self.browser
+            self.readers[browser] = self.readers.get(browser, 0) + 1
+        try:
+            yield browser
+        finally:
+            with self.lock:
+                self.readers[browser] -= 1
+                if not self.readers[browser]:
+                    del self.readers[browser]
+                    self.lock.notify_all()
+
+    def __load(self, game: str) -> Tuple[IconSys, List[Icon]]:
+        with self.__reading() as browser:
+            if self.icon_cache is not None:
+                return self.icon_cache.get_icon(browser, game)
+            with profiler.stage("parse"):
+                return browser.get_icon(game)
+
+
+class CardLoader:
+    """
+    Opens a memory card image on a background thread and streams
+    the names of its saves in batches.
+
+    The root directory is read one cluster at a time once the card is opened,
+    and a batch is posted as soon as enough saves were read, so the first
+    saves are listed before the end of the directory is reached. The signature of
+    every save is taken as it is listed, for a `CardWatcher` to compare with.
+
+    The callbacks are invoked on the loader thread. Once the loader is cancelled
+    no further callback is made, and a browser opened meanwhile is closed.
+    """
+
+    BATCH_SIZE = 16  # saves per batch
+
+    def __init__(
+        self,
+        mc_path: str,
+        on_open: Callable[[Browser, int], None],
+        on_games: Callable[[List[str], int, bool], None],
+        on_error: Callable[[Exception], None],
+    ):
+        """
+        Parameters:
+        - mc_path (str): The path to the memory card image.
+        - on_open (Callable): Called with the opened browser and the number of entries of its
+          root directory, an upper bound of the number of saves.
+        - on_games (Callable): Called with each batch of save directory names, the number of
+          saves loaded so far and whether the root directory was read to the end. The last
+          batch may be empty.
+        - on_error (Callable): Called with the exception if the card can't be opened.
+        """
+        self.mc_path = mc_path
+        self.on_open = on_open
+        self.on_games = on_games
+        self.on_error = on_error
+        self.cancelled = threading.Event()
+        # the signatures of the listed saves, complete once the last batch is posted
+        self.signatures: Dict[str, Signature] = {}
+        self.thread = threading.Thread(target=self.__run, name="card-loader", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def __run(self):
+        try:
+            browser = MmapBrowser(self.mc_path, list_root=False)
+        except Exception as e:
+            if not self.cancelled.is_set():
+                self.on_error(e)
+            return
+        if self.cancelled.is_set():
+            browser.close()
+            return
+        # the root directory holds the "." and ".." entries besides the saves
+        self.on_open(browser, max(0, browser.ps2mc.root_entry.length - 2))
+        batch: List[str] = []
+        loaded = 0
+        try:
+            for entries in browser.iter_root_dir():
+                if self.cancelled.is_set():
+                    return
+                for entry in entries:
+                    batch.append(entry.name)
+                    try:
+                        self.signatures[entry.name] = signature(browser, entry)
+                    except Exception:
+                        # a damaged save is still listed, the watcher can't scan the card anyway
+                        pass
+                if len(batch) >= CardLoader.BATCH_SIZE:
+                    loaded += len(batch)
+                    self.on_games(batch, loaded, False)
+                    batch = []
+        except Exception as e:
+            # the browser was handed out already, and is closed with the card
+            if not self.cancelled.is_set():
+                self.on_error(e)
+            return
+        if not self.cancelled.is_set():
+            self.on_games(batch, loaded + len(batch), True)
@@ -1,29 +1,44 @@
+import threading
 import time
-from typing import List
+from typing import Callable, List, Optional, Tuple
 import wx
-import importlib.resources
 
-import glm
 import moderngl as mgl
 from wx import EVT_TIMER, Timer, glcanvas
 from wx.glcanvas import GLCanvas, GLContext
 from ps2mc.icon import Icon, IconSys
 
-from .models import BgModel, Camera, IconModel, CircleModel
+from .cache import ModelCache
+from .profiling import GpuTimer, profiler
+from .record import FrameEncoder, record
+from .renderer import Renderer
+from .rendertarget import RenderTarget, ResolutionScaler
+from .scheduler import FrameScheduler
 from . import utils
 
 
 class WxCanvas(GLCanvas):
     """
     A wxPython canvas for rendering 3D icons using OpenGL.
-    It includes three shader programs for rendering the background,
-    icons, and action button, respectively.
+    The drawing itself is done by a `Renderer`, the canvas drives
+    its animation and handles the mouse events.
+
+    The canvas can be resized. Frames are drawn into a `RenderTarget` at the
+    pixel size of the canvas on the display, times a scale lowered while the
+    GPU can't keep up, and upscaled into the window.
     """
 
-    SIZE = (utils.CANVAS_WIDTH, utils.CANVAS_HEIGHT)
+    SIZE = (utils.CANVAS_WIDTH, utils.CANVAS_HEIGHT)  # the initial size
+    MIN_SIZE = (320, 240)
     FPS = 60  # Frames Per Second
+    LOW_POWER_FPS = 30  # Frames Per Second at most in the low-power mode
+    HIDDEN_INTERVAL = 250  # milliseconds between visibility checks while hidden
+    HUD_INTERVAL = 0.25  # seconds between updates of the performance HUD
+    HUD_SIZE = (200, 80)
+    GPU_BUDGET = 0.75  # fraction of the frame period the GPU may take at the full resolution
+    SAMPLES = 4  # samples per pixel with anti-aliasing
 
-    def __init__(self, parent):
+    def __init__(self, parent, cache_budget: int = ModelCache.DEFAULT_BUDGET):
         GLCanvas.__init__(
             self,
             parent,
@@ -38,43 +53,41 @@ class WxCanvas(GLCanvas):
             ],
         )
         self.parent = parent
+        self.SetMinSize(WxCanvas.MIN_SIZE)
 
         # OpenGL context initialization
         self._context = GLContext(self)
         self.SetCurrent(self._context)
         self.ctx = mgl.create_context()
-        self.ctx.enable(flags=mgl.DEPTH_TEST | mgl.CULL_FACE | mgl.BLEND)
-
-        # ps2 3d icon objects
-        self.icon_sys, self.icons = None, None
-        self.icon = None
 
-        # Time parameters required for the animation
-        self.frame_duration = 0.0
-        self.start_time = 0
+        # Time parameters required for the animation, on a monotonic clock
+        self.start_time = None
         self.ticker = Timer(self)
-        # Pointer to the shape.
-        self.vao_index = 0
-
-        # action button's position list
-        self.circle_centers = []
-
-        # shader program dictionary
-        self.shader_program = dict()
-        # backgroun
-        self.shader_program["bg"] = self.get_shader_program("bg")
-        # icon
-        self.shader_program["icon"] = self.get_shader_program("icon")
-        # action button
-        self.shader_program["circle"] = self.get_shader_program("circle")
-
-        # Objects used for spatial, perspective, rotation, and other calculations
-        self.model = dict()
-        self.m_model = glm.mat4()
-        self.camera = Camera(WxCanvas.SIZE)
+        self.scheduler = FrameScheduler(WxCanvas.FPS)
+        # In the low-power mode, frames are only rendered when the animation frame changes.
+        self.low_power = False
+        self.last_frame = None
+
+        # Draws the selected save into the canvas
+        self.profiler = profiler
+        self.renderer = Renderer(
+            self.ctx, WxCanvas.SIZE, cache_budget=cache_budget, profiler=self.profiler
+        )
+        # icon and background models of recently displayed saves
+        self.model_cache = self.renderer.model_cache
+        # The offscreen framebuffer, and the scale of its resolution driven by the GPU time of the frames.
+        self.target = RenderTarget(self.ctx, self.renderer.shader_program["upscale"])
+        self.scaler = ResolutionScaler(WxCanvas.GPU_BUDGET / WxCanvas.FPS)
+        self.dynamic_resolution = True
+        # times the frames while the renderer's own timers, which can't be nested in it, are off
+        self.gpu_timer = GpuTimer(self.ctx)
+        # The performance HUD, showing the frame rate, p99 frame time and resident GPU memory.
+        self.hud = False
+        self.hud_time = None
 
         # canvas events
         self.Bind(EVT_TIMER, self.on_tick, self.ticker)
+        self.Bind(wx.EVT_SIZE, self.on_size)
         self.Bind(wx.EVT_LEFT_DOWN, self.on_left_down)
         self.Bind(wx.EVT_MOTION, self.on_motion)
 
@@ -83,28 +96,39 @@ class WxCanvas(GLCanvas):
         Handle left mouse button down event.
         An event is triggered when the mouse is over the action button.
         """
-        if self.circle_centers:
+        size = tuple(self.GetClientSize())
+        if self.renderer.gallery is not None:
+            index = self.renderer.gallery.cell_at(*utils.coord_convert(*evt.GetPosition(), size))
+            if index is not None:
+                self.parent.on_gallery_select(index)
+            return
+        if self.renderer.circle_centers:
             screen_x, screen_y = evt.GetPosition()
             index = utils.determine_circle_index(
-                screen_x, screen_y, self.circle_centers
+                screen_x, screen_y, self.renderer.circle_centers, size
             )
             if index is not None:
-                self.model["icon"].release()
-                self.icon = self.icons[index]
-                self.model["icon"] = IconModel(self.ctx, self.shader_program, self.icon)
+                self.renderer.use_icon(index)
+                self.last_frame = None
 
     def on_motion(self, evt):
         """
         Handle mouse motion event.
-        The mouse cursor changes to the 'hand' when passing over the action button.
+        The mouse cursor changes to the 'hand' when passing over the action button,
+        or over an icon of the gallery.
         """
-        if self.circle_centers:
+        size = tuple(self.GetClientSize())
+        if self.renderer.gallery is not None:
+            index = self.renderer.gallery.cell_at(*utils.coord_convert(*evt.GetPosition(), size))
+            self.SetCursor(wx.Cursor(wx.CURSOR_ARROW if index is None else wx.CURSOR_HAND))
+            return
+        if self.renderer.circle_centers:
             screen_x, screen_y = evt.GetPosition()
-            ndc_x, ndc_y = utils.coord_convert(screen_x, screen_y)
+            ndc_x, ndc_y = utils.coord_convert(screen_x, screen_y, size)
             # Initialize the distance with a sufficiently large initial value.
             distance = 100
             # This for loop handles the situation where multiple action buttons appear on the screen.
-            for circle_center in self.circle_centers:
+            for circle_center in self.renderer.circle_centers:
                 _distance = utils.distance(
                     ndc_x, ndc_y, circle_center[0], circle_center[1]
                 )
@@ -116,122 +140,254 @@ class WxCanvas(GLCanvas):
             else:
                 self.SetCursor(wx.Cursor(wx.CURSOR_ARROW))
 
+    def on_size(self, evt: wx.SizeEvent):
+        """
+        Draw the next frame at the new size, even in the low-power mode.
+        """
+        self.last_frame = None
+        evt.Skip()
+
     def on_tick(self, evt):
         """
         Handle timer tick event for animation.
+        The timer is one-shot and re-armed for the next due frame,
+        rendering is paused while the canvas is not visible.
+        """
+        if not self.IsShownOnScreen():
+            self.scheduler.reset()
+            self.scaler.reset()
+            self.profiler.reset_frames()
+            self.ticker.StartOnce(WxCanvas.HIDDEN_INTERVAL)
+            return
+        now = time.perf_counter()
+        if self.scheduler.due(now):
+            frame = self.renderer.frame_index(now - self.start_time)
+            if not self.low_power or frame != self.last_frame:
+                self.last_frame = frame
+                self.render(now)
+        self.ticker.StartOnce(self.scheduler.wait_ms())
+
+    def set_low_power(self, low_power: bool):
+        """
+        Switch the low-power mode, which renders at a lower rate
+        and only when the animation frame changes.
+        """
+        self.low_power = low_power
+        self.last_frame = None
+        fps = WxCanvas.LOW_POWER_FPS if low_power else WxCanvas.FPS
+        self.scheduler.set_fps(fps)
+        self.scaler.set_budget(WxCanvas.GPU_BUDGET / fps)
+        self.profiler.reset_frames()
+
+    def set_dynamic_resolution(self, dynamic: bool):
+        """
+        Switch between scaling the render resolution with the GPU time and always rendering at full resolution.
+        """
+        self.dynamic_resolution = dynamic
+        self.scaler.scale = self.scaler.max_scale
+        self.scaler.reset()
+        self.last_frame = None
+
+    def set_antialiasing(self, antialiasing: bool):
+        """
+        Switch multisample anti-aliasing of the offscreen framebuffer.
+        """
+        self.target.set_samples(WxCanvas.SAMPLES if antialiasing else 0)
+        self.scaler.reset()
+        self.last_frame = None
+
+    def pixel_size(self) -> Tuple[int, int]:
+        """
+        The size of the canvas in pixels of the display, larger than its size in
+        the logical coordinates of the mouse events on a high DPI display.
+        """
+        width, height = self.GetClientSize()
+        scale = self.GetContentScaleFactor()
+        return max(1, round(width * scale)), max(1, round(height * scale))
+
+    def set_hud(self, hud: bool):
+        """
+        Show or hide the performance HUD.
+        GPU timer queries are issued around the draw calls while it is shown.
+        """
+        self.hud = hud
+        self.hud_time = None
+        self.renderer.enable_gpu_timing(hud)
+        if not hud:
+            self.renderer.set_hud(None)
+
+    def update_hud(self, now: float):
         """
-        self.render()
+        Redraw the text of the performance HUD, a few times per second.
+        """
+        if self.hud_time is not None and now - self.hud_time < WxCanvas.HUD_INTERVAL:
+            return
+        self.hud_time = now
+        gpu_time = sum(samples[-1] for samples in self.profiler.gpu.values() if samples)
+        width, height = self.target.size or self.pixel_size()
+        lines = [
+            f"FPS {self.profiler.fps:5.1f}",
+            f"p99 {self.profiler.percentile(99):5.1f} ms  GPU {gpu_time * 1000:4.2f} ms",
+            f"GPU memory {self.profiler.resident_bytes / 1024:,.0f} KiB",
+            f"Render {width}x{height} ({self.scaler.scale:.0%})",
+        ]
+        width, height = WxCanvas.HUD_SIZE
+        bitmap = wx.Bitmap(width, height, 24)
+        dc = wx.MemoryDC(bitmap)
+        dc.SetBackground(wx.BLACK_BRUSH)
+        dc.Clear()
+        dc.SetFont(wx.Font(wx.FontInfo(10).Family(wx.FONTFAMILY_TELETYPE)))
+        dc.SetTextForeground(wx.WHITE)
+        line_height = height // len(lines)
+        for index, line in enumerate(lines):
+            dc.DrawText(line, 6, index * line_height + 4)
+        dc.SelectObject(wx.NullBitmap)
+        self.renderer.set_hud(bytes(bitmap.ConvertToImage().GetData()), WxCanvas.HUD_SIZE)
 
-    def refresh(self, icon_sys: IconSys, icons: List[Icon]):
+    def refresh(self, icon_sys: IconSys, icons: List[Icon], save: Tuple[str, str]):
         """
         Refresh the canvas when a selected game is changed.
+
+        Parameters:
+        - icon_sys (IconSys): The icon.sys of the selected game.
+        - icons (List[Icon]): The normal, copy and delete icons of the selected game.
+        - save (Tuple[str, str]): The memory card path and the save directory name,
+          used as the key of the cached models.
         """
 
         # stop the previous ticker
         self.ticker.Stop()
-        # clear the previous action button
-        self.circle_centers = []
-        # reset resources
-        [model.release() for model in self.model.values()]
-        if self.start_time == 0:
-            self.start_time = time.time()
-        self.icon_sys, self.icons = icon_sys, icons
-        self.icon = self.icons[0]
-        self.frame_duration = (
-            1.0 / WxCanvas.FPS * self.icon.frame_length / self.icon.frame_count
-        )
+        if self.start_time is None:
+            self.start_time = time.perf_counter()
+        self.renderer.refresh(icon_sys, icons, save)
 
-        # initialize new models
-        self.model["icon"] = IconModel(self.ctx, self.shader_program, self.icon)
-        self.model["bg"] = BgModel(self.ctx, self.shader_program, self.icon_sys)
-        self.model["circles"] = CircleModel(
-            self.ctx, self.shader_program, len(self.icons)
-        )
-        self.circle_centers = self.model["circles"].circle_centers
+        # restart ticker, rendering the new save at once
+        self.last_frame = None
+        self.scheduler.reset()
+        self.ticker.StartOnce(1)
 
-        # write uniform variables to shader programs
-        self.shader_program["icon"]["proj"].write(self.camera.proj)
-        self.shader_program["icon"]["view"].write(self.camera.view)
-        self.shader_program["icon"]["model"].write(self.m_model)
-        self.shader_program["icon"]["ambient"] = self.icon_sys.ambient
-        for index, light_pos in enumerate(self.icon_sys.light_dir):
-            self.shader_program["icon"][f"lights[{index}].dir"] = light_pos
-        for index, light_color in enumerate(self.icon_sys.light_colors):
-            self.shader_program["icon"][f"lights[{index}].color"] = light_color
-        self.shader_program["icon"]["texture0"] = 0
+    def show_gallery(self, items: List[Tuple[IconSys, Icon]]):
+        """
+        Show the icons of many saves in a grid, clicking one selects its save.
 
-        # restart ticker
-        self.ticker.Start(WxCanvas.FPS)
+        Parameters:
+        - items (List[Tuple[IconSys, Icon]]): The icon.sys and the normal icon of every save.
+        """
+        self.ticker.Stop()
+        if self.start_time is None:
+            self.start_time = time.perf_counter()
+        self.renderer.show_gallery(items)
+        self.last_frame = None
+        self.scheduler.reset()
+        self.ticker.StartOnce(1)
 
-    def render(self):
+    def hide_gallery(self):
         """
-        Render one frame.
+        Go back to the selected save, or stop drawing if no save was shown yet.
         """
-        self.ctx.clear()
-        self.update()
-        self.model["bg"].vao().render()
-        self.model["icon"].vao(self.vao_index).render()
-        if self.model["circles"].vaos():
-            for vao in self.model["circles"].vaos():
-                vao.render(mgl.TRIANGLE_FAN)
-        self.SwapBuffers()
+        self.renderer.hide_gallery()
+        self.SetCursor(wx.Cursor(wx.CURSOR_ARROW))
+        if self.renderer.icon is None:
+            self.ticker.Stop()
+        else:
+            self.last_frame = None
 
-    def update(self):
-        """
-        Update VAO, VBO, and other variables across frames.
+    def preload(self, icon_sys: IconSys, icons: List[Icon], save: Tuple[str, str]):
         """
+        Upload the models of a save that is likely to be displayed soon into the cache.
 
-        # animation_time is the playback time of the animation.
-        animation_time = time.time() - self.start_time
-        # Loop through the animation,
-        # calculate the current frame to be played based on animation_time.
-        curr_frame = (
-            int(animation_time * WxCanvas.FPS * self.icon.anim_speed)
-            % self.icon.frame_length
-        )
-        # Calculate the current shape.
-        curr_shape = int(
-            curr_frame // (self.icon.frame_length / self.icon.animation_shapes)
-        )
-        # update shape pointer
-        self.vao_index = curr_shape
+        Parameters:
+        - icon_sys (IconSys): The icon.sys of the save.
+        - icons (List[Icon]): The icons of the save.
+        - save (Tuple[str, str]): The memory card path and the save directory name.
+        """
+        self.renderer.preload(icon_sys, icons, save)
 
-        # Calculate the time factor to provide for interpolation calculations in the shader.
-        frames_in_shape = self.icon.frame_length / self.icon.animation_shapes
-        curr_frame_in_shape = curr_frame % frames_in_shape / frames_in_shape
-        tween_factor = glm.float32(curr_frame_in_shape)
-        self.shader_program["icon"]["tweenFactor"].write(tween_factor)
+    def render(self, now: float):
+        """
+        Render one frame.
 
-        # Rotate the model around the y-axis.
-        m_model = glm.rotate(self.m_model, animation_time / 2, glm.vec3(0, 1, 0))
-        self.shader_program["icon"]["model"].write(m_model)
+        Parameters:
+        - now (float): The current time on the `time.perf_counter` clock.
+        """
+        if self.hud:
+            self.update_hud(now)
+        window_size = self.pixel_size()
+        scale = self.scaler.scale if self.dynamic_resolution else 1.0
+        size = (max(1, round(window_size[0] * scale)), max(1, round(window_size[1] * scale)))
+        if self.target.resize(size):
+            self.renderer.resize(size)
+        self.target.use()
+        # animation_time is the playback time of the animation.
+        if self.renderer.gpu_timers is None:
+            with self.gpu_timer.measure() as gpu_time:
+                self.renderer.render(now - self.start_time)
+        else:
+            self.renderer.render(now - self.start_time)
+            gpu_time = self.renderer.gpu_time
+        self.target.present(self.ctx.screen, window_size)
+        with self.profiler.stage("swap"):
+            self.SwapBuffers()
+        self.profiler.frame()
+        if self.dynamic_resolution:
+            self.scaler.update(gpu_time)
 
-    def get_shader_program(self, shader_name: str) -> mgl.Program:
+    def record(self, path: str, on_done: Callable[[Optional[Exception]], None], fps: int = FPS):
         """
-        Load and compile shaders to create a shader program.
+        Record one loop of the animation shown, at the pixel size of the canvas, without the HUD.
+        The frames are rendered at once, and the file is written in the background.
 
         Parameters:
-        - shader_name (str): Name of the shader program.
-
-        Returns:
-            mgl.Program: Shader program instance.
-        """
-        with importlib.resources.path("ps2mc_browser.shaders", f"{shader_name}.vert") as file_path:
-            with open(file_path) as file:
-                vertex_shader = file.read()
-        with importlib.resources.path("ps2mc_browser.shaders", f"{shader_name}.frag") as file_path:
-            with open(file_path) as file:
-                fragment_shader = file.read()
-        program = self.ctx.program(
-            vertex_shader=vertex_shader, fragment_shader=fragment_shader
+        - path (str): The output file, a `.gif`, `.png` or `.mp4` file.
+        - on_done (Callable[[Optional[Exception]], None]): Called on the UI thread once the file
+          is written, with the error if the recording failed.
+        - fps (int): The frame rate of the recording, rounded for a GIF, see `FrameEncoder`.
+
+        Raises:
+        - ValueError: If the format of the file is unknown or not available.
+        """
+        size = self.pixel_size()
+        encoder = FrameEncoder(path, size, fps)
+        self.SetCurrent(self._context)
+        fbo = self.ctx.framebuffer(
+            color_attachments=[self.ctx.renderbuffer(size)],
+            depth_attachment=self.ctx.depth_renderbuffer(size),
         )
-        return program
+        self.renderer.set_hud(None)
+        self.hud_time = None
+        self.renderer.resize(size)
+        error = None
+        try:
+            record(self.renderer, fbo, encoder)
+        except Exception as e:
+            error = e
+        finally:
+            if self.target.size is not None:
+                self.renderer.resize(self.target.size)
+            for attachment in (*fbo.color_attachments, fbo.depth_attachment):
+                attachment.release()
+            fbo.release()
+            self.scaler.reset()
+            self.last_frame = None
+        threading.Thread(
+            target=self.__finish_recording, args=(encoder, error, on_done), name="record", daemon=True
+        ).start()
+
+    def __finish_recording(
+        self, encoder: FrameEncoder, error: Optional[Exception], on_done: Callable[[Optional[Exception]], None]
+    ):
+        try:
+            encoder.close()
+        except Exception as e:
+            error = error or e
+        wx.CallAfter(on_done, error)
 
     def destroy(self):
         """
         Clean up resources and release memory.
         """
         self.ticker.Destroy()
-        [model.release() for model in self.model.values()]
-        [program.release() for program in self.shader_program.values()]
+        self.gpu_timer.release()
+        self.target.release()
+        self.renderer.release()
         self.ctx.release()
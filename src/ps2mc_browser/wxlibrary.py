@@ -0,0 +1,122 @@
+import os
+import threading
+from typing import List, Tuple
+import wx
+
+from .library import Library, SaveRecord
+
+
+class WxLibraryFrame(wx.Frame):
+    """
+    The library window.
+    A search box filtering the saves of all indexed cards, and the list of the matching saves.
+    Activating a save opens its card in the main window.
+    """
+
+    COLUMNS = (("Title", 220), ("Save", 150), ("Card", 260), ("Size", 70), ("Modified", 130))
+
+    def __init__(self, parent: wx.Frame, library: Library):
+        wx.Frame.__init__(self, parent, -1, "Library", size=(860, 520))
+        self.parent = parent
+        self.library = library
+        self.results: List[SaveRecord] = []
+        self.scanning = False
+
+        panel = wx.Panel(self)
+        self.search_box = wx.SearchCtrl(panel)
+        self.search_box.ShowCancelButton(True)
+        self.search_box.SetDescriptiveText("Search titles, saves and cards")
+        self.scan_button = wx.Button(panel, label="Scan Folder...")
+        self.list_ctrl = wx.ListCtrl(panel, style=wx.LC_REPORT | wx.LC_SINGLE_SEL)
+        for index, (title, width) in enumerate(WxLibraryFrame.COLUMNS):
+            self.list_ctrl.InsertColumn(index, title, width=width)
+        self.status = wx.StaticText(panel)
+
+        top = wx.BoxSizer(wx.HORIZONTAL)
+        top.Add(self.search_box, 1, wx.EXPAND | wx.RIGHT, 6)
+        top.Add(self.scan_button)
+        sizer = wx.BoxSizer(wx.VERTICAL)
+        sizer.Add(top, 0, wx.EXPAND | wx.ALL, 6)
+        sizer.Add(self.list_ctrl, 1, wx.EXPAND | wx.LEFT | wx.RIGHT, 6)
+        sizer.Add(self.status, 0, wx.EXPAND | wx.ALL, 6)
+        panel.SetSizer(sizer)
+
+        self.Bind(wx.EVT_TEXT, self.on_search, self.search_box)
+        self.Bind(wx.EVT_SEARCHCTRL_CANCEL_BTN, self.on_cancel_search, self.search_box)
+        self.Bind(wx.EVT_BUTTON, self.on_scan, self.scan_button)
+        self.Bind(wx.EVT_LIST_ITEM_ACTIVATED, self.on_activate, self.list_ctrl)
+        self.search()
+
+    def on_search(self, evt: wx.Event):
+        self.search()
+
+    def on_cancel_search(self, evt: wx.Event):
+        self.search_box.SetValue("")
+
+    def search(self):
+        """
+        Show the saves matching the text of the search box, straight from the index.
+        """
+        self.results = self.library.search(self.search_box.GetValue())
+        self.list_ctrl.Freeze()
+        self.list_ctrl.DeleteAllItems()
+        for index, save in enumerate(self.results):
+            self.list_ctrl.InsertItem(index, save.title or save.directory)
+            self.list_ctrl.SetItem(index, 1, save.directory)
+            self.list_ctrl.SetItem(index, 2, save.card)
+            self.list_ctrl.SetItem(index, 3, f"{save.size / 1024:,.0f} KiB")
+            self.list_ctrl.SetItem(index, 4, save.modified)
+        self.list_ctrl.Thaw()
+        if not self.scanning:
+            more = "+" if len(self.results) == Library.SEARCH_LIMIT else ""
+            self.status.SetLabel(f"{len(self.results)}{more} of {len(self.library)} saves")
+
+    def on_activate(self, evt: wx.ListEvent):
+        save = self.results[evt.GetIndex()]
+        if not os.path.exists(save.card):
+            wx.MessageBox(f"The card no longer exists:\n{save.card}", "Error", wx.OK | wx.ICON_ERROR)
+            return
+        self.parent.open_save(save.card, save.directory)
+        self.parent.Raise()
+
+    def on_scan(self, evt: wx.Event):
+        """
+        Index the cards of a directory tree in the background.
+        """
+        with wx.DirDialog(
+            self,
+            "Select Directory of Memory Cards",
+            style=wx.DD_DEFAULT_STYLE | wx.DD_DIR_MUST_EXIST,
+        ) as dir_dialog:
+            if dir_dialog.ShowModal() != wx.ID_OK:
+                return
+            root = dir_dialog.GetPath()
+        self.scanning = True
+        self.scan_button.Disable()
+        self.status.SetLabel(f"Scanning {root}...")
+        thread = threading.Thread(target=self.__scan, args=(root,), name="library-scan", daemon=True)
+        thread.start()
+
+    def on_scan_progress(self, done: int, total: int):
+        if self:
+            self.status.SetLabel(f"Scanning {done}/{total} changed cards...")
+
+    def on_scan_done(self, cards: int, failed: List[Tuple[str, Exception]]):
+        if not self:
+            return
+        self.scanning = False
+        self.scan_button.Enable()
+        self.search()
+        self.status.SetLabel(f"{self.status.GetLabel()}, {cards} cards indexed")
+        if failed:
+            errors = "\n".join(f"{path}: {e}" for path, e in failed)
+            wx.MessageBox(f"Failed to read {len(failed)} cards:\n{errors}", "Error", wx.OK | wx.ICON_ERROR)
+
+    def __scan(self, root: str):
+        try:
+            cards, failed = self.library.scan(
+                root, on_progress=lambda done, total: wx.CallAfter(self.on_scan_progress, done, total)
+            )
+        except Exception as e:
+            cards, failed = 0, [(root, e)]
+        wx.CallAfter(self.on_scan_done, cards, failed)
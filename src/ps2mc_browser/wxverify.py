@@ -0,0 +1,54 @@
+import os
+import wx
+
+from .verify import CardReport
+
+
+class WxVerifyFrame(wx.Frame):
+    """
+    The health report of a memory card.
+    A summary of the card, and a row for every problem of the file system and of each save.
+    """
+
+    COLUMNS = (("Save", 180), ("Status", 80), ("Details", 480))
+
+    def __init__(self, parent: wx.Frame, report: CardReport):
+        wx.Frame.__init__(self, parent, -1, f"Verify {os.path.basename(report.mc_path)}", size=(780, 440))
+        self.report = report
+
+        panel = wx.Panel(self)
+        damaged = sum(save.status == "error" for save in report.saves)
+        summary = (
+            f"{report.mc_path}\n"
+            f"{'No errors found' if report.ok else 'The card is damaged'}: "
+            f"{report.pages} pages, {len(report.saves)} saves, {damaged} damaged"
+        )
+        self.summary = wx.StaticText(panel, label=summary)
+        self.list_ctrl = wx.ListCtrl(panel, style=wx.LC_REPORT | wx.LC_SINGLE_SEL)
+        for index, (title, width) in enumerate(WxVerifyFrame.COLUMNS):
+            self.list_ctrl.InsertColumn(index, title, width=width)
+
+        sizer = wx.BoxSizer(wx.VERTICAL)
+        sizer.Add(self.summary, 0, wx.EXPAND | wx.ALL, 6)
+        sizer.Add(self.list_ctrl, 1, wx.EXPAND | wx.LEFT | wx.RIGHT | wx.BOTTOM, 6)
+        panel.SetSizer(sizer)
+        self.fill()
+
+    def fill(self):
+        """
+        List the problems of the card first, then every save, healthy ones included.
+        """
+        rows = [("(card)", "error", message) for message in self.report.errors]
+        rows.extend(("(card)", "warning", message) for message in self.report.warnings)
+        for save in self.report.saves:
+            problems = [("error", message) for message in save.errors]
+            problems.extend(("warning", message) for message in save.warnings)
+            rows.extend((save.name, status, message) for status, message in problems or [("ok", "")])
+        self.list_ctrl.Freeze()
+        for index, (name, status, message) in enumerate(rows):
+            self.list_ctrl.InsertItem(index, name)
+            self.list_ctrl.SetItem(index, 1, status)
+            self.list_ctrl.SetItem(index, 2, message)
+            if status == "error":
+                self.list_ctrl.SetItemTextColour(index, wx.RED)
+        self.list_ctrl.Thaw()
@@ -1,9 +1,19 @@
 import os
-from typing import List
+import threading
+from concurrent.futures import Future
+from typing import List, Optional
 import wx
 
 from ps2mc.browser import Browser
+from .diskcache import IconCache
+from .export import BulkExporter, ExportProgress
+from .library import Library
+from .verify import CardReport, verify_card
+from .watch import CardChanges, CardWatcher
 from .wxcanvas import WxCanvas
+from .wxlibrary import WxLibraryFrame
+from .wxverify import WxVerifyFrame
+from .workers import CardLoader, IconPrefetcher
 
 
 class WxApp(wx.App):
@@ -21,18 +31,33 @@ class WxFrame(wx.Frame):
     """
     The main application window.
     OpenGL canvas on the left, and the game list box on the right.
+    The canvas takes the extra space when the window is resized.
     """
     def __init__(self, title: str):
-        frame_style = wx.DEFAULT_FRAME_STYLE & ~(wx.RESIZE_BORDER | wx.MAXIMIZE_BOX)
-        wx.Frame.__init__(self, None, -1, title, style=frame_style)
+        wx.Frame.__init__(self, None, -1, title)
         self.browser = None
+        self.prefetcher = None
+        self.loader = None
+        self.exporter = None
+        self.watcher = None
+        self.library_frame = None
+        self.icon_cache = IconCache()
         self.mc_path = None
         self.selected_game = None
+        # the save to select once its card is loaded, when opened from the library
+        self.pending_game = None
         self.icon_sys, self.icons = None, None
+        # the games shown in the gallery, and the pending loads of their icons
+        self.gallery_games = None
+        self.gallery_futures = None
         self.panel = WxPanel(self)
         self.canvas = WxCanvas(self)
-        self.statusbar = self.CreateStatusBar()
+        # the subtitle of the selected game, and the loading progress of the card
+        self.statusbar = self.CreateStatusBar(2)
         self.games = list()
+        self.games_total = 0
+        # the signatures of the listed saves, which the card watcher compares the card with
+        self.signatures = None
         self.on_init()
 
     def on_init(self):
@@ -44,16 +69,72 @@ class WxFrame(wx.Frame):
         menu = wx.Menu()
         menubar.Append(menu, "&File")
         menu.Append(wx.ID_OPEN)
+        library_item = menu.Append(
+            wx.ID_ANY, "&Library...\tCtrl+L", "Search the saves of all indexed memory cards"
+        )
+        export_item = menu.Append(
+            wx.ID_ANY, "&Export All Saves...\tCtrl+E", "Export every save on the card into folders"
+        )
+        self.cancel_export_item = menu.Append(
+            wx.ID_ANY, "&Cancel Export", "Stop the export in progress"
+        )
+        self.cancel_export_item.Enable(False)
+        self.verify_item = menu.Append(
+            wx.ID_ANY, "&Verify Card...", "Check the ECC, the FAT and the directories of the card"
+        )
+        self.record_item = menu.Append(
+            wx.ID_ANY, "&Record Animation...\tCtrl+R", "Save one loop of the shown animation as a GIF, APNG or MP4"
+        )
+        menu.AppendSeparator()
         menu.Append(wx.ID_EXIT)
+        view_menu = wx.Menu()
+        menubar.Append(view_menu, "&View")
+        low_power_item = view_menu.AppendCheckItem(
+            wx.ID_ANY, "&Low Power Mode", "Render only when the animation frame changes"
+        )
+        self.gallery_item = view_menu.AppendCheckItem(
+            wx.ID_ANY, "&Gallery\tCtrl+G", "Show the icons of every save on the card"
+        )
+        self.watch_item = view_menu.AppendCheckItem(
+            wx.ID_ANY, "&Watch Card File", "Reload the saves changed on the card, e.g. by an emulator"
+        )
+        self.watch_item.Check(True)
+        view_menu.AppendSeparator()
+        dynamic_resolution_item = view_menu.AppendCheckItem(
+            wx.ID_ANY, "&Dynamic Resolution", "Lower the render resolution while the GPU can't keep up"
+        )
+        dynamic_resolution_item.Check(True)
+        antialiasing_item = view_menu.AppendCheckItem(
+            wx.ID_ANY, "&Anti-Aliasing", "Smooth the edges of the icons with multisampling"
+        )
+        view_menu.AppendSeparator()
+        hud_item = view_menu.AppendCheckItem(
+            wx.ID_ANY, "Performance &HUD", "Show the frame rate and GPU memory on the canvas"
+        )
+        stats_item = view_menu.Append(
+            wx.ID_ANY, "&Save Performance Stats...", "Write the collected timings to a JSON file"
+        )
         self.SetMenuBar(menubar)
+        self.Bind(wx.EVT_MENU, self.on_low_power, low_power_item)
+        self.Bind(wx.EVT_MENU, self.on_gallery, self.gallery_item)
+        self.Bind(wx.EVT_MENU, self.on_watch, self.watch_item)
+        self.Bind(wx.EVT_MENU, self.on_dynamic_resolution, dynamic_resolution_item)
+        self.Bind(wx.EVT_MENU, self.on_antialiasing, antialiasing_item)
+        self.Bind(wx.EVT_MENU, self.on_hud, hud_item)
+        self.Bind(wx.EVT_MENU, self.on_save_stats, stats_item)
         self.Bind(wx.EVT_MENU, self.on_open_file, id=wx.ID_OPEN)
+        self.Bind(wx.EVT_MENU, self.on_library, library_item)
+        self.Bind(wx.EVT_MENU, self.on_export_all, export_item)
+        self.Bind(wx.EVT_MENU, self.on_cancel_export, self.cancel_export_item)
+        self.Bind(wx.EVT_MENU, self.on_verify, self.verify_item)
+        self.Bind(wx.EVT_MENU, self.on_record, self.record_item)
         self.Bind(wx.EVT_MENU, self.on_exit, id=wx.ID_EXIT)
         self.Bind(wx.EVT_CLOSE, self.on_exit)
 
     def setup_layout(self):
         sizer = wx.BoxSizer(wx.HORIZONTAL)
-        sizer.Add(self.canvas)
-        sizer.Add(self.panel)
+        sizer.Add(self.canvas, 1, wx.EXPAND)
+        sizer.Add(self.panel, 0, wx.EXPAND)
         self.SetSizerAndFit(sizer)
 
     def on_open_file(self, evt: wx.Event):
@@ -66,25 +147,300 @@ class WxFrame(wx.Frame):
         if file_dialog.ShowModal() == wx.ID_OK:
             self.mc_path = file_dialog.GetPath()
             file_dialog.Destroy()
+            self.pending_game = None
             self.refresh_all()
 
+    def on_library(self, evt: wx.Event):
+        if self.library_frame:
+            self.library_frame.Raise()
+            return
+        try:
+            library = Library()
+        except Exception as e:
+            wx.MessageBox(f"Failed to open the library:\n{str(e)}", "Error", wx.OK | wx.ICON_ERROR)
+            return
+        self.library_frame = WxLibraryFrame(self, library)
+        self.library_frame.Show()
+
+    def open_save(self, mc_path: str, game: str):
+        """
+        Show a save of a memory card, opening the card unless it is the opened one.
+
+        Parameters:
+            mc_path (str):  The path to the memory card image.
+            game (str):  The save directory name.
+        """
+        if mc_path == self.mc_path and self.loader is None and game in self.games:
+            self.gallery_item.Check(False)
+            self.canvas.hide_gallery()
+            self.panel.select(self.games.index(game))
+            self.update_selected_game(game)
+            return
+        self.mc_path = mc_path
+        self.pending_game = game
+        self.refresh_all()
+
+    def on_low_power(self, evt: wx.CommandEvent):
+        self.canvas.set_low_power(evt.IsChecked())
+
+    def on_gallery(self, evt: wx.CommandEvent):
+        if evt.IsChecked():
+            self.load_gallery()
+        else:
+            self.gallery_futures = None
+            self.canvas.hide_gallery()
+
+    def on_watch(self, evt: wx.CommandEvent):
+        if evt.IsChecked():
+            if self.browser is not None and self.loader is None:
+                self.start_watching()
+        else:
+            self.stop_watching()
+
+    def on_dynamic_resolution(self, evt: wx.CommandEvent):
+        self.canvas.set_dynamic_resolution(evt.IsChecked())
+
+    def on_antialiasing(self, evt: wx.CommandEvent):
+        self.canvas.set_antialiasing(evt.IsChecked())
+
+    def on_hud(self, evt: wx.CommandEvent):
+        self.canvas.set_hud(evt.IsChecked())
+
+    def on_save_stats(self, evt: wx.Event):
+        """
+        Write the frame timings collected so far to a JSON file.
+        """
+        with wx.FileDialog(
+            self,
+            "Save Performance Stats",
+            defaultFile="ps2mc-browser-stats.json",
+            wildcard="JSON files (*.json)|*.json",
+            style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT,
+        ) as file_dialog:
+            if file_dialog.ShowModal() == wx.ID_OK:
+                try:
+                    self.canvas.profiler.dump(file_dialog.GetPath())
+                except OSError as e:
+                    wx.MessageBox(f"Failed to save the stats:\n{e}", "Error", wx.OK | wx.ICON_ERROR)
+
+    def on_export_all(self, evt: wx.Event):
+        self.export_games(self.games)
+
+    def on_cancel_export(self, evt: wx.Event):
+        if self.exporter is not None:
+            self.exporter.cancel()
+            self.statusbar.SetStatusText("Cancelling the export...", 1)
+
+    def on_verify(self, evt: wx.Event):
+        """
+        Verify the opened card in the background, then show its health report.
+        """
+        if self.mc_path is None:
+            return
+        mc_path = self.mc_path
+        self.verify_item.Enable(False)
+        self.statusbar.SetStatusText(f"Verifying {os.path.basename(mc_path)}...", 1)
+        thread = threading.Thread(target=self.__verify, args=(mc_path,), name="verify-card", daemon=True)
+        thread.start()
+
+    def on_verify_done(self, report: CardReport):
+        if not self:
+            return
+        self.verify_item.Enable(True)
+        self.statusbar.SetStatusText("", 1)
+        WxVerifyFrame(self, report).Show()
+
+    def __verify(self, mc_path: str):
+        try:
+            report = verify_card(mc_path, os.cpu_count() or 1)
+        except Exception as e:
+            report = CardReport(mc_path)
+            report.errors.append(str(e))
+        wx.CallAfter(self.on_verify_done, report)
+
+    def on_record(self, evt: wx.Event):
+        """
+        Record one loop of the shown animation to a file.
+        """
+        renderer = self.canvas.renderer
+        if renderer.icon is None and renderer.gallery is None:
+            return
+        with wx.FileDialog(
+            self,
+            "Record Animation",
+            defaultFile=f"{'gallery' if renderer.gallery is not None else self.selected_game}.gif",
+            wildcard="GIF images (*.gif)|*.gif|APNG images (*.png)|*.png|MP4 videos (*.mp4)|*.mp4",
+            style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT,
+        ) as file_dialog:
+            if file_dialog.ShowModal() != wx.ID_OK:
+                return
+            path = file_dialog.GetPath()
+        self.record_item.Enable(False)
+        self.statusbar.SetStatusText(f"Recording {os.path.basename(path)}...", 1)
+        try:
+            self.canvas.record(path, lambda error: self.on_record_done(path, error))
+        except ValueError as e:
+            self.on_record_done(path, e)
+
+    def on_record_done(self, path: str, error: Optional[Exception]):
+        if not self:
+            return
+        self.record_item.Enable(True)
+        self.statusbar.SetStatusText("", 1)
+        if error is None:
+            self.statusbar.SetStatusText(f"Recorded {path}", 0)
+        else:
+            wx.MessageBox(f"Failed to record the animation:\n{error}", "Error", wx.OK | wx.ICON_ERROR)
+
     def on_exit(self, evt: wx.Event):
-        if self.browser is not None:
-            self.browser.close()
+        if self.loader is not None:
+            self.loader.cancel()
+        if self.exporter is not None:
+            self.exporter.cancel()
+            self.exporter = None
+        self.stop_watching()
+        self.close_card()
         self.canvas.destroy()
         self.Destroy()
 
     def refresh_all(self):
         """
         Refresh the canvas and game list when a new memory card image is selected.
+        The card is opened in the background and its games are added to the list
+        in batches. A card that is still loading is abandoned.
+        """
+        if self.loader is not None:
+            self.loader.cancel()
+        self.stop_watching()
+        self.close_card()
+        self.games = list()
+        self.signatures = None
+        self.panel.update(self.games)
+        self.gallery_games, self.gallery_futures = None, None
+        self.canvas.hide_gallery()
+        self.statusbar.SetStatusText(f"Opening {os.path.basename(self.mc_path)}...", 1)
+        loader = CardLoader(
+            self.mc_path,
+            on_open=lambda browser, total: wx.CallAfter(self.on_card_open, loader, browser, total),
+            on_games=lambda games, loaded, done: wx.CallAfter(self.on_card_games, loader, games, loaded, done),
+            on_error=lambda e: wx.CallAfter(self.on_card_error, loader, e),
+        )
+        self.loader = loader
+        loader.start()
+
+    def close_card(self):
+        """
+        Stop the background work on the opened memory card and close it.
         """
+        if self.prefetcher is not None:
+            self.prefetcher.shutdown()
+            self.prefetcher = None
         if self.browser is not None:
             self.browser.close()
-        self.browser = Browser(self.mc_path)
-        root_dirs = self.browser.list_root_dir()
-        self.games = [x.name for x in root_dirs]
-        self.panel.update(self.games)
-        self.update_selected_game(self.games[0])
+            self.browser = None
+
+    def on_card_open(self, loader: CardLoader, browser: Browser, total: int):
+        """
+        Handle a memory card opened by the loader, whose saves are listed next.
+        The total is the number of entries of the root directory, known before they are read.
+        """
+        if loader is not self.loader:
+            browser.close()
+            return
+        self.browser = browser
+        self.prefetcher = IconPrefetcher(self.browser, self.icon_cache)
+        self.games_total = total
+        # the card may have been rewritten since its models were cached
+        self.canvas.model_cache.invalidate(self.mc_path)
+
+    def on_card_games(self, loader: CardLoader, games: List[str], loaded: int, done: bool):
+        """
+        Handle a batch of games streamed by the loader.
+        The first game is selected as soon as it arrives.
+        """
+        if loader is not self.loader:
+            return
+        if done:
+            # deleted entries are counted by the root directory, but aren't saves
+            self.games_total = loaded
+        first_batch = not self.games
+        self.games.extend(games)
+        self.panel.append(games)
+        if self.pending_game in games:
+            game, self.pending_game = self.pending_game, None
+            self.panel.select(self.games.index(game))
+            self.update_selected_game(game)
+            first_batch = False
+        if not done:
+            self.statusbar.SetStatusText(f"Loading {loaded}/{self.games_total} saves...", 1)
+        else:
+            self.loader = None
+            self.pending_game = None
+            self.signatures = loader.signatures
+            self.statusbar.SetStatusText(f"{self.games_total} saves" if self.games_total else "No saves", 1)
+            self.start_watching()
+            if self.gallery_item.IsChecked():
+                self.load_gallery()
+        if first_batch and self.games:
+            self.update_selected_game(self.games[0])
+
+    def on_card_error(self, loader: CardLoader, e: Exception):
+        if loader is not self.loader:
+            return
+        self.loader = None
+        self.statusbar.SetStatusText("", 1)
+        wx.MessageBox(f"Failed to open memory card:\n{str(e)}", "Error", wx.OK | wx.ICON_ERROR)
+
+    def start_watching(self):
+        """
+        Watch the opened card for changes, if enabled.
+        """
+        self.stop_watching()
+        if not self.watch_item.IsChecked():
+            return
+        watcher = CardWatcher(
+            self.mc_path,
+            on_change=lambda browser, changes: wx.CallAfter(self.on_card_changed, watcher, browser, changes),
+            signatures=self.signatures,
+        )
+        self.watcher = watcher
+        watcher.start()
+
+    def stop_watching(self):
+        if self.watcher is not None:
+            self.watcher.cancel()
+            self.watcher = None
+
+    def on_card_changed(self, watcher: CardWatcher, browser: Browser, changes: CardChanges):
+        """
+        Handle saves changed on the card since it was opened or last changed.
+        Only the list rows and the models of those saves are rebuilt,
+        the selection and the models of the other saves are kept.
+        """
+        if watcher is not self.watcher or self.prefetcher is None:
+            browser.close()
+            return
+        stale = changes.changed + changes.removed
+        self.prefetcher.replace_browser(browser, stale).close()
+        self.browser = browser
+        for game in stale:
+            self.canvas.model_cache.invalidate(self.mc_path, game)
+        self.games = list(changes.games)
+        self.games_total = len(self.games)
+        self.signatures = changes.signatures
+        self.panel.sync(self.games, self.selected_game)
+        self.statusbar.SetStatusText(f"{self.games_total} saves (card changed: {changes})", 1)
+
+        if self.gallery_item.IsChecked():
+            self.load_gallery()
+        if self.selected_game in self.games:
+            if self.selected_game in changes.changed:
+                self.update_selected_game(self.selected_game)
+        elif self.games:
+            self.panel.select(0)
+            self.update_selected_game(self.games[0])
+        else:
+            self.selected_game = None
 
     def update_selected_game(self, game: str):
         """
@@ -94,18 +450,172 @@ class WxFrame(wx.Frame):
             game (str):  The selected game title.
         """
         self.selected_game = game
-        self.icon_sys, self.icons = self.browser.get_icon(game)
+        prefetcher = self.prefetcher
+        future = prefetcher.submit(game)
+        if future.done():
+            self.show_game(prefetcher, game, future)
+        else:
+            future.add_done_callback(
+                lambda f: wx.CallAfter(self.show_game, prefetcher, game, f)
+            )
+        # Parse the saves around the selection in the background,
+        # then upload their models on the UI thread.
+        for neighbour, f in prefetcher.neighbours(self.games, self.games.index(game)):
+            f.add_done_callback(
+                lambda f, neighbour=neighbour: wx.CallAfter(self.preload_game, prefetcher, neighbour, f)
+            )
+
+    def show_game(self, prefetcher: IconPrefetcher, game: str, future: Future):
+        """
+        Display the parsed icons of a game, unless another game or card was selected meanwhile.
+        """
+        if prefetcher is not self.prefetcher or game != self.selected_game or future.cancelled():
+            return
+        try:
+            self.icon_sys, self.icons = future.result()
+        except Exception as e:
+            self.statusbar.SetStatusText(f"Failed to read {game}: {e}. File > Verify Card checks the card.", 0)
+            return
         self.statusbar.SetStatusText(
-            f"{self.icon_sys.subtitle[0]} {self.icon_sys.subtitle[1]}"
+            f"{self.icon_sys.subtitle[0]} {self.icon_sys.subtitle[1]}", 0
         )
-        self.canvas.refresh(self.icon_sys, self.icons)
+        self.canvas.refresh(self.icon_sys, self.icons, (self.mc_path, game))
+
+    def preload_game(self, prefetcher: IconPrefetcher, game: str, future: Future):
+        """
+        Upload the models of a prefetched game, if its card is still open.
+        """
+        if prefetcher is not self.prefetcher or future.cancelled() or future.exception() is not None:
+            return
+        icon_sys, icons = future.result()
+        self.canvas.preload(icon_sys, icons, (self.mc_path, game))
 
-    def export_files(self, game: str, file_path: str):
+    def load_gallery(self):
+        """
+        Parse the icons of every game in the background, then show them in the gallery.
+        A card that is still loading is shown once all its games are listed.
+        """
+        if self.prefetcher is None or self.loader is not None or not self.games:
+            return
+        prefetcher = self.prefetcher
+        games = list(self.games)
+        futures = [prefetcher.load(game) for game in games]
+        self.gallery_futures = futures
+        self.statusbar.SetStatusText(f"Loading the icons of {len(games)} saves...", 1)
+        for future in futures:
+            future.add_done_callback(
+                lambda f: wx.CallAfter(self.on_gallery_loaded, prefetcher, games, futures)
+            )
+
+    def on_gallery_loaded(self, prefetcher: IconPrefetcher, games: List[str], futures: List[Future]):
+        """
+        Show the gallery once the icons of all games are parsed,
+        unless the card was closed or the gallery hidden meanwhile.
+        """
+        if prefetcher is not self.prefetcher or futures is not self.gallery_futures:
+            return
+        if not all(future.done() for future in futures):
+            return
+        self.gallery_futures = None
+        self.gallery_games, items = [], []
+        for game, future in zip(games, futures):
+            if not future.cancelled() and future.exception() is None:
+                icon_sys, icons = future.result()
+                self.gallery_games.append(game)
+                items.append((icon_sys, icons[0]))
+        self.statusbar.SetStatusText(f"{self.games_total} saves", 1)
+        self.canvas.show_gallery(items)
+
+    def on_gallery_select(self, index: int):
+        """
+        Leave the gallery for the save clicked in it.
+        """
+        game = self.gallery_games[index]
+        self.gallery_item.Check(False)
+        self.canvas.hide_gallery()
+        if game not in self.games:
+            # deleted from the card since the gallery was shown
+            return
+        self.panel.select(self.games.index(game))
+        self.update_selected_game(game)
+
+    def export_games(self, games: List[str], format: str = "folder"):
+        """
+        Export saves into folders named after them, or .psu files, in a directory chosen by the user.
+        The saves are exported in the background, the progress being shown in the status bar.
+
+        Parameters:
+            games (List[str]):  The save directory names to export.
+            format (str):  "folder" or "psu", see `BulkExporter`.
+        """
+        if self.mc_path is None or not games:
+            return
+        if self.exporter is not None:
+            wx.MessageBox("An export is already in progress.", "Export", wx.OK | wx.ICON_INFORMATION)
+            return
+        with wx.DirDialog(
+            self,
+            "Select Directory to Export to",
+            style=wx.DD_DEFAULT_STYLE | wx.DD_DIR_MUST_EXIST,
+        ) as dir_dialog:
+            if dir_dialog.ShowModal() != wx.ID_OK:
+                return
+            dir_path = dir_dialog.GetPath()
+        exporter = BulkExporter(
+            self.mc_path,
+            list(games),
+            dir_path,
+            on_progress=lambda progress: wx.CallAfter(self.on_export_progress, exporter, progress),
+            on_done=lambda progress: wx.CallAfter(self.on_export_done, exporter, progress),
+            format=format,
+        )
+        existing = [
+            os.path.basename(path) for path in map(exporter.output_path, games) if os.path.exists(path)
+        ]
+        if existing:
+            names = "\n".join(existing[:10]) + ("\n..." if len(existing) > 10 else "")
+            overwrite = wx.MessageBox(
+                f"{len(existing)} of the exported saves already exist in '{dir_path}':\n{names}\n\n"
+                "Do you want to overwrite them?",
+                "Saves Exist",
+                wx.YES_NO | wx.ICON_QUESTION
+            )
+            if overwrite != wx.YES:
+                return
         try:
-            self.browser.export(game, file_path)
-            wx.MessageBox(f"File saved successfully at:\n{file_path}", "Success", wx.OK | wx.ICON_INFORMATION)
+            exporter.start()
         except Exception as e:
-            wx.MessageBox(f"Failed to save file:\n{str(e)}", "Error", wx.OK | wx.ICON_ERROR)
+            wx.MessageBox(f"Failed to export:\n{str(e)}", "Error", wx.OK | wx.ICON_ERROR)
+            return
+        if exporter.progress.end is None:
+            self.exporter = exporter
+            self.cancel_export_item.Enable(True)
+
+    def on_export_progress(self, exporter: BulkExporter, progress: ExportProgress):
+        if not self or exporter is not self.exporter:
+            return
+        self.statusbar.SetStatusText(f"Exporting {progress}", 1)
+
+    def on_export_done(self, exporter: BulkExporter, progress: ExportProgress):
+        """
+        Report a finished export in the status bar, and the saves that failed, if any.
+        """
+        if not self:
+            return
+        if exporter is self.exporter:
+            self.exporter = None
+            self.cancel_export_item.Enable(False)
+        if progress.cancelled:
+            self.statusbar.SetStatusText(f"Export cancelled, {progress.saves_done} saves exported", 1)
+        else:
+            self.statusbar.SetStatusText(
+                f"Exported {progress.saves_done} saves to {exporter.dest} in {progress.elapsed:.1f}s "
+                f"({progress.throughput / 1024 / 1024:.1f} MiB/s)",
+                1,
+            )
+        if progress.failed:
+            errors = "\n".join(f"{game}: {e}" for game, e in progress.failed)
+            wx.MessageBox(f"Failed to export {len(progress.failed)} saves:\n{errors}", "Error", wx.OK | wx.ICON_ERROR)
 
 
 class WxPanel(wx.Panel):
@@ -115,7 +625,10 @@ class WxPanel(wx.Panel):
     def __init__(self, parent: wx.Panel):
         wx.Panel.__init__(self, parent)
         self.parent = parent
-        self.list_box = wx.ListBox(self, size=(250, 480))
+        self.list_box = wx.ListBox(self, size=(250, 480), style=wx.LB_EXTENDED)
+        sizer = wx.BoxSizer(wx.VERTICAL)
+        sizer.Add(self.list_box, 1, wx.EXPAND)
+        self.SetSizer(sizer)
         self.Bind(wx.EVT_LISTBOX, self.on_select, self.list_box)
         # Bind the right-click event
         self.list_box.Bind(wx.EVT_CONTEXT_MENU, self.on_right_click)
@@ -124,7 +637,43 @@ class WxPanel(wx.Panel):
         """
         Handle the selection event of the game list box.
         """
-        self.parent.update_selected_game(self.list_box.GetStringSelection())
+        index = evt.GetSelection()
+        if index != wx.NOT_FOUND and self.list_box.IsSelected(index):
+            self.parent.update_selected_game(self.list_box.GetString(index))
+
+    def sync(self, games: List[str], selected: str):
+        """
+        Update the game list box to a new list of games, only inserting and deleting
+        the rows of the games that were added or removed, and keeping the selection.
+
+        Parameters:
+            games (List[str]):  The game titles to be displayed in the list box.
+            selected (str):  The selected game title.
+        """
+        current = set(games)
+        for index in reversed(range(self.list_box.GetCount())):
+            if self.list_box.GetString(index) not in current:
+                self.list_box.Delete(index)
+        for index, game in enumerate(games):
+            if index < self.list_box.GetCount() and self.list_box.GetString(index) == game:
+                continue
+            if game in self.list_box.GetStrings():
+                # moved in the directory, which the card never does itself
+                self.update(games)
+                break
+            self.list_box.Insert(game, index)
+        if selected in current and not self.list_box.IsSelected(games.index(selected)):
+            self.select(games.index(selected))
+
+    def select(self, index: int):
+        """
+        Select a single game of the list box, clearing the selection.
+        """
+        self.list_box.SetSelection(wx.NOT_FOUND)
+        self.list_box.SetSelection(index)
+
+    def selected_games(self) -> List[str]:
+        return [self.list_box.GetString(index) for index in self.list_box.GetSelections()]
 
     def update(self, games: List[str]):
         """
@@ -134,9 +683,20 @@ class WxPanel(wx.Panel):
             games (List[str]):  The game titles to be displayed in the list box.
         """
         self.list_box.Clear()
+        self.append(games)
+
+    def append(self, games: List[str]):
+        """
+        Append games to the game list box, selecting the first one if the list was empty.
+
+        Parameters:
+            games (List[str]):  The game titles to be appended to the list box.
+        """
         if games:
+            select = self.list_box.IsEmpty()
             self.list_box.AppendItems(games)
-            self.list_box.Select(0)
+            if select:
+                self.list_box.Select(0)
 
     def on_right_click(self, event: wx.Event):
         """
@@ -146,12 +706,12 @@ class WxPanel(wx.Panel):
         menu = wx.Menu()
 
         menu_item1 = menu.Append(wx.ID_ANY, "Export files...")
-        # menu_item2 = menu.Append(wx.ID_ANY, "Export psu file...")
+        menu_item2 = menu.Append(wx.ID_ANY, "Export psu file...")
         # menu_item3 = menu.Append(wx.ID_ANY, "Action 3")
 
         # Bind menu item events
         self.Bind(wx.EVT_MENU, self.export_files, menu_item1)
-        # self.Bind(wx.EVT_MENU, self.export_psu_file, menu_item2)
+        self.Bind(wx.EVT_MENU, self.export_psu_file, menu_item2)
         # self.Bind(wx.EVT_MENU, self.on_action_3, menu_item3)
 
         # Show the popup menu
@@ -160,58 +720,15 @@ class WxPanel(wx.Panel):
 
     def export_files(self, event: wx.Event):
         """
-        Handle the 'Save File' action:
-        - Prompt the user to select a directory.
-        - Create a subdirectory 'folder' within the selected directory.
-        - Save a file into the subdirectory.
-        - Prompt the user if the subdirectory already exists.
+        Handle the 'Export files' action, exporting the selected games.
         """
-        with wx.DirDialog(
-            self,
-            "Select Directory to Save File",
-            style=wx.DD_DEFAULT_STYLE | wx.DD_DIR_MUST_EXIST,
-        ) as dir_dialog:
-            if dir_dialog.ShowModal() == wx.ID_OK:
-                game = self.list_box.GetStringSelection()
-                # Get the directory path selected by the user
-                dir_path = dir_dialog.GetPath()
-                folder_path = f"{dir_path}/{game}"
-
-                # Check if 'folder' already exists
-                if os.path.exists(folder_path):
-                    overwrite = wx.MessageBox(
-                        f"The folder '{folder_path}' already exists. Do you want to overwrite it?",
-                        "Folder Exists",
-                        wx.YES_NO | wx.ICON_QUESTION
-                    )
-                    if overwrite != wx.YES:
-                        return  # User chose not to overwrite
-
-                self.parent.export_files(game, dir_path)
-
-    # def export_psu_file(self, event: wx.Event):
-    #     """
-    #     Handle the 'Save File' action by opening a save file dialog
-    #     and writing a sample file to the selected directory.
-    #     """
-    #     with wx.FileDialog(
-    #         self,
-    #         "Save File",
-    #         wildcard="Text files (*.txt)|*.txt|All files (*.*)|*.*",
-    #         style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT,
-    #     ) as save_dialog:
-    #         if save_dialog.ShowModal() == wx.ID_OK:
-    #             # Get the file path selected by the user
-    #             file_path = save_dialog.GetPath()
-
-    #             try:
-    #                 # Write a sample file to the selected path
-    #                 with open(file_path, "w") as file:
-    #                     file.write("This is a sample file saved from wxPython.")
-
-    #                 wx.MessageBox(f"File saved successfully at:\n{file_path}", "Success", wx.OK | wx.ICON_INFORMATION)
-    #             except Exception as e:
-    #                 wx.MessageBox(f"Failed to save file:\n{str(e)}", "Error", wx.OK | wx.ICON_ERROR)
+        self.parent.export_games(self.selected_games())
+
+    def export_psu_file(self, event: wx.Event):
+        """
+        Handle the 'Export psu file' action, packing each selected game into a .psu file.
+        """
+        self.parent.export_games(self.selected_games(), format="psu")
 
     # def on_action_3(self, event: wx.Event):
     #     wx.MessageBox("You selected Action 3!")